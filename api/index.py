@@ -1,8 +1,18 @@
 from flask import Flask, request, jsonify, render_template
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from PIL import Image, UnidentifiedImageError, features
+import hashlib
+import io
 import json
 import os
 import re
+import uuid
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
 
 app = Flask(__name__)
@@ -16,15 +26,714 @@ GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN')
 # PicGo API 配置
 PICGO_API_URL = "https://api.picgo.net/api/upload"
 
+# 单个图片的大小上限(字节)
+MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', str(10 * 1024 * 1024)))
+# 表单字段和 multipart 边界等额外开销
+MULTIPART_OVERHEAD = 64 * 1024
+# 批量上传的文件数和请求体大小上限
+MAX_BATCH_FILES = int(os.environ.get('MAX_BATCH_FILES', '50'))
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', str(100 * 1024 * 1024)))
+# 批量上传时同时进行的 PicGo 上传数
+BATCH_UPLOAD_WORKERS = int(os.environ.get('BATCH_UPLOAD_WORKERS', '4'))
+# 超过上限的请求在解析表单前直接返回 413（单文件接口另行检查）
+app.config['MAX_CONTENT_LENGTH'] = max(MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD, MAX_BATCH_SIZE)
+
+# 上传时分块读取的大小
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# 连接池大小下限（实际大小还会按批量上传并发数放大，见 http_pool_size）
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '10'))
+# 连接和读取超时(秒)；上传大文件时读取超时单独放宽
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '3.05'))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', '10'))
+UPLOAD_READ_TIMEOUT = float(os.environ.get('UPLOAD_READ_TIMEOUT', '60'))
+# 重试次数和退避系数：连接失败对所有请求重试（请求尚未发出），
+# 读取失败和 429/5xx 只对幂等请求重试
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', '3'))
+HTTP_BACKOFF = float(os.environ.get('HTTP_BACKOFF', '0.3'))
+
+# 上传时生成的缩略图尺寸(像素)和格式，尺寸为空时不生成缩略图；不支持 WebP 的 Pillow 使用 PNG
+THUMBNAIL_SIZES = [int(size) for size in os.environ.get('THUMBNAIL_SIZES', '64,128,256').split(',') if size.strip()]
+THUMBNAIL_FORMAT = os.environ.get('THUMBNAIL_FORMAT', 'webp').lower()
+# 生成缩略图时允许解码的最大像素数；高压缩率的 PNG/WebP 体积很小但解码后可能占用数 GB 内存，
+# 超过上限时跳过缩略图（原图照常上传）
+THUMBNAIL_MAX_PIXELS = int(os.environ.get('THUMBNAIL_MAX_PIXELS', str(40 * 1000 * 1000)))
+if THUMBNAIL_FORMAT == 'webp' and not features.check('webp'):
+    THUMBNAIL_FORMAT = 'png'
+
+# 支持的图片格式：扩展名 -> MIME 类型
+ALLOWED_IMAGE_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'gif': 'image/gif',
+    'svg': 'image/svg+xml',
+    'webp': 'image/webp',
+}
+
+# Gist 配置
+GIST_API_URL = f"https://api.github.com/gists/{GIST_ID}"
+ICONS_FILENAME = 'icons.json'
+
+# 图标索引的有效期(秒)，过期后用 ETag 条件请求重新验证
+ICON_INDEX_TTL = float(os.environ.get('ICON_INDEX_TTL', '30'))
+
+# /api/icons 分页大小上限
+MAX_PAGE_SIZE = 200
+# 单个实例缓存的查询结果数量
+QUERY_CACHE_SIZE = 64
+
+# 写入合并窗口(秒)：窗口内的上传/删除合并为一次 PATCH
+GIST_BATCH_WINDOW = float(os.environ.get('GIST_BATCH_WINDOW', '0.2'))
+# 检测到并发写入冲突时重新读取并重放的次数
+GIST_WRITE_ATTEMPTS = int(os.environ.get('GIST_WRITE_ATTEMPTS', '3'))
+# 等待写入确认的最长时间(秒)
+GIST_WRITE_TIMEOUT = float(os.environ.get('GIST_WRITE_TIMEOUT', '30'))
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """为未指定超时的请求使用默认超时"""
+    
+    def __init__(self, *args, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+    
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def http_pool_size():
+    """连接池大小：不小于批量上传时同时进行的 PicGo 请求数
+    
+    每个批量上传工作线程在原图完成后并发上传各尺寸的缩略图，
+    连接池小于该并发数时多出的连接会被丢弃并重新建立。
+    """
+    return max(HTTP_POOL_SIZE, BATCH_UPLOAD_WORKERS * max(1, len(THUMBNAIL_SIZES)))
+
+
+def create_http_session():
+    """创建带连接池、超时和重试的会话"""
+    retry = Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=HTTP_RETRIES,
+        status=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({'GET', 'HEAD', 'OPTIONS'}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = TimeoutHTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=http_pool_size(),
+        max_retries=retry,
+        timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+# 模块级共享会话，热启动的函数实例之间复用连接
+http_session = create_http_session()
+
+
+class UploadError(Exception):
+    """上传失败，附带返回给客户端的状态码"""
+    
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def sniff_image_type(stream):
+    """根据文件头识别图片格式，返回 MIME 类型，无法识别时返回 None"""
+    head = stream.read(512)
+    stream.seek(0)
+    
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    
+    text = head.lstrip(b'\xef\xbb\xbf').lstrip().lower()
+    if text.startswith((b'<svg', b'<?xml', b'<!doctype svg', b'<!--')) and b'<svg' in text:
+        return 'image/svg+xml'
+    return None
+
+
+def validate_image(file):
+    """校验扩展名、大小和文件头，返回 (MIME 类型, 字节数)"""
+    file_extension = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
+    if file_extension not in ALLOWED_IMAGE_TYPES:
+        raise UploadError('不支持的文件格式，请上传 PNG、JPG、GIF、SVG 或 WebP 格式的图片')
+    
+    # Werkzeug 会将较大的上传暂存到临时文件，seek 获取大小不会读入内存
+    file.stream.seek(0, os.SEEK_END)
+    size = file.stream.tell()
+    file.stream.seek(0)
+    
+    if size == 0:
+        raise UploadError('图片文件为空')
+    if size > MAX_UPLOAD_SIZE:
+        raise UploadError(f'图片大小超过限制 ({MAX_UPLOAD_SIZE // (1024 * 1024)} MB)', 413)
+    
+    mime_type = sniff_image_type(file.stream)
+    if mime_type is None:
+        raise UploadError('文件内容不是有效的图片')
+    return mime_type, size
+
+
+class MultipartFileStream:
+    """流式 multipart/form-data 请求体
+    
+    文件内容按需分块读取，提供长度以便 requests 发送 Content-Length 而非分块编码。
+    """
+    
+    def __init__(self, field_name, filename, content_type, fileobj, size):
+        boundary = uuid.uuid4().hex
+        safe_filename = filename.replace('"', '%22').replace('\r', '').replace('\n', '')
+        head = (
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{safe_filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode('utf-8')
+        tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        self.parts = [io.BytesIO(head), fileobj, io.BytesIO(tail)]
+        self.length = len(head) + size + len(tail)
+    
+    def __len__(self):
+        return self.length
+    
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = UPLOAD_CHUNK_SIZE
+        chunks = []
+        while self.parts and size > 0:
+            chunk = self.parts[0].read(size)
+            if not chunk:
+                self.parts.pop(0)
+                continue
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+
+def upload_to_picgo(filename, mime_type, fileobj, size):
+    """将文件流式转发到 PicGo，返回图片地址"""
+    body = MultipartFileStream('file', filename, mime_type, fileobj, size)
+    headers = {'X-API-Key': PICGO_API_KEY, 'Content-Type': body.content_type}
+    
+    try:
+        response = http_session.post(
+            PICGO_API_URL, data=body, headers=headers,
+            timeout=(HTTP_CONNECT_TIMEOUT, UPLOAD_READ_TIMEOUT)
+        )
+    except requests.RequestException:
+        raise UploadError('图片上传失败，无法连接 PicGo 服务', 502)
+    
+    if response.status_code != 200:
+        raise UploadError('图片上传失败，请检查 PicGo API 配置', 500)
+    
+    try:
+        upload_result = response.json()
+    except ValueError:
+        raise UploadError('图片上传失败，PicGo 返回了无效的响应', 502)
+    if not upload_result.get('success'):
+        raise UploadError(f'图片上传失败: {upload_result.get("message", "未知错误")}', 500)
+    return upload_result['data'][0]['url']
+
+
+def create_thumbnails(stream, filename, sizes=None, image_format=None):
+    """用 Pillow 生成缩略图，返回 [(尺寸, 文件名, MIME 类型, 图片数据)]
+    
+    只生成小于原图的尺寸；无法解码的图片（如 SVG）和像素数超过 THUMBNAIL_MAX_PIXELS
+    的图片返回空列表。
+    """
+    sizes = sorted(THUMBNAIL_SIZES if sizes is None else sizes, reverse=True)
+    if not sizes:
+        return []
+    image_format = image_format or THUMBNAIL_FORMAT
+    stem = filename.rsplit('.', 1)[0]
+    
+    try:
+        with Image.open(stream) as source:
+            # JPEG 解码时直接缩小，避免完整解码大图
+            source.draft('RGB', (sizes[0], sizes[0]))
+            # 解码前按文件头中的尺寸检查像素数
+            width, height = source.size
+            if width * height > THUMBNAIL_MAX_PIXELS:
+                return []
+            image = source.convert('RGBA')
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return []
+    finally:
+        stream.seek(0)
+    
+    thumbnails = []
+    for size in sizes:
+        if size >= max(image.size):
+            continue
+        # 从上一级缩略图继续缩小，减少计算量
+        image.thumbnail((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        if image_format == 'webp':
+            image.save(buffer, 'WEBP', quality=85, method=4)
+        else:
+            image.save(buffer, 'PNG', optimize=True)
+        thumbnails.append((size, f"{stem}_{size}.{image_format}", f"image/{image_format}", buffer.getvalue()))
+    return sorted(thumbnails)
+
+
+def upload_image_with_thumbnails(file, mime_type, size):
+    """上传原图并生成、上传缩略图，返回 (原图地址, {尺寸: 缩略图地址})
+    
+    缩略图在原图上传成功后才并发上传，原图失败时不会在 PicGo 上留下无主的缩略图。
+    """
+    if THUMBNAIL_SIZES and mime_type != 'image/svg+xml':
+        thumbnails = create_thumbnails(file.stream, file.filename)
+    else:
+        thumbnails = []
+    image_url = upload_to_picgo(file.filename, mime_type, file.stream, size)
+    
+    thumbnail_urls = {}
+    if not thumbnails:
+        return image_url, thumbnail_urls
+    
+    with ThreadPoolExecutor(max_workers=len(thumbnails)) as executor:
+        thumbnail_uploads = [
+            (thumb_size, executor.submit(upload_to_picgo, name, thumb_mime, io.BytesIO(data), len(data)))
+            for thumb_size, name, thumb_mime, data in thumbnails
+        ]
+        for thumb_size, future in thumbnail_uploads:
+            try:
+                thumbnail_urls[str(thumb_size)] = future.result()
+            except Exception:
+                # 缩略图上传失败（包括 PicGo 返回异常响应）不影响原图，前端会回退到原图
+                continue
+    
+    return image_url, thumbnail_urls
+
+
+def gist_headers():
+    """GitHub API 请求头"""
+    return {
+        'Authorization': f'token {GITHUB_TOKEN}',
+        'Accept': 'application/vnd.github.v3+json'
+    }
+
+
+def default_icons_data():
+    """icons.json 不存在时的初始结构"""
+    return {
+        "name": "Icon Library",
+        "description": "图标库 - 自助上传系统",
+        "icons": []
+    }
+
+
+class GistError(Exception):
+    """Gist 读写失败"""
+
+
+def parse_icons_file(gist_data):
+    """从 Gist 响应中解析 icons.json"""
+    icons_file = gist_data['files'].get(ICONS_FILENAME)
+    if not icons_file:
+        return default_icons_data()
+    try:
+        return json.loads(icons_file['content'])
+    except json.JSONDecodeError:
+        raise GistError('Gist 中的 JSON 格式错误')
+
+
+def gist_version(gist_data):
+    """Gist 当前修订版本"""
+    history = gist_data.get('history') or []
+    return history[0].get('version') if history else None
+
+
+class IconIndex:
+    """进程内图标索引
+    
+    首次使用时载入 icons.json，之后在有效期内直接使用内存数据；
+    过期后发送 If-None-Match 条件请求，未变化时 GitHub 返回 304 不计入限额。
+    写入成功后原地更新索引，无需重新拉取。
+    """
+    
+    def __init__(self, ttl=ICON_INDEX_TTL):
+        self.ttl = ttl
+        self.lock = threading.RLock()
+        self.meta = {}
+        self.icons = []
+        self.by_name = {}
+        self.next_suffix = {}
+        self.etag = None
+        self.version = None
+        self.revision = 0
+        self.loaded_at = None
+        self.query_cache = {}
+    
+    @property
+    def loaded(self):
+        return self.loaded_at is not None
+    
+    def is_fresh(self):
+        return self.loaded and time.monotonic() - self.loaded_at < self.ttl
+    
+    def invalidate(self):
+        """丢弃缓存状态，下次使用时完整拉取"""
+        with self.lock:
+            self.etag = None
+            self.loaded_at = None
+    
+    def load(self, icons_data, version=None):
+        """用 icons.json 内容重建索引"""
+        with self.lock:
+            icons = list(icons_data.get('icons', []))
+            self.meta = {key: value for key, value in icons_data.items() if key != 'icons'}
+            self.icons = icons
+            self.by_name = {icon['name']: icon for icon in icons}
+            self.next_suffix = {}
+            self.version = version
+            self.loaded_at = time.monotonic()
+            self._changed(version)
+    
+    def _changed(self, version=None):
+        """内容变化：更新版本并清空查询缓存"""
+        self.version = version
+        self.revision += 1
+        self.query_cache = {}
+    
+    @property
+    def content_token(self):
+        """标识当前内容的令牌：Gist 版本在各实例间一致，本地修改后退回到修订号"""
+        return self.version or f"local-{self.revision}"
+    
+    def refresh(self, force=False):
+        """按需重新验证索引；force 时忽略有效期（仍使用条件请求）
+        
+        网络请求在锁外进行，期间读取方继续使用当前数据；若请求期间索引已被
+        写入更新，丢弃本次拉取的（可能更旧的）内容。
+        """
+        with self.lock:
+            if not force and self.is_fresh():
+                return
+            etag = self.etag if self.loaded else None
+            revision = self.revision
+        
+        headers = gist_headers()
+        if etag:
+            headers['If-None-Match'] = etag
+        
+        try:
+            response = http_session.get(GIST_API_URL, headers=headers)
+        except requests.RequestException:
+            raise GistError('无法获取 Gist 内容')
+        
+        with self.lock:
+            if response.status_code == 304 and self.loaded:
+                if self.etag == etag:
+                    self.loaded_at = time.monotonic()
+                return
+            if response.status_code != 200:
+                raise GistError('无法获取 Gist 内容')
+            if self.revision != revision:
+                return
+            
+            gist_data = response.json()
+            self.load(parse_icons_file(gist_data), gist_version(gist_data))
+            self.etag = response.headers.get('ETag')
+    
+    def load_revision(self, version):
+        """载入 Gist 的指定修订版本"""
+        try:
+            response = http_session.get(f"{GIST_API_URL}/{version}", headers=gist_headers())
+        except requests.RequestException:
+            raise GistError('无法获取 Gist 历史版本')
+        if response.status_code != 200:
+            raise GistError('无法获取 Gist 历史版本')
+        self.load(parse_icons_file(response.json()), version)
+        self.etag = None
+    
+    def copy(self):
+        """复制索引用于暂存修改（图标条目本身不会被修改，共享引用即可）"""
+        with self.lock:
+            scratch = IconIndex(self.ttl)
+            scratch.load(self.to_data(), self.version)
+            scratch.next_suffix = dict(self.next_suffix)
+            return scratch
+    
+    def to_data(self):
+        """导出为 icons.json 结构"""
+        with self.lock:
+            return {**self.meta, 'icons': list(self.icons)}
+    
+    def unique_name(self, name):
+        """获取不重复的名称，重复时添加数字后缀（每个基础名称记录下一个候选后缀）"""
+        with self.lock:
+            if name not in self.by_name:
+                return name
+            counter = self.next_suffix.get(name, 1)
+            while f"{name}_{counter}" in self.by_name:
+                counter += 1
+            self.next_suffix[name] = counter + 1
+            return f"{name}_{counter}"
+    
+    def query(self, search='', match='substring', sort=None, descending=False):
+        """按名称搜索和排序，结果按查询参数缓存到内容变化为止"""
+        key = (search, match, sort, descending)
+        with self.lock:
+            cached = self.query_cache.get(key)
+            if cached is not None:
+                return cached
+            
+            icons = self.icons
+            if search:
+                needle = search.lower()
+                if match == 'prefix':
+                    icons = [icon for icon in icons if icon['name'].lower().startswith(needle)]
+                else:
+                    icons = [icon for icon in icons if needle in icon['name'].lower()]
+            if sort:
+                icons = sorted(icons, key=lambda icon: icon.get(sort) or '', reverse=descending)
+            elif descending:
+                icons = icons[::-1]
+            
+            if len(self.query_cache) >= QUERY_CACHE_SIZE:
+                self.query_cache.clear()
+            self.query_cache[key] = icons
+            return icons
+    
+    def add(self, icon):
+        with self.lock:
+            self.icons.append(icon)
+            self.by_name[icon['name']] = icon
+            self._changed()
+    
+    def remove(self, name):
+        with self.lock:
+            icon = self.by_name.pop(name, None)
+            if icon is None:
+                return None
+            self.icons = [item for item in self.icons if item['name'] != name]
+            self._changed()
+            # 名称被释放后允许重新使用较小的后缀
+            base = name.rsplit('_', 1)[0]
+            if base in self.next_suffix:
+                self.next_suffix.pop(base)
+            return icon
+
+
+# 一次待写入的修改：apply(index) 在索引副本上执行并返回给调用方的结果
+GistMutation = namedtuple('GistMutation', ['description', 'apply'])
+
+
+class GistWriter:
+    """Gist 写入队列（write-behind）
+    
+    合并窗口内提交的修改在后台线程中一次性应用并 PATCH。写入前以条件请求
+    获取最新版本；PATCH 后检查 Gist 历史，若父版本不是读取时的版本，说明
+    期间有其他实例写入，则载入对方的版本重新应用本批修改。调用方在写入
+    确认后才拿到结果。
+    
+    修改应用在索引的快照上，GitHub 请求期间不持有索引锁，列表请求不受
+    写入耗时影响；写入确认后才在锁内替换索引内容。
+    """
+    
+    def __init__(self, index, window=GIST_BATCH_WINDOW, attempts=GIST_WRITE_ATTEMPTS):
+        self.index = index
+        self.window = window
+        self.attempts = attempts
+        self.pending = []
+        self.condition = threading.Condition()
+        self.thread = None
+        self.batches = 0
+    
+    def submit(self, mutation):
+        """提交修改，返回在写入确认后完成的 Future"""
+        future = Future()
+        with self.condition:
+            self.pending.append((mutation, future))
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='gist-writer', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+        return future
+    
+    def apply(self, mutation, timeout=GIST_WRITE_TIMEOUT):
+        """提交修改并等待写入确认
+        
+        超时时修改仍在队列中，之后可能写入成功，返回 pending 结果而不是失败。
+        """
+        future = self.submit(mutation)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            return {
+                'success': False,
+                'pending': True,
+                'status': 202,
+                'message': 'Gist 写入仍在进行，结果未知，请稍后刷新列表确认'
+            }
+    
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+            # 等待合并窗口内的其他修改
+            time.sleep(self.window)
+            with self.condition:
+                batch, self.pending = self.pending, []
+            self.flush(batch)
+    
+    def flush(self, batch):
+        """应用并写入一批修改"""
+        try:
+            results = self._commit([mutation for mutation, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e if isinstance(e, GistError) else GistError(f'Gist 更新异常: {str(e)}'))
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+    
+    def _commit(self, mutations):
+        # 写入只在本线程进行，快照之后索引只会被读取方的 refresh 更新为远端内容
+        self.index.refresh(force=True)
+        base = self.index.copy()
+        
+        for _ in range(self.attempts):
+            base_version = base.version
+            scratch = base.copy()
+            results = [mutation.apply(scratch) for mutation in mutations]
+            if not any(result.get('success') for result in results):
+                return results
+            
+            update_data = {
+                "description": self._describe(mutations),
+                "files": {
+                    ICONS_FILENAME: {
+                        "content": json.dumps(scratch.to_data(), ensure_ascii=False, indent=2)
+                    }
+                }
+            }
+            try:
+                update_response = http_session.patch(GIST_API_URL, headers=gist_headers(), json=update_data)
+            except requests.RequestException:
+                # PATCH 不重试：请求可能已生效，交由下次读取确认
+                self.index.invalidate()
+                raise GistError('Gist 更新失败: 网络错误')
+            if update_response.status_code != 200:
+                self.index.invalidate()
+                raise GistError(f'Gist 更新失败: {update_response.status_code}')
+            
+            history = update_response.json().get('history') or []
+            parent_version = history[1].get('version') if len(history) > 1 else None
+            if base_version is None or parent_version is None or parent_version == base_version:
+                with self.index.lock:
+                    self.index.load(scratch.to_data(), gist_version(update_response.json()))
+                    self.index.next_suffix = scratch.next_suffix
+                    # GET 与 PATCH 的 ETag 不通用，下次过期时完整拉取一次
+                    self.index.etag = None
+                self.batches += 1
+                return results
+            
+            # 期间有其他写入：以对方的版本为基础重新应用，
+            # 下一次写入的父版本应为本次（覆盖了对方修改的）版本
+            base = IconIndex(self.index.ttl)
+            base.load_revision(parent_version)
+            base.version = history[0].get('version')
+        
+        self.index.invalidate()
+        raise GistError('Gist 并发写入冲突，请稍后重试')
+    
+    @staticmethod
+    def _describe(mutations):
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        if len(mutations) == 1:
+            return f"{mutations[0].description} - {now}"
+        return f"图标库批量更新 ({len(mutations)} 项) - {now}"
+
+
+def add_icon_mutation(name, image_url, thumbnails=None):
+    """添加图标（重复名称自动添加后缀）"""
+    def apply(index):
+        unique = index.unique_name(name)
+        icon = {
+            "name": unique,
+            "url": image_url,
+            "upload_time": datetime.now().isoformat()
+        }
+        if thumbnails:
+            icon["thumbnails"] = thumbnails
+        index.add(icon)
+        return {
+            'success': True,
+            'message': 'Gist 更新成功',
+            'data': {
+                'name': unique,
+                'url': image_url,
+                'is_duplicate': unique != name
+            }
+        }
+    return GistMutation('图标库更新', apply)
+
+
+def add_icons_mutation(entries):
+    """批量添加图标，entries 为包含 name / url / thumbnails 的条目"""
+    mutations = [add_icon_mutation(entry['name'], entry['url'], entry.get('thumbnails')) for entry in entries]
+    
+    def apply(index):
+        results = [mutation.apply(index)['data'] for mutation in mutations]
+        return {'success': True, 'message': 'Gist 更新成功', 'data': results}
+    return GistMutation(f'批量添加 {len(entries)} 个图标', apply)
+
+
+def remove_icon_mutation(icon_name):
+    """删除图标"""
+    def apply(index):
+        if index.remove(icon_name) is None:
+            return {'success': False, 'message': '图标不存在', 'status': 404}
+        return {'success': True, 'message': f'图标 {icon_name} 删除成功'}
+    return GistMutation(f'删除图标 {icon_name}', apply)
+
+
+icon_index = IconIndex()
+gist_writer = GistWriter(icon_index)
+
 @app.route('/')
 def index():
     """渲染主页面"""
     return render_template('index.html')
 
+@app.errorhandler(413)
+def request_too_large(error):
+    """请求体超过 MAX_CONTENT_LENGTH"""
+    return jsonify({
+        'success': False,
+        'message': f'上传内容超过大小限制 (单个图片 {MAX_UPLOAD_SIZE // (1024 * 1024)} MB)'
+    }), 413
+
 @app.route('/api/upload', methods=['POST'])
 def upload_image():
     """处理图片上传和Gist更新"""
     try:
+        # 在解析表单前按单文件上限检查请求大小
+        if (request.content_length or 0) > MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD:
+            return request_too_large(None)
+        
         # 获取表单数据
         name = request.form.get('name', '').strip()
         file = request.files.get('image')
@@ -36,150 +745,201 @@ def upload_image():
         if not file:
             return jsonify({'success': False, 'message': '请选择图片文件'}), 400
         
-        # 验证文件类型
-        allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'svg', 'webp'}
-        file_extension = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
-        
-        if file_extension not in allowed_extensions:
-            return jsonify({'success': False, 'message': '不支持的文件格式，请上传 PNG、JPG、GIF、SVG 或 WebP 格式的图片'}), 400
+        # 验证文件类型和大小，并流式上传到 PicGo
+        mime_type, size = validate_image(file)
+        image_url, thumbnails = upload_image_with_thumbnails(file, mime_type, size)
         
-        # 上传图片到 PicGo
-        files = {'file': (file.filename, file.read(), file.content_type)}
-        headers = {'X-API-Key': PICGO_API_KEY}
-        
-        response = requests.post(PICGO_API_URL, files=files, headers=headers)
-        
-        if response.status_code != 200:
-            return jsonify({'success': False, 'message': '图片上传失败，请检查 PicGo API 配置'}), 500
-        
-        upload_result = response.json()
+        # 更新 Gist
+        gist_update_result = update_gist(name, image_url, thumbnails)
         
-        if upload_result.get('success'):
-            image_url = upload_result['data'][0]['url']
-            
-            # 更新 Gist
-            gist_update_result = update_gist(name, image_url)
-            
-            if gist_update_result['success']:
-                return jsonify({
-                    'success': True,
-                    'message': '图标上传成功！',
-                    'data': {
-                        'name': name,
-                        'url': image_url,
-                        'gist_url': f"https://gist.github.com/{GITHUB_USER}/{GIST_ID}"
-                    }
-                })
-            else:
-                return jsonify({'success': False, 'message': f'Gist 更新失败: {gist_update_result["message"]}'}), 500
+        if gist_update_result['success']:
+            return jsonify({
+                'success': True,
+                'message': '图标上传成功！',
+                'data': {
+                    'name': name,
+                    'url': image_url,
+                    'thumbnails': thumbnails,
+                    'gist_url': f"https://gist.github.com/{GITHUB_USER}/{GIST_ID}"
+                }
+            })
+        elif gist_update_result.get('pending'):
+            # 写入确认超时：图片已上传，图标可能稍后出现在列表中
+            return jsonify({
+                'success': False,
+                'pending': True,
+                'message': gist_update_result['message'],
+                'data': {'name': name, 'url': image_url, 'thumbnails': thumbnails}
+            }), 202
         else:
-            return jsonify({'success': False, 'message': f'图片上传失败: {upload_result.get("message", "未知错误")}'}), 500
-            
+            return jsonify({'success': False, 'message': f'Gist 更新失败: {gist_update_result["message"]}'}), 500
+    
+    except UploadError as e:
+        return jsonify({'success': False, 'message': str(e)}), e.status
     except Exception as e:
         return jsonify({'success': False, 'message': f'服务器错误: {str(e)}'}), 500
 
-def update_gist(name, image_url):
-    """更新 GitHub Gist 中的图标数据"""
+def upload_batch_item(file, name):
+    """批量上传中的单个文件，返回结果条目（失败时包含 message）"""
+    result = {'filename': file.filename, 'name': name}
+    if not name:
+        return {**result, 'success': False, 'message': '请输入图标名称'}
     try:
-        # 获取当前 Gist 内容
-        gist_url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {
-            'Authorization': f'token {GITHUB_TOKEN}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
+        mime_type, size = validate_image(file)
+        image_url, thumbnails = upload_image_with_thumbnails(file, mime_type, size)
+    except UploadError as e:
+        return {**result, 'success': False, 'message': str(e)}
+    except Exception as e:
+        return {**result, 'success': False, 'message': f'图片上传失败: {str(e)}'}
+    return {**result, 'success': True, 'url': image_url, 'thumbnails': thumbnails}
+
+
+@app.route('/api/upload/batch', methods=['POST'])
+def upload_batch():
+    """批量上传图片：并发上传到 PicGo，所有成功的条目一次写入 Gist
+    
+    表单字段 images 为多个文件，names 为对应的图标名称（缺省时使用文件名）。
+    """
+    try:
+        files = request.files.getlist('images')
+        names = request.form.getlist('names')
         
-        response = requests.get(gist_url, headers=headers)
+        if not files:
+            return jsonify({'success': False, 'message': '请选择图片文件'}), 400
+        if len(files) > MAX_BATCH_FILES:
+            return jsonify({'success': False, 'message': f'单次最多上传 {MAX_BATCH_FILES} 个文件'}), 400
         
-        if response.status_code != 200:
-            return {'success': False, 'message': '无法获取 Gist 内容'}
+        names = [
+            (names[i].strip() if i < len(names) else '') or file.filename.rsplit('.', 1)[0].strip()
+            for i, file in enumerate(files)
+        ]
         
-        gist_data = response.json()
-        icons_file = gist_data['files'].get('icons.json')
+        with ThreadPoolExecutor(max_workers=max(1, min(BATCH_UPLOAD_WORKERS, len(files)))) as executor:
+            results = list(executor.map(upload_batch_item, files, names))
         
-        if not icons_file:
-            # 如果文件不存在，创建新的结构
-            icons_data = {
-                "name": "Icon Library",
-                "description": "图标库 - 自助上传系统",
-                "icons": []
-            }
-        else:
-            # 解析现有数据
+        uploaded = [result for result in results if result['success']]
+        if uploaded:
             try:
-                icons_data = json.loads(icons_file['content'])
-            except json.JSONDecodeError:
-                return {'success': False, 'message': 'Gist 中的 JSON 格式错误'}
-        
-        # 检查名称唯一性并处理重复
-        original_name = name
-        counter = 1
-        while any(icon['name'] == name for icon in icons_data['icons']):
-            name = f"{original_name}_{counter}"
-            counter += 1
-        
-        # 添加新图标
-        new_icon = {
-            "name": name,
-            "url": image_url,
-            "upload_time": datetime.now().isoformat()
-        }
-        
-        icons_data['icons'].append(new_icon)
-        
-        # 更新 Gist
-        update_data = {
-            "description": f"图标库更新 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-            "files": {
-                "icons.json": {
-                    "content": json.dumps(icons_data, ensure_ascii=False, indent=2)
-                }
-            }
-        }
-        
-        update_response = requests.patch(gist_url, headers=headers, json=update_data)
-        
-        if update_response.status_code == 200:
-            return {
-                'success': True,
-                'message': 'Gist 更新成功',
-                'data': {
-                    'name': name,
-                    'url': image_url,
-                    'is_duplicate': original_name != name
-                }
-            }
-        else:
-            return {'success': False, 'message': f'Gist 更新失败: {update_response.status_code}'}
+                gist_response = gist_writer.apply(add_icons_mutation(uploaded))
+            except GistError as e:
+                for result in uploaded:
+                    result.update({'success': False, 'message': f'Gist 更新失败: {str(e)}'})
+                return jsonify({'success': False, 'message': f'Gist 更新失败: {str(e)}', 'data': {'results': results}}), 500
+            if gist_response.get('pending'):
+                for result in uploaded:
+                    result.update({'success': False, 'pending': True, 'message': gist_response['message']})
+                return jsonify({'success': False, 'pending': True, 'message': gist_response['message'],
+                                'data': {'results': results}}), 202
             
+            for result, gist_result in zip(uploaded, gist_response['data']):
+                result.update({'name': gist_result['name'], 'is_duplicate': gist_result['is_duplicate']})
+        
+        return jsonify({
+            'success': bool(uploaded),
+            'message': f'成功上传 {len(uploaded)}/{len(results)} 个图标',
+            'data': {
+                'results': results,
+                'gist_url': f"https://gist.github.com/{GITHUB_USER}/{GIST_ID}"
+            }
+        }), 200 if uploaded else 400
+    
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'服务器错误: {str(e)}'}), 500
+
+def update_gist(name, image_url, thumbnails=None):
+    """更新 GitHub Gist 中的图标数据（合并写入，确认后返回）"""
+    try:
+        return gist_writer.apply(add_icon_mutation(name, image_url, thumbnails))
+    except GistError as e:
+        return {'success': False, 'message': str(e)}
     except Exception as e:
         return {'success': False, 'message': f'Gist 更新异常: {str(e)}'}
 
+def parse_icon_query(args):
+    """解析 /api/icons 查询参数，参数无效时抛出 ValueError"""
+    offset = int(args.get('offset', 0))
+    limit = args.get('limit')
+    limit = int(limit) if limit not in (None, '') else None
+    if offset < 0 or (limit is not None and not 1 <= limit <= MAX_PAGE_SIZE):
+        raise ValueError(f'offset 不能为负数，limit 范围为 1-{MAX_PAGE_SIZE}')
+    
+    match = args.get('match', 'substring')
+    if match not in ('prefix', 'substring'):
+        raise ValueError('match 只能为 prefix 或 substring')
+    
+    # sort=upload_time 升序，sort=-upload_time 降序
+    sort = args.get('sort', '')
+    descending = sort.startswith('-')
+    sort = sort.lstrip('-') or None
+    if sort not in (None, 'upload_time', 'name'):
+        raise ValueError('sort 只能为 upload_time 或 name')
+    
+    return {
+        # 翻页时携带第一页返回的 revision，内容变化后拒绝按 offset 继续翻页
+        'revision': args.get('revision', '').strip() or None,
+        'search': args.get('q', '').strip(),
+        'match': match,
+        'sort': sort,
+        'descending': descending,
+        'offset': offset,
+        'limit': limit,
+    }
+
 @app.route('/api/icons', methods=['GET'])
 def get_icons():
-    """获取所有图标列表"""
+    """获取图标列表，支持 ?q=&match=&sort=&offset=&limit= 分页筛选
+    
+    响应中的 revision 标识内容版本；加载后续页时传回 ?revision=，期间有上传或删除时
+    返回 409，客户端应从第一页重新加载，避免按 offset 翻页时跳过或重复条目。
+    """
     try:
-        gist_url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {
-            'Authorization': f'token {GITHUB_TOKEN}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
-        
-        response = requests.get(gist_url, headers=headers)
-        
-        if response.status_code != 200:
-            return jsonify({'success': False, 'message': '无法获取图标列表'}), 500
-        
-        gist_data = response.json()
-        icons_file = gist_data['files'].get('icons.json')
-        
-        if not icons_file:
-            return jsonify({'success': True, 'data': {'icons': []}})
+        try:
+            query = parse_icon_query(request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': f'参数错误: {str(e)}'}), 400
         
         try:
-            icons_data = json.loads(icons_file['content'])
-            return jsonify({'success': True, 'data': icons_data})
-        except json.JSONDecodeError:
-            return jsonify({'success': False, 'message': '图标数据格式错误'}), 500
+            icon_index.refresh()
+        except GistError:
+            # 重新验证失败时继续使用已载入的数据
+            if not icon_index.loaded:
+                return jsonify({'success': False, 'message': '无法获取图标列表'}), 500
+        
+        with icon_index.lock:
+            token = icon_index.content_token
+            meta = dict(icon_index.meta)
+            icons = icon_index.query(query['search'], query['match'], query['sort'], query['descending'])
+        
+        if query['revision'] and query['revision'] != token:
+            return jsonify({
+                'success': False,
+                'stale': True,
+                'message': '图标列表已变化，请重新加载',
+                'data': {'revision': token}
+            }), 409
+        
+        # 强 ETag：内容版本 + 查询参数唯一确定响应内容
+        etag_source = json.dumps([token, sorted(query.items())], ensure_ascii=False)
+        etag = hashlib.sha256(etag_source.encode('utf-8')).hexdigest()[:32]
+        
+        offset, limit = query['offset'], query['limit']
+        page = icons[offset:offset + limit] if limit is not None else icons[offset:]
+        
+        response = jsonify({
+            'success': True,
+            'data': {
+                **meta,
+                'icons': page,
+                'total': len(icons),
+                'offset': offset,
+                'limit': limit,
+                'revision': token,
+            }
+        })
+        response.set_etag(etag)
+        # 列表可能随时被上传修改，浏览器每次都重新验证（命中时返回 304）
+        response.headers['Cache-Control'] = 'public, no-cache'
+        return response.make_conditional(request)
             
     except Exception as e:
         return jsonify({'success': False, 'message': f'获取图标列表失败: {str(e)}'}), 500
@@ -188,53 +948,13 @@ def get_icons():
 def delete_icon(icon_name):
     """删除指定图标"""
     try:
-        # 获取当前 Gist 内容
-        gist_url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {
-            'Authorization': f'token {GITHUB_TOKEN}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
-        
-        response = requests.get(gist_url, headers=headers)
-        
-        if response.status_code != 200:
-            return jsonify({'success': False, 'message': '无法获取 Gist 内容'}), 500
-        
-        gist_data = response.json()
-        icons_file = gist_data['files'].get('icons.json')
-        
-        if not icons_file:
-            return jsonify({'success': False, 'message': '图标文件不存在'}), 404
-        
-        try:
-            icons_data = json.loads(icons_file['content'])
-        except json.JSONDecodeError:
-            return jsonify({'success': False, 'message': 'Gist 中的 JSON 格式错误'}), 500
-        
-        # 查找并删除图标
-        original_length = len(icons_data['icons'])
-        icons_data['icons'] = [icon for icon in icons_data['icons'] if icon['name'] != icon_name]
-        
-        if len(icons_data['icons']) == original_length:
-            return jsonify({'success': False, 'message': '图标不存在'}), 404
-        
-        # 更新 Gist
-        update_data = {
-            "description": f"删除图标 {icon_name} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-            "files": {
-                "icons.json": {
-                    "content": json.dumps(icons_data, ensure_ascii=False, indent=2)
-                }
-            }
-        }
-        
-        update_response = requests.patch(gist_url, headers=headers, json=update_data)
-        
-        if update_response.status_code == 200:
-            return jsonify({'success': True, 'message': f'图标 {icon_name} 删除成功'})
-        else:
-            return jsonify({'success': False, 'message': f'删除失败: {update_response.status_code}'}), 500
-            
+        result = gist_writer.apply(remove_icon_mutation(icon_name))
+        if not result['success']:
+            return jsonify({'success': False, 'message': result['message']}), result.get('status', 500)
+        return jsonify(result)
+    
+    except GistError as e:
+        return jsonify({'success': False, 'message': f'删除失败: {str(e)}'}), 500
     except Exception as e:
         return jsonify({'success': False, 'message': f'删除图标异常: {str(e)}'}), 500
 
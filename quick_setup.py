@@ -131,6 +131,10 @@ def generate_and_upload(config):
         "files": {
             "TMDB_Trending.json": {
                 "content": json.dumps(processed_data, ensure_ascii=False, indent=2)
+            },
+            # 压缩版本，供 Widget 频繁拉取
+            "TMDB_Trending.min.json": {
+                "content": json.dumps(processed_data, ensure_ascii=False, separators=(',', ':'))
             }
         }
     }
@@ -138,7 +142,10 @@ def generate_and_upload(config):
     response_data = make_request(url, headers=headers, data=gist_data, method='PATCH')
     if response_data and 'files' in response_data:
         raw_url = response_data['files']['TMDB_Trending.json']['raw_url']
+        min_raw_url = response_data['files'].get('TMDB_Trending.min.json', {}).get('raw_url')
         print("✅ 上传成功！")
+        if min_raw_url:
+            print(f"📦 压缩数据 URL (推荐 Widget 使用): {min_raw_url}")
         return raw_url
     else:
         print("❌ 上传失败")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+TMDB 爬虫离线基准测试
+Benchmark the crawler end to end against the local replay server
+"""
+
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import get_tmdb_data
+from get_tmdb_data import collect_markets, create_crawler, parse_markets
+from tmdb_cache import ResponseCache
+from tmdb_ratelimit import TokenBucket
+from tmdb_replay import ReplayConfig, ReplayServer, load_fixtures
+
+
+def run_benchmark(server: ReplayServer, engine: str = "sync", workers: int = 8,
+                  pages: int = 1, markets: str = "zh-CN:CN", rate: float = 0,
+                  cache: Optional[ResponseCache] = None,
+                  combined_fetch: Optional[bool] = None) -> Dict:
+    """对回放服务器完整运行一次爬虫，返回耗时和请求统计"""
+    server.stats.reset()
+    # 每次运行使用独立的令牌桶，rate 为 0 时不限流
+    crawler = create_crawler(
+        engine, api_key="replay", max_workers=workers, base_url=server.base_url,
+        cache=cache, rate_limiter=TokenBucket(rate, workers), combined_fetch=combined_fetch
+    )
+
+    started = time.perf_counter()
+    try:
+        results = collect_markets(crawler, parse_markets(markets), pages)
+    finally:
+        crawler.close()
+    wall_time = time.perf_counter() - started
+
+    items = sum(len(section) for sections in results.values() for section in sections.values())
+    return {
+        "engine": engine,
+        "workers": workers,
+        "wall_time": round(wall_time, 3),
+        "items": items,
+        "memo_hits": crawler.enrich_memo_hits,
+        **server.stats.summary(),
+    }
+
+
+def print_report(runs: List[Dict]):
+    """打印基准测试结果"""
+    print("")
+    print("================= 基准测试结果 =================")
+    for index, run in enumerate(runs, 1):
+        statuses = ", ".join(f"{status}×{count}" for status, count in run["statuses"].items())
+        print(
+            f"#{index} [{run['engine']}/{run['workers']}] 耗时 {run['wall_time']:.2f}s | "
+            f"条目 {run['items']} | 请求 {run['requests']} ({statuses}) | "
+            f"p50 {run['latency_p50'] * 1000:.1f}ms p95 {run['latency_p95'] * 1000:.1f}ms | "
+            f"{run['bytes'] / 1024:.1f} KB"
+        )
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="TMDB 爬虫离线基准测试")
+    parser.add_argument("--engine", choices=["sync", "async"], default="sync", help="爬虫引擎")
+    parser.add_argument("--workers", type=int, default=8, help="并发数")
+    parser.add_argument("--pages", type=int, default=1, help="每个榜单抓取的页数")
+    parser.add_argument("--markets", default="zh-CN:CN", help="逗号分隔的 语言:地区 列表")
+    parser.add_argument("--latency", type=float, default=0.05, help="每次请求的模拟延迟(秒)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="额外的随机延迟上限(秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回 429 的概率")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="429 响应的 Retry-After(秒)")
+    parser.add_argument("--retry-delay", type=float, default=0.1, help="重试退避基数(秒)")
+    parser.add_argument("--seed", type=int, default=0, help="故障注入的随机种子")
+    parser.add_argument("--fixtures", type=Path, help="回放数据文件，缺失的接口使用合成数据")
+    parser.add_argument("--rate", type=float, default=0, help="每秒请求上限，0 表示不限流")
+    parser.add_argument("--separate-fetch", action="store_true", help="详情和图片分开请求")
+    parser.add_argument("--cache", action="store_true", help="启用响应缓存（多次运行时共享）")
+    parser.add_argument("--runs", type=int, default=1, help="运行次数")
+    parser.add_argument("--json", type=Path, help="把结果写入 JSON 文件")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> List[Dict]:
+    args = parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+    # 基准测试中缩短重试退避，避免注入的错误拖长运行时间
+    get_tmdb_data.RETRY_DELAY = args.retry_delay
+
+    config = ReplayConfig(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after, seed=args.seed
+    )
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else None
+    combined_fetch = False if args.separate_fetch else None
+
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp_dir, ReplayServer(fixtures, config) as server:
+        cache = ResponseCache(Path(tmp_dir) / "responses.sqlite") if args.cache else None
+        try:
+            for _ in range(max(1, args.runs)):
+                runs.append(run_benchmark(
+                    server, args.engine, args.workers, args.pages, args.markets,
+                    args.rate, cache, combined_fetch
+                ))
+        finally:
+            if cache:
+                cache.close()
+
+    print_report(runs)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(runs, f, ensure_ascii=False, indent=2)
+    return runs
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
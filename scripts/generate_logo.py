@@ -4,9 +4,19 @@ TMDB Logo 背景图生成器
 Generate Logo and Background Images for TMDB Trending Crawler
 """
 
+import argparse
+import hashlib
+import inspect
+import json
 import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
+from typing import Dict, Iterable, Set, Tuple
 from PIL import Image, ImageDraw, ImageFont
+import numpy as np
 import math
 import colorsys
 
@@ -18,6 +28,32 @@ OUTPUT_DIR = ICONS_DIR / "generated"
 # 确保输出目录存在
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# 并行渲染的进程数，1 表示在当前进程中顺序渲染
+RENDER_WORKERS = int(os.getenv("LOGO_RENDER_WORKERS", str(os.cpu_count() or 1)))
+
+# 小尺寸 Logo 是否由最大尺寸高质量缩小得到（否则逐个尺寸重新绘制）
+LOGO_DOWNSCALE = os.getenv("LOGO_DOWNSCALE", "0") == "1"
+
+# 已生成资源的清单，记录每个文件的输入哈希和输出大小
+MANIFEST_PATH = OUTPUT_DIR / "manifest.json"
+
+# PNG 优化：LOGO_PNG_COLORS > 0 时量化为调色板图像；压缩级别 0-9
+PNG_OPTIMIZE = os.getenv("LOGO_PNG_OPTIMIZE", "0") == "1"
+PNG_COLORS = int(os.getenv("LOGO_PNG_COLORS", "0"))
+PNG_COMPRESS_LEVEL = int(os.getenv("LOGO_PNG_COMPRESS_LEVEL", "6"))
+
+# 文字字体
+FONT_NAME = "arial.ttf"
+
+# 生成的资源尺寸
+LOGO_SIZES = [64, 128, 256, 512, 1024]
+BACKGROUND_SIZES = [
+    (1920, 1080),  # Full HD
+    (1600, 900),   # 16:9
+    (1280, 720),   # HD
+    (800, 600),    # 4:3
+]
+
 # 颜色配置
 TMDB_BLUE = "#01B4E4"
 TMDB_GREEN = "#90CEA1" 
@@ -32,68 +68,69 @@ GRADIENT_COLORS = [
     (144, 206, 161),  # Light Green
 ]
 
-def create_gradient_background(width, height, colors, direction="diagonal"):
-    """创建渐变背景"""
-    image = Image.new('RGB', (width, height))
-    draw = ImageDraw.Draw(image)
+def _gradient_ratio(width, height, direction):
+    """计算每个像素在渐变中的位置比例 (0-1)"""
+    ys, xs = np.mgrid[0:height, 0:width].astype(np.float64)
     
     if direction == "diagonal":
         # 对角线渐变
-        for y in range(height):
-            for x in range(width):
-                # 计算位置比例 (0-1)
-                ratio = (x + y) / (width + height)
-                ratio = min(1.0, max(0.0, ratio))
-                
-                # 在颜色之间插值
-                color_index = ratio * (len(colors) - 1)
-                color1_idx = int(color_index)
-                color2_idx = min(color1_idx + 1, len(colors) - 1)
-                
-                # 插值比例
-                blend_ratio = color_index - color1_idx
-                
-                # 颜色插值
-                color1 = colors[color1_idx]
-                color2 = colors[color2_idx]
-                
-                r = int(color1[0] * (1 - blend_ratio) + color2[0] * blend_ratio)
-                g = int(color1[1] * (1 - blend_ratio) + color2[1] * blend_ratio)
-                b = int(color1[2] * (1 - blend_ratio) + color2[2] * blend_ratio)
-                
-                draw.point((x, y), (r, g, b))
-    
+        ratio = (xs + ys) / (width + height)
     elif direction == "radial":
         # 径向渐变
         center_x, center_y = width // 2, height // 2
         max_distance = math.sqrt(center_x**2 + center_y**2)
-        
-        for y in range(height):
-            for x in range(width):
-                distance = math.sqrt((x - center_x)**2 + (y - center_y)**2)
-                ratio = distance / max_distance
-                ratio = min(1.0, max(0.0, ratio))
-                
-                # 颜色插值
-                color_index = ratio * (len(colors) - 1)
-                color1_idx = int(color_index)
-                color2_idx = min(color1_idx + 1, len(colors) - 1)
-                
-                blend_ratio = color_index - color1_idx
-                
-                color1 = colors[color1_idx]
-                color2 = colors[color2_idx]
-                
-                r = int(color1[0] * (1 - blend_ratio) + color2[0] * blend_ratio)
-                g = int(color1[1] * (1 - blend_ratio) + color2[1] * blend_ratio)
-                b = int(color1[2] * (1 - blend_ratio) + color2[2] * blend_ratio)
-                
-                draw.point((x, y), (r, g, b))
-    
-    return image
+        ratio = np.sqrt((xs - center_x)**2 + (ys - center_y)**2) / max_distance
+    else:
+        raise ValueError(f"不支持的渐变方向: {direction}")
+    
+    return np.clip(ratio, 0.0, 1.0)
+
+def create_gradient_background(width, height, colors, direction="diagonal", stops=None):
+    """创建渐变背景（NumPy 向量化）
+    
+    colors 为任意数量的 RGB 色标；stops 为各色标的位置 (0-1，递增)，
+    默认均匀分布。同一进程内相同参数的渲染结果会被复用，返回副本供调用方绘制。
+    """
+    colors = tuple(tuple(color) for color in colors)
+    stops = tuple(stops) if stops is not None else None
+    return _render_gradient(width, height, colors, direction, stops).copy()
+
+@lru_cache(maxsize=32)
+def _render_gradient(width, height, colors, direction, stops):
+    """渲染渐变（带缓存，结果不可修改）"""
+    palette = np.asarray(colors, dtype=np.float64)
+    ratio = _gradient_ratio(width, height, direction)
+    
+    if len(palette) == 1:
+        pixels = np.broadcast_to(palette[0], (height, width, 3))
+    elif stops is None:
+        # 色标均匀分布，与逐像素实现的插值公式保持一致
+        color_index = ratio * (len(palette) - 1)
+        color1_idx = color_index.astype(np.intp)
+        color2_idx = np.minimum(color1_idx + 1, len(palette) - 1)
+        blend_ratio = (color_index - color1_idx)[..., None]
+        pixels = palette[color1_idx] * (1 - blend_ratio) + palette[color2_idx] * blend_ratio
+    else:
+        positions = np.asarray(stops, dtype=np.float64)
+        if len(positions) != len(palette):
+            raise ValueError("stops 数量必须与 colors 一致")
+        color1_idx = np.clip(np.searchsorted(positions, ratio, side="right") - 1, 0, len(palette) - 2)
+        span = positions[color1_idx + 1] - positions[color1_idx]
+        blend_ratio = np.divide(ratio - positions[color1_idx], span,
+                                out=np.zeros_like(ratio), where=span > 0)
+        blend_ratio = np.clip(blend_ratio, 0.0, 1.0)[..., None]
+        pixels = palette[color1_idx] * (1 - blend_ratio) + palette[color1_idx + 1] * blend_ratio
+    
+    # 与 int() 一致，截断为整数
+    return Image.fromarray(pixels.astype(np.uint8), "RGB")
 
 def create_logo_icon(size=512):
-    """创建Logo图标"""
+    """创建Logo图标（同一进程内按尺寸复用，返回副本）"""
+    return _render_logo_icon(size).copy()
+
+@lru_cache(maxsize=16)
+def _render_logo_icon(size):
+    """绘制Logo图标（带缓存，结果不可修改）"""
     # 创建背景
     background = create_gradient_background(size, size, GRADIENT_COLORS, "radial")
     draw = ImageDraw.Draw(background)
@@ -142,7 +179,7 @@ def create_logo_icon(size=512):
     # 添加标题文字 (如果可能)
     try:
         font_size = size // 12
-        font = ImageFont.truetype("arial.ttf", font_size)
+        font = ImageFont.truetype(FONT_NAME, font_size)
     except:
         font = ImageFont.load_default()
     
@@ -170,8 +207,8 @@ def create_banner_background(width=1200, height=400):
     
     # 添加主标题
     try:
-        title_font = ImageFont.truetype("arial.ttf", width//20)
-        subtitle_font = ImageFont.truetype("arial.ttf", width//30)
+        title_font = ImageFont.truetype(FONT_NAME, width//20)
+        subtitle_font = ImageFont.truetype(FONT_NAME, width//30)
     except:
         title_font = ImageFont.load_default()
         subtitle_font = ImageFont.load_default()
@@ -199,23 +236,27 @@ def create_banner_background(width=1200, height=400):
     
     return background
 
-def create_github_social_preview(width=1280, height=640):
-    """创建GitHub社交预览图"""
+def preview_logo_size(height):
+    """社交预览图中 Logo 的边长"""
+    return height // 3
+
+def create_github_social_preview(width=1280, height=640, logo_path=None):
+    """创建GitHub社交预览图（logo_path 为已渲染的 Logo 文件，缩小后使用；否则重新绘制）"""
     background = create_gradient_background(width, height, GRADIENT_COLORS, "diagonal")
     draw = ImageDraw.Draw(background)
     
     # 添加Logo
-    logo_size = height // 3
-    logo = create_logo_icon(logo_size)
+    logo_size = preview_logo_size(height)
+    logo = downscale_logo(logo_path, logo_size) if logo_path else create_logo_icon(logo_size)
     logo_x = width // 6
     logo_y = (height - logo_size) // 2
     background.paste(logo, (logo_x, logo_y))
     
     # 添加文字内容
     try:
-        title_font = ImageFont.truetype("arial.ttf", width//25)
-        desc_font = ImageFont.truetype("arial.ttf", width//40)
-        feature_font = ImageFont.truetype("arial.ttf", width//45)
+        title_font = ImageFont.truetype(FONT_NAME, width//25)
+        desc_font = ImageFont.truetype(FONT_NAME, width//40)
+        feature_font = ImageFont.truetype(FONT_NAME, width//45)
     except:
         title_font = ImageFont.load_default()
         desc_font = ImageFont.load_default()
@@ -253,50 +294,252 @@ def create_github_social_preview(width=1280, height=640):
     
     return background
 
-def main():
-    """主函数"""
-    print("🎨 开始生成 TMDB Logo 和背景图...")
+def create_background(width=1920, height=1080):
+    """创建纯渐变背景图"""
+    return create_gradient_background(width, height, GRADIENT_COLORS, "diagonal")
+
+def downscale_logo(source_path, size):
+    """由大尺寸 Logo 高质量缩小得到指定尺寸"""
+    with Image.open(source_path) as source:
+        return source.convert("RGB").resize((size, size), Image.LANCZOS, reducing_gap=3.0)
+
+# 渲染任务类型 -> 渲染函数
+ASSET_RENDERERS = {
+    "logo": create_logo_icon,
+    "banner": create_banner_background,
+    "preview": create_github_social_preview,
+    "background": create_background,
+    "downscale": downscale_logo,
+}
+
+@dataclass(frozen=True)
+class RenderJob:
+    """单个资源的渲染任务，deps 中的任务完成后才会执行"""
+    name: str
+    kind: str
+    args: Tuple
+    path: Path
+    deps: Tuple[str, ...] = field(default=())
+    label: str = ""
+
+def png_save_options(optimize=PNG_OPTIMIZE, colors=PNG_COLORS, compress_level=PNG_COMPRESS_LEVEL):
+    """PNG 保存参数（同时参与资源哈希计算）"""
+    return {
+        "optimize": optimize,
+        "colors": colors if optimize else 0,
+        "compress_level": compress_level,
+    }
+
+def save_png(image, path, options):
+    """按优化参数保存 PNG"""
+    if options.get("colors"):
+        image = image.convert("RGB").quantize(colors=options["colors"])
+    image.save(path, "PNG", optimize=options.get("optimize", False),
+               compress_level=options.get("compress_level", 6))
+
+def render_job(job, save_options=None):
+    """执行渲染任务并保存（在工作进程中运行），返回任务名、耗时和文件大小"""
+    started = time.perf_counter()
+    image = ASSET_RENDERERS[job.kind](*job.args)
+    save_png(image, job.path, save_options or {})
+    return job.name, time.perf_counter() - started, job.path.stat().st_size
+
+def build_render_jobs(downscale=LOGO_DOWNSCALE):
+    """构建渲染任务图"""
+    jobs = []
     
     # 生成不同尺寸的Logo
-    logo_sizes = [64, 128, 256, 512, 1024]
-    for size in logo_sizes:
-        print(f"📱 生成 {size}x{size} Logo...")
-        logo = create_logo_icon(size)
-        logo_path = OUTPUT_DIR / f"tmdb_logo_{size}x{size}.png"
-        logo.save(logo_path, "PNG")
-        print(f"   ✅ 保存到: {logo_path}")
-    
-    # 生成横幅背景
-    print("🖼️ 生成横幅背景图...")
-    banner = create_banner_background(1200, 400)
-    banner_path = OUTPUT_DIR / "tmdb_banner_1200x400.png"
-    banner.save(banner_path, "PNG")
-    print(f"   ✅ 保存到: {banner_path}")
-    
-    # 生成GitHub社交预览图
-    print("🐙 生成 GitHub 社交预览图...")
-    preview = create_github_social_preview(1280, 640)
-    preview_path = OUTPUT_DIR / "github_social_preview.png"
-    preview.save(preview_path, "PNG")
-    print(f"   ✅ 保存到: {preview_path}")
+    largest = max(LOGO_SIZES)
+    largest_path = OUTPUT_DIR / f"tmdb_logo_{largest}x{largest}.png"
+    for size in sorted(LOGO_SIZES, reverse=True):
+        path = OUTPUT_DIR / f"tmdb_logo_{size}x{size}.png"
+        label = f"📱 {size}x{size} Logo"
+        if downscale and size != largest:
+            jobs.append(RenderJob(f"logo_{size}", "downscale", (largest_path, size), path,
+                                  deps=(f"logo_{largest}",), label=label))
+        else:
+            jobs.append(RenderJob(f"logo_{size}", "logo", (size,), path, label=label))
+    
+    # 横幅背景和GitHub社交预览图
+    jobs.append(RenderJob("banner", "banner", (1200, 400), OUTPUT_DIR / "tmdb_banner_1200x400.png",
+                          label="🖼️ 横幅背景图"))
+    
+    # 预览图由不小于所需尺寸的最小 Logo 缩小得到（进程池中 lru_cache 不跨进程共享），
+    # 没有足够大的 Logo 时单独绘制
+    preview_width, preview_height = 1280, 640
+    logo_size = min((size for size in LOGO_SIZES if size >= preview_logo_size(preview_height)), default=None)
+    if logo_size:
+        logo_path = OUTPUT_DIR / f"tmdb_logo_{logo_size}x{logo_size}.png"
+        jobs.append(RenderJob("preview", "preview", (preview_width, preview_height, logo_path),
+                              OUTPUT_DIR / "github_social_preview.png",
+                              deps=(f"logo_{logo_size}",), label="🐙 GitHub 社交预览图"))
+    else:
+        jobs.append(RenderJob("preview", "preview", (preview_width, preview_height),
+                              OUTPUT_DIR / "github_social_preview.png", label="🐙 GitHub 社交预览图"))
     
     # 生成更多尺寸的背景图
-    background_sizes = [
-        (1920, 1080),  # Full HD
-        (1600, 900),   # 16:9
-        (1280, 720),   # HD
-        (800, 600),    # 4:3
-    ]
+    for width, height in BACKGROUND_SIZES:
+        jobs.append(RenderJob(f"background_{width}x{height}", "background", (width, height),
+                              OUTPUT_DIR / f"tmdb_background_{width}x{height}.png",
+                              label=f"🌅 {width}x{height} 背景图"))
+    
+    return jobs
+
+def run_render_jobs(jobs, workers=RENDER_WORKERS, save_options=None,
+                    done: Iterable[str] = (), on_done=None) -> Dict[str, int]:
+    """按依赖关系执行渲染任务，无依赖的任务在进程池中并行渲染
+    
+    done 为已是最新、无需渲染的任务名；返回 {任务名: 文件字节数}。
+    """
+    jobs_by_name = {job.name: job for job in jobs}
+    sizes = {}
+    
+    def report(name, elapsed, size):
+        job = jobs_by_name[name]
+        sizes[name] = size
+        print(f"{job.label or job.name} ({elapsed:.2f}s, {size / 1024:.1f} KB)")
+        print(f"   ✅ 保存到: {job.path}")
+        if on_done:
+            on_done(job, size)
+    
+    if workers <= 1:
+        # 任务列表已按依赖顺序排列
+        for job in jobs:
+            report(*render_job(job, save_options))
+        return sizes
+    
+    done = set(done)
+    pending = list(jobs)
+    running = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            for job in [job for job in pending if set(job.deps) <= done]:
+                pending.remove(job)
+                running[executor.submit(render_job, job, save_options)] = job.name
+            
+            if not running:
+                missing = {dep for job in pending for dep in job.deps} - set(jobs_by_name) - done
+                raise ValueError(f"渲染任务依赖无法满足: {sorted(missing)}")
+            
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                running.pop(future)
+                name, elapsed, size = future.result()
+                done.add(name)
+                report(name, elapsed, size)
+    
+    return sizes
+
+# 参与渲染的函数，源码变化时所有资源重新生成
+RENDER_FUNCTIONS = (
+    _gradient_ratio, create_gradient_background, _render_gradient, create_logo_icon,
+    _render_logo_icon, create_banner_background, preview_logo_size, create_github_social_preview,
+    create_background, downscale_logo, save_png,
+)
+
+def render_source_digest():
+    """渲染函数源码和配色的哈希"""
+    digest = hashlib.sha256(repr(GRADIENT_COLORS).encode("utf-8"))
+    for func in RENDER_FUNCTIONS:
+        digest.update(inspect.getsource(func).encode("utf-8"))
+    return digest.hexdigest()
+
+def font_digest():
+    """字体文件的哈希，找不到字体时使用默认字体标记"""
+    try:
+        font_path = ImageFont.truetype(FONT_NAME, 12).path
+        return hashlib.sha256(Path(font_path).read_bytes()).hexdigest()
+    except (OSError, AttributeError):
+        return "default"
+
+def compute_job_hashes(jobs, save_options, source_digest=None, fonts=None):
+    """计算每个任务的输入哈希（渲染参数 + 源码版本 + 字体 + 保存参数 + 依赖哈希）"""
+    source_digest = source_digest or render_source_digest()
+    fonts = fonts or font_digest()
+    hashes = {}
+    for job in jobs:
+        payload = {
+            "kind": job.kind,
+            "args": [arg.name if isinstance(arg, Path) else arg for arg in job.args],
+            "source": source_digest,
+            "font": fonts,
+            "png": save_options,
+            "deps": [hashes[dep] for dep in job.deps],
+        }
+        encoded = json.dumps(payload, sort_keys=True).encode("utf-8")
+        hashes[job.name] = hashlib.sha256(encoded).hexdigest()
+    return hashes
+
+def load_manifest(path=None) -> Dict:
+    """读取资源清单"""
+    path = Path(path or MANIFEST_PATH)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("assets", {})
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(assets: Dict, path=None):
+    """写出资源清单"""
+    path = Path(path or MANIFEST_PATH)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"assets": dict(sorted(assets.items()))}, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+def up_to_date_jobs(jobs, hashes, manifest) -> Set[str]:
+    """输入哈希未变化且文件存在的任务"""
+    return {
+        job.name for job in jobs
+        if manifest.get(job.path.name, {}).get("hash") == hashes[job.name] and job.path.exists()
+    }
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="生成 TMDB Logo 和背景图")
+    parser.add_argument("--force", action="store_true", help="忽略清单，重新生成所有资源")
+    parser.add_argument("--optimize", action="store_true", default=PNG_OPTIMIZE,
+                        help="优化 PNG（配合 --colors 量化）")
+    parser.add_argument("--colors", type=int, default=PNG_COLORS,
+                        help="量化的调色板颜色数，0 表示不量化")
+    parser.add_argument("--compress-level", type=int, default=PNG_COMPRESS_LEVEL,
+                        choices=range(10), metavar="0-9", help="PNG 压缩级别")
+    parser.add_argument("--workers", type=int, default=RENDER_WORKERS, help="并行渲染进程数")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    print("🎨 开始生成 TMDB Logo 和背景图...")
+    
+    jobs = build_render_jobs()
+    save_options = png_save_options(args.optimize, args.colors, args.compress_level)
+    hashes = compute_job_hashes(jobs, save_options)
+    manifest = {} if args.force else load_manifest()
+    skipped = up_to_date_jobs(jobs, hashes, manifest)
+    pending = [job for job in jobs if job.name not in skipped]
+    
+    # 清单只保留当前任务对应的文件
+    assets = {job.path.name: manifest[job.path.name] for job in jobs if job.name in skipped}
+    
+    def record(job, size):
+        assets[job.path.name] = {"hash": hashes[job.name], "bytes": size}
+        save_manifest(assets)
+    
+    if skipped:
+        print(f"⏭️ {len(skipped)} 个资源未变化，跳过 (使用 --force 强制重新生成)")
     
-    for width, height in background_sizes:
-        print(f"🌅 生成 {width}x{height} 背景图...")
-        bg = create_gradient_background(width, height, GRADIENT_COLORS, "diagonal")
-        bg_path = OUTPUT_DIR / f"tmdb_background_{width}x{height}.png"
-        bg.save(bg_path, "PNG")
-        print(f"   ✅ 保存到: {bg_path}")
+    started = time.perf_counter()
+    if pending:
+        workers = max(1, min(args.workers, len(pending)))
+        print(f"⚙️ 共 {len(pending)} 个渲染任务，并行进程数: {workers}"
+              + ("，小尺寸 Logo 由最大尺寸缩小" if LOGO_DOWNSCALE else ""))
+        run_render_jobs(pending, workers, save_options, done=skipped, on_done=record)
+    save_manifest(assets)
     
     print("")
-    print("🎉 所有图片生成完成!")
+    print(f"🎉 所有图片生成完成! 耗时 {time.perf_counter() - started:.2f}s")
     print(f"📁 输出目录: {OUTPUT_DIR}")
     print("")
     print("生成的文件:")
@@ -308,8 +551,8 @@ if __name__ == "__main__":
     try:
         main()
     except ImportError as e:
-        print("❌ 缺少依赖库，请安装 Pillow:")
-        print("   pip install Pillow")
+        print("❌ 缺少依赖库，请安装 Pillow 和 NumPy:")
+        print("   pip install Pillow numpy")
         print(f"   错误详情: {e}")
     except Exception as e:
         print(f"❌ 生成图片时发生错误: {e}")
\ No newline at end of file
@@ -5,11 +5,12 @@ TMDB 数据包生成脚本
 """
 
 import os
-import json
 import requests
 from datetime import datetime
 from pathlib import Path
 
+from json_output import write_json_document
+
 # TMDB API 配置
 TMDB_API_KEY = os.environ.get('TMDB_API_KEY', 'your_tmdb_api_key_here')
 TMDB_BASE_URL = 'https://api.themoviedb.org/3'
@@ -185,11 +186,12 @@ def main():
         # 生成数据包
         data_package = generate_data_package(processed_data, config, genres)
         
-        # 写入文件
-        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data_package, f, ensure_ascii=False, indent=2)
+        # 写入文件（同时生成 .min.json / .json.gz / .json.br 变体）
+        written_paths = write_json_document(data_package, OUTPUT_FILE)
         
         print(f'✅ 数据文件已生成: {OUTPUT_FILE}')
+        for path in written_paths[1:]:
+            print(f'📦 压缩变体: {path.name} ({path.stat().st_size / 1024:.1f} KB)')
         print(f'📊 包含 {len(processed_data["movies"])} 部电影')
         print(f'📺 包含 {len(processed_data["tv_shows"])} 部剧集')
         print(f'👥 包含 {len(processed_data["people"])} 位演员')
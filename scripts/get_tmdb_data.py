@@ -7,11 +7,29 @@ Enhanced TMDB Data Crawler with Title Backdrop Support
 import os
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from dataclasses import dataclass, field
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 import time
 import logging
-from typing import Dict, List, Optional, Any
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional, Any, Set, Tuple, Union
+
+from json_output import write_json_document
+from tmdb_cache import ResponseCache, get_endpoint_ttl, make_cache_key
+from tmdb_columnar import write_columnar
+from tmdb_delta import VERSION_FIELD, DeltaFeed
+from tmdb_metrics import CrawlerMetrics
+from tmdb_ratelimit import (
+    MAX_BACKOFF,
+    RETRYABLE_STATUSES,
+    TokenBucket,
+    backoff_delay,
+    parse_retry_after,
+    shared_rate_limiter,
+)
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -19,7 +37,8 @@ logger = logging.getLogger(__name__)
 
 # API 配置
 TMDB_API_KEY = os.getenv("TMDB_API_KEY")
-BASE_URL = "https://api.themoviedb.org/3"
+# 可指向本地回放服务器 (scripts/tmdb_replay.py) 做离线测试
+BASE_URL = os.getenv("TMDB_BASE_URL", "https://api.themoviedb.org/3")
 IMAGE_BASE_URL = "https://image.tmdb.org/t/p/"
 
 # 文件路径配置
@@ -27,6 +46,12 @@ SCRIPT_DIR = Path(__file__).parent
 PROJECT_ROOT = SCRIPT_DIR.parent
 DATA_DIR = PROJECT_ROOT / "data"
 SAVE_PATH = DATA_DIR / "TMDB_Trending.json"
+# 运行指标不以 TMDB_Trending 开头，不会被工作流提交
+METRICS_PATH = DATA_DIR / "tmdb_metrics.json"
+PROMETHEUS_PATH = DATA_DIR / "tmdb_metrics.prom"
+# 增量更新目录（manifest.json 和 v{N}.json）
+DELTA_DIR = DATA_DIR / "delta"
+CACHE_PATH = DATA_DIR / ".cache" / "tmdb_responses.sqlite"
 
 # 确保目录存在
 DATA_DIR.mkdir(exist_ok=True)
@@ -35,18 +60,175 @@ DATA_DIR.mkdir(exist_ok=True)
 REQUEST_TIMEOUT = 30
 MAX_RETRIES = 3
 RETRY_DELAY = 2
+# 两种引擎共用的请求头
+REQUEST_HEADERS = {
+    'User-Agent': 'TMDB-Crawler/1.0',
+    'Accept': 'application/json'
+}
+
+# 并发配置：详情/图片补全的最大并发数（1 表示串行）
+ENRICH_WORKERS = int(os.getenv("TMDB_ENRICH_WORKERS", "8"))
+
+# 响应缓存开关（设置为 0 关闭）
+HTTP_CACHE_ENABLED = os.getenv("TMDB_HTTP_CACHE", "1") != "0"
+
+# 爬虫引擎：sync (requests + 线程池) 或 async (httpx 连接池)
+CRAWLER_ENGINE = os.getenv("TMDB_ENGINE", "sync")
+
+# 合并请求：通过 append_to_response=images 一次获取详情和图片（设置为 0 关闭）
+COMBINED_FETCH = os.getenv("TMDB_COMBINED_FETCH", "1") != "0"
+
+# 图片语言过滤
+IMAGE_LANGUAGES = "zh,en,null"
+
+# 默认数据语言和地区
+DEFAULT_LANGUAGE = "zh-CN"
+DEFAULT_REGION = "CN"
+
+# 榜单深度与市场：每个榜单抓取的页数（每页20条），以及 "语言:地区" 列表（第一个为主市场）
+PAGE_DEPTH = max(1, int(os.getenv("TMDB_PAGES", "1")))
+MARKETS = os.getenv("TMDB_MARKETS", f"{DEFAULT_LANGUAGE}:{DEFAULT_REGION}")
+
+# 热门电影保留条数（0 表示不截断）
+POPULAR_LIMIT = int(os.getenv("TMDB_POPULAR_LIMIT", "15"))
+
+# TMDB 列表接口每页条数
+TMDB_PAGE_SIZE = 20
+
+# 类型映射：用热门数据自带的 genre_ids 本地生成 genreTitle，省去详情请求（设置为 0 关闭）
+GENRE_MAP_ENABLED = os.getenv("TMDB_GENRE_MAP", "1") != "0"
+
+# 增量模式：复用上次输出中摘要未变化条目的补全信息（设置为 1 开启）
+INCREMENTAL_ENABLED = os.getenv("TMDB_INCREMENTAL", "0") == "1"
+
+# 增量更新：每次运行发布相对上次快照的增量（设置为 0 关闭），以及保留的增量数量
+DELTA_ENABLED = os.getenv("TMDB_DELTA", "1") != "0"
+DELTA_HISTORY = int(os.getenv("TMDB_DELTA_HISTORY", "96"))
+
+# 列式导出：同时生成 .columnar.json 和 .msgpack（需要 msgpack），设置为 0 关闭
+COLUMNAR_ENABLED = os.getenv("TMDB_COLUMNAR", "1") != "0"
+
+# 判断条目是否变化的摘要字段
+SUMMARY_FIELDS = ("title", "rating", "release_date", "overview", "poster_url")
+
+
+@dataclass(frozen=True)
+class SectionConfig:
+    """榜单定义：输出键、标题、列表接口、媒体类型、额外参数和条数上限"""
+    key: str
+    title: str
+    endpoint: str
+    media_type: str = "all"
+    params: Dict[str, str] = field(default_factory=dict)
+    regional: bool = False  # 是否按市场地区过滤 (region 参数)
+    max_items: Optional[int] = None
+
+
+# 可用的榜单，新增榜单只需在这里添加一项并加入 TMDB_SECTIONS
+SECTIONS = {
+    section.key: section for section in (
+        SectionConfig("today_global", "今日热门", "/trending/all/day"),
+        SectionConfig("week_global_all", "本周热门", "/trending/all/week"),
+        SectionConfig("popular_movies", "热门电影", "/movie/popular", "movie",
+                      regional=True, max_items=POPULAR_LIMIT or None),
+        SectionConfig("top_rated_movies", "高分电影", "/movie/top_rated", "movie", regional=True),
+        SectionConfig("upcoming_movies", "即将上映", "/movie/upcoming", "movie", regional=True),
+        SectionConfig("now_playing_movies", "正在热映", "/movie/now_playing", "movie", regional=True),
+        SectionConfig("on_the_air_tv", "正在播出", "/tv/on_the_air", "tv"),
+        SectionConfig("top_rated_tv", "高分剧集", "/tv/top_rated", "tv"),
+    )
+}
+
+# 启用的榜单（逗号分隔，按顺序输出）
+DEFAULT_SECTION_KEYS = ("today_global", "week_global_all", "popular_movies")
+SECTION_KEYS = os.getenv("TMDB_SECTIONS", ",".join(DEFAULT_SECTION_KEYS))
 
 
 class TMDBCrawler:
     """TMDB 数据爬虫类"""
     
-    def __init__(self, api_key: str = None):
+    engine = "sync"
+    
+    def __init__(self, api_key: str = None, max_workers: int = None,
+                 cache: Optional[ResponseCache] = None,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 combined_fetch: bool = None, base_url: str = None,
+                 metrics: Optional[CrawlerMetrics] = None):
         self.api_key = api_key or TMDB_API_KEY
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'TMDB-Crawler/1.0',
-            'Accept': 'application/json'
-        })
+        self.base_url = (base_url or BASE_URL).rstrip("/")
+        self.max_workers = max(1, max_workers or ENRICH_WORKERS)
+        self.combined_fetch = COMBINED_FETCH if combined_fetch is None else combined_fetch
+        
+        # 各语言的类型映射 {language: {media_type: {genre_id: name}}}，每次运行载入一次
+        self.genre_maps: Dict[str, Dict[str, Dict[int, str]]] = {}
+        self.cache = cache
+        self.metrics = metrics or CrawlerMetrics()
+        # 所有工作线程（以及同进程的其他爬虫实例）共用一个令牌桶
+        self.rate_limiter = rate_limiter or shared_rate_limiter
+        self.session = self._create_session()
+        
+        # 单次运行内的补全结果缓存，键为 (media_type, id, language)，在各个榜单之间共享
+        self._enrich_memo: Dict[Tuple[str, int, str], Future] = {}
+        self._enrich_lock = threading.Lock()
+        self.enrich_memo_hits = 0
+        self.enrich_requests_saved = 0
+        
+        # 增量模式下上次输出的条目，键为 (language, region, type, id)，不同市场的补全信息互不复用
+        self.previous_items: Dict[Tuple[str, str, str, int], Dict] = {}
+        self.incremental_reused = 0
+    
+    def _create_session(self) -> requests.Session:
+        """创建同步引擎的连接池"""
+        session = requests.Session()
+        session.headers.update(REQUEST_HEADERS)
+        # 连接池大小与并发数一致，避免并发请求时丢弃连接
+        adapter = HTTPAdapter(
+            pool_connections=self.max_workers,
+            pool_maxsize=self.max_workers
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
+    
+    def _build_params(self, params: Dict = None) -> Dict:
+        """合并 api_key 和请求参数"""
+        request_params = {"api_key": self.api_key}
+        if params:
+            request_params.update(params)
+        return request_params
+    
+    def _lookup_cache(self, endpoint: str, params: Dict = None) -> Tuple[str, Optional[Dict], bool]:
+        """查找响应缓存，返回 (缓存键, 缓存条目, 是否仍在有效期内)"""
+        cache_key = make_cache_key(endpoint, params)
+        cached = self.cache.get(cache_key) if self.cache else None
+        is_fresh = bool(cached) and self.cache.is_fresh(cached, get_endpoint_ttl(endpoint))
+        if is_fresh:
+            self.cache.record("fresh")
+            self.metrics.record_cache(endpoint, "fresh")
+        return cache_key, cached, is_fresh
+    
+    def _store_cache(self, endpoint: str, cache_key: str, data: Dict, headers: Dict):
+        """保存响应到缓存"""
+        if self.cache:
+            self.cache.record("miss")
+            self.metrics.record_cache(endpoint, "miss")
+            self.cache.set(
+                cache_key,
+                data,
+                etag=headers.get("ETag"),
+                last_modified=headers.get("Last-Modified")
+            )
+    
+    def _revalidated(self, endpoint: str, cache_key: str, cached: Dict) -> Dict:
+        """304 重新验证成功，复用缓存内容"""
+        self.cache.record("revalidated")
+        self.metrics.record_cache(endpoint, "revalidated")
+        self.cache.touch(cache_key)
+        return cached["data"]
     
     def _make_request(self, endpoint: str, params: Dict = None) -> Optional[Dict]:
         """发送请求并处理错误"""
@@ -54,67 +236,200 @@ class TMDBCrawler:
             logger.warning("TMDB API密钥未设置")
             return None
         
-        url = f"{BASE_URL}{endpoint}"
-        request_params = {"api_key": self.api_key}
-        if params:
-            request_params.update(params)
+        url = f"{self.base_url}{endpoint}"
+        request_params = self._build_params(params)
+        
+        # 优先使用未过期的缓存，过期条目则用于条件请求
+        cache_key, cached, is_fresh = self._lookup_cache(endpoint, params)
+        if is_fresh:
+            return cached["data"]
+        headers = self.cache.validation_headers(cached) if self.cache else {}
         
         for attempt in range(MAX_RETRIES):
+            self.rate_limiter.acquire()
+            started = time.perf_counter()
             try:
                 response = self.session.get(
                     url, 
                     params=request_params, 
+                    headers=headers,
                     timeout=REQUEST_TIMEOUT
                 )
-                response.raise_for_status()
-                return response.json()
-            
             except requests.exceptions.RequestException as e:
-                logger.error(f"请求失败 (尝试 {attempt + 1}/{MAX_RETRIES}): {e}")
-                if attempt < MAX_RETRIES - 1:
-                    time.sleep(RETRY_DELAY * (attempt + 1))
-                else:
-                    logger.error(f"最终请求失败: {endpoint}")
-                    return None
-    
-    def fetch_trending_data(self, time_window: str = "day", media_type: str = "all") -> Dict:
+                self.metrics.observe_request(endpoint, None, time.perf_counter() - started)
+                delay = self._retry_delay(endpoint, attempt, error=e)
+            else:
+                self.metrics.observe_request(endpoint, response.status_code, time.perf_counter() - started)
+                if response.status_code == 304 and cached:
+                    return self._revalidated(endpoint, cache_key, cached)
+                
+                if response.status_code < 400:
+                    try:
+                        data = response.json()
+                    except ValueError as e:
+                        logger.error(f"响应解析失败: {endpoint} ({e})")
+                        self.metrics.record_failure(endpoint)
+                        return None
+                    self._store_cache(endpoint, cache_key, data, response.headers)
+                    return data
+                
+                delay = self._retry_delay(
+                    endpoint, attempt,
+                    status=response.status_code,
+                    headers=response.headers
+                )
+            
+            if delay is None:
+                return None
+            time.sleep(delay)
+        
+        return None
+    
+    def _retry_delay(self, endpoint: str, attempt: int, status: int = None,
+                     headers: Dict = None, error: Exception = None) -> Optional[float]:
+        """计算重试前的等待时间，不可重试或已达重试上限时返回 None"""
+        if status is not None and status not in RETRYABLE_STATUSES:
+            # 404 等客户端错误重试也不会成功，直接失败
+            logger.error(f"请求失败 (HTTP {status})，不再重试: {endpoint}")
+            self.metrics.record_failure(endpoint)
+            return None
+        
+        reason = f"HTTP {status}" if status is not None else error
+        if attempt >= MAX_RETRIES - 1:
+            logger.error(f"最终请求失败: {endpoint} ({reason})")
+            self.metrics.record_failure(endpoint)
+            return None
+        
+        delay = backoff_delay(attempt, RETRY_DELAY)
+        retry_after = parse_retry_after(headers.get("Retry-After")) if headers else None
+        if retry_after is not None:
+            delay = min(max(delay, retry_after), MAX_BACKOFF)
+        if status == 429:
+            # 被限流时让所有工作线程一起暂停
+            self.rate_limiter.pause(delay)
+        self.metrics.record_retry(endpoint)
+        
+        logger.warning(f"请求失败 (尝试 {attempt + 1}/{MAX_RETRIES}): {reason}，{delay:.1f} 秒后重试")
+        return delay
+    
+    def _request(self, endpoint: str, params: Dict, default: Dict,
+                 transform: Callable[[Dict], Dict] = None) -> Dict:
+        """发送请求，失败时返回默认值（异步引擎中重写为协程）"""
+        data = self._make_request(endpoint, params)
+        return self._finish_response(data, default, transform)
+    
+    @staticmethod
+    def _finish_response(data: Optional[Dict], default: Dict,
+                         transform: Callable[[Dict], Dict] = None) -> Dict:
+        """对响应做后处理，空响应时返回默认值"""
+        if data and transform:
+            data = transform(data)
+        return data or default
+    
+    def fetch_trending_data(self, time_window: str = "day", media_type: str = "all",
+                            page: int = 1, language: str = DEFAULT_LANGUAGE) -> Dict:
         """获取热门数据"""
         endpoint = f"/trending/all/{time_window}" if media_type == "all" else f"/trending/{media_type}/{time_window}"
-        params = {"language": "zh-CN"}
+        params = {"language": language}
+        if page > 1:
+            params["page"] = page
         
-        data = self._make_request(endpoint, params)
-        return data or {"results": []}
+        return self._request(endpoint, params, {"results": []})
     
-    def fetch_popular_movies(self, page: int = 1) -> Dict:
+    def fetch_popular_movies(self, page: int = 1, language: str = DEFAULT_LANGUAGE,
+                             region: str = DEFAULT_REGION, limit: Optional[int] = 15) -> Dict:
         """获取热门电影"""
         endpoint = "/movie/popular"
         params = {
-            "language": "zh-CN",
-            "region": "CN",
+            "language": language,
+            "region": region,
             "page": page
         }
         
-        data = self._make_request(endpoint, params)
-        if data and "results" in data:
-            # 只保留前15条
-            data["results"] = data["results"][:15]
-        return data or {"results": []}
+        def keep_top(data: Dict) -> Dict:
+            if limit and "results" in data:
+                # 只保留前 limit 条
+                data["results"] = data["results"][:limit]
+            return data
+        
+        return self._request(endpoint, params, {"results": []}, keep_top)
+    
+    def fetch_section_page(self, section: SectionConfig, page: int = 1,
+                           language: str = DEFAULT_LANGUAGE, region: str = DEFAULT_REGION) -> Dict:
+        """按榜单定义获取一页列表数据"""
+        params = {"language": language, **section.params, "page": page}
+        if section.regional:
+            params["region"] = region
+        return self._request(section.endpoint, params, {"results": []})
     
-    def get_media_details(self, media_type: str, media_id: int) -> Dict:
+    def get_media_details(self, media_type: str, media_id: int,
+                          language: str = DEFAULT_LANGUAGE) -> Dict:
         """获取媒体详情"""
         endpoint = f"/{media_type}/{media_id}"
-        params = {"language": "zh-CN"}
+        params = {"language": language}
         
-        data = self._make_request(endpoint, params)
-        return data or {"genres": []}
+        return self._request(endpoint, params, {"genres": []})
     
     def get_media_images(self, media_type: str, media_id: int) -> Dict:
         """获取媒体图片"""
         endpoint = f"/{media_type}/{media_id}/images"
-        params = {"include_image_language": "zh,en,null"}
+        params = {"include_image_language": IMAGE_LANGUAGES}
         
-        data = self._make_request(endpoint, params)
-        return data or {"backdrops": [], "posters": [], "logos": []}
+        return self._request(endpoint, params, {"backdrops": [], "posters": [], "logos": []})
+    
+    def get_media_details_with_images(self, media_type: str, media_id: int,
+                                      language: str = DEFAULT_LANGUAGE) -> Dict:
+        """一次请求获取媒体详情和图片 (append_to_response=images)"""
+        endpoint = f"/{media_type}/{media_id}"
+        params = {
+            "language": language,
+            "append_to_response": "images",
+            "include_image_language": IMAGE_LANGUAGES
+        }
+        
+        return self._request(endpoint, params, {"genres": []})
+    
+    def fetch_genre_list(self, media_type: str, language: str = DEFAULT_LANGUAGE) -> Dict:
+        """获取类型列表（响应缓存有效期较长）"""
+        endpoint = f"/genre/{media_type}/list"
+        params = {"language": language}
+        
+        return self._request(endpoint, params, {"genres": []})
+    
+    @staticmethod
+    def build_genre_map(genre_data: Dict) -> Dict[int, str]:
+        """将类型列表转换为 {genre_id: name}"""
+        return {genre["id"]: genre["name"] for genre in genre_data.get("genres", [])}
+    
+    def load_genre_map(self, language: str = DEFAULT_LANGUAGE):
+        """载入电影和剧集的类型映射"""
+        self.genre_maps[language] = {
+            media_type: self.build_genre_map(self.fetch_genre_list(media_type, language))
+            for media_type in ("movie", "tv")
+        }
+        self._log_genre_map(language)
+    
+    def _log_genre_map(self, language: str):
+        """输出类型映射载入结果"""
+        counts = {media_type: len(genres) for media_type, genres in self.genre_maps[language].items()}
+        logger.info(f"类型映射已载入 ({language}): 电影 {counts['movie']} 个，剧集 {counts['tv']} 个")
+    
+    def resolve_genre_title(self, media_type: str, genre_ids: Optional[List[int]],
+                            language: str = DEFAULT_LANGUAGE) -> Optional[str]:
+        """用本地类型映射生成 genreTitle，无法完整解析时返回 None"""
+        genre_map = self.genre_maps.get(language, {}).get(media_type)
+        if not genre_map or genre_ids is None:
+            return None
+        if any(genre_id not in genre_map for genre_id in genre_ids):
+            return None
+        return "•".join(genre_map[genre_id] for genre_id in genre_ids[:3])
+    
+    @staticmethod
+    def split_detail_images(data: Dict) -> Tuple[Dict, Dict]:
+        """将合并请求的结果拆分为详情和图片两部分"""
+        detail_data = {key: value for key, value in data.items() if key != "images"}
+        image_data = data.get("images") or {"backdrops": [], "posters": [], "logos": []}
+        return detail_data, image_data
     
     def get_image_url(self, path: str, size: str = "original") -> str:
         """构建图片URL"""
@@ -183,72 +498,224 @@ class TMDBCrawler:
         sorted_images = sorted(images, key=get_priority_score)
         return sorted_images[0]
     
-    def process_media_item(self, item: Dict, media_type: str = None) -> Optional[Dict]:
-        """处理单个媒体项目"""
-        try:
-            # 基本信息
-            title = item.get("title") or item.get("name")
-            item_type = media_type if media_type and media_type != "all" else item.get("media_type")
-            media_id = item.get("id")
-            
-            # 跳过人物类型
-            if item_type == "person":
-                return None
-            
-            # 发布日期
-            if item_type == "tv":
-                release_date = item.get("first_air_date")
-            else:
-                release_date = item.get("release_date")
-            
-            # 其他基本信息
-            overview = item.get("overview", "")
-            rating = round(item.get("vote_average", 0), 1)
-            poster_path = item.get("poster_path")
-            poster_url = self.get_image_url(poster_path) if poster_path else ""
-            
-            # 获取详细信息
-            detail_data = self.get_media_details(item_type, media_id)
-            genres = detail_data.get("genres", [])
-            genre_title = "•".join([g["name"] for g in genres[:3]])
-            
-            # 获取标题背景图
-            image_data = self.get_media_images(item_type, media_id)
-            title_backdrop_url = self.get_best_title_backdrop(image_data, item_type)
-            
-            # 数据质量检查
-            if (rating == 0 and 
-                not release_date and 
-                not overview and 
-                not poster_url):
-                logger.debug(f"跳过低质量数据: {title}")
-                return None
-            
+    def _build_enrichment(self, media_type: str, detail_data: Dict, image_data: Dict) -> Dict:
+        """从详情和图片数据中提取类型标题和标题背景图"""
+        genres = detail_data.get("genres", [])
+        genre_title = "•".join([g["name"] for g in genres[:3]])
+        title_backdrop_url = self.get_best_title_backdrop(image_data, media_type)
+        
+        return {
+            "genreTitle": genre_title,
+            "title_backdrop": title_backdrop_url
+        }
+    
+    def _fetch_enrichment(self, media_type: str, media_id: int,
+                          genre_ids: Optional[List[int]] = None,
+                          language: str = DEFAULT_LANGUAGE) -> Dict:
+        """请求详情和图片，提取类型标题和标题背景图"""
+        genre_title = self.resolve_genre_title(media_type, genre_ids, language)
+        if genre_title is not None:
+            # 类型可本地解析，只需请求图片
+            image_data = self.get_media_images(media_type, media_id)
             return {
-                "id": media_id,
-                "title": title,
-                "type": item_type,
                 "genreTitle": genre_title,
-                "rating": rating,
-                "release_date": release_date,
-                "overview": overview,
-                "poster_url": poster_url,
-                "title_backdrop": title_backdrop_url
+                "title_backdrop": self.get_best_title_backdrop(image_data, media_type)
             }
+        
+        if self.combined_fetch:
+            combined = self.get_media_details_with_images(media_type, media_id, language)
+            detail_data, image_data = self.split_detail_images(combined)
+        else:
+            detail_data = self.get_media_details(media_type, media_id, language)
+            image_data = self.get_media_images(media_type, media_id)
+        return self._build_enrichment(media_type, detail_data, image_data)
+    
+    @property
+    def requests_per_enrichment(self) -> int:
+        """每个条目补全所需的请求数"""
+        return 1 if self.combined_fetch or self.genre_maps else 2
+    
+    def _record_memo_hit(self):
+        """记录一次去重命中（可在任意线程调用，调用方不得持有 _enrich_lock）"""
+        with self._enrich_lock:
+            self.enrich_memo_hits += 1
+            self.enrich_requests_saved += self.requests_per_enrichment
+    
+    def enrich_media(self, media_type: str, media_id: int,
+                     genre_ids: Optional[List[int]] = None,
+                     language: str = DEFAULT_LANGUAGE) -> Dict:
+        """获取补全信息，按 (media_type, id, language) 在本次运行内去重"""
+        key = (media_type, media_id, language)
+        with self._enrich_lock:
+            future = self._enrich_memo.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._enrich_memo[key] = future
+        
+        if not is_owner:
+            self._record_memo_hit()
+            # 其他线程可能仍在请求同一条目，等待其结果
+            return future.result()
+        
+        try:
+            result = self._fetch_enrichment(media_type, media_id, genre_ids, language)
+        except Exception as e:
+            with self._enrich_lock:
+                self._enrich_memo.pop(key, None)
+            future.set_exception(e)
+            raise
+        
+        future.set_result(result)
+        return result
+    
+    def load_previous_items(self, data: Dict, primary_market: Tuple[str, str] = None):
+        """载入上次输出的各榜单条目（含其他市场），用于增量补全
+        
+        顶层榜单属于第一个市场 primary_market（默认取 TMDB_MARKETS 的第一项），
+        markets 下的榜单按 "语言_地区" 键归属各自的市场。
+        """
+        primary_market = primary_market or parse_markets(MARKETS)[0]
+        for key, section in data.items():
+            if key == "markets" and isinstance(section, dict):
+                for market, sections in section.items():
+                    language, _, region = market.rpartition("_")
+                    if language and isinstance(sections, dict):
+                        self._index_previous_sections(sections, (language, region))
+            elif isinstance(section, list):
+                self._index_previous_items(section, primary_market)
+        logger.info(f"增量模式: 载入上次输出的 {len(self.previous_items)} 个条目")
+    
+    def _index_previous_sections(self, sections: Dict, market: Tuple[str, str]):
+        """索引某个市场的榜单数据"""
+        for section in sections.values():
+            if isinstance(section, list):
+                self._index_previous_items(section, market)
+    
+    def _index_previous_items(self, items: List, market: Tuple[str, str]):
+        """按 (language, region, type, id) 索引单个榜单的条目"""
+        for item in items:
+            if isinstance(item, dict) and "type" in item and "id" in item:
+                self.previous_items[(*market, item["type"], item["id"])] = item
+    
+    def _previous_enrichment(self, summary: Dict, language: str = DEFAULT_LANGUAGE,
+                             region: str = DEFAULT_REGION) -> Optional[Dict]:
+        """同一市场内摘要未变化时返回上次的补全信息，否则返回 None"""
+        previous = self.previous_items.get((language, region, summary["type"], summary["id"]))
+        if not previous:
+            return None
+        if any(previous.get(field) != summary[field] for field in SUMMARY_FIELDS):
+            return None
+        # 上次补全结果为空时可能是请求失败，重新获取
+        if not previous.get("genreTitle") and not previous.get("title_backdrop"):
+            return None
+        
+        with self._enrich_lock:
+            self.incremental_reused += 1
+        return {
+            "genreTitle": previous.get("genreTitle", ""),
+            "title_backdrop": previous.get("title_backdrop", "")
+        }
+    
+    def summarize_item(self, item: Dict, media_type: str = None) -> Optional[Dict]:
+        """提取热门条目的基本信息，人物和低质量数据返回 None"""
+        # 基本信息
+        title = item.get("title") or item.get("name")
+        item_type = media_type if media_type and media_type != "all" else item.get("media_type")
+        media_id = item.get("id")
+        
+        # 跳过人物类型
+        if item_type == "person":
+            return None
+        
+        # 发布日期
+        if item_type == "tv":
+            release_date = item.get("first_air_date")
+        else:
+            release_date = item.get("release_date")
+        
+        # 其他基本信息
+        overview = item.get("overview", "")
+        rating = round(item.get("vote_average", 0), 1)
+        poster_path = item.get("poster_path")
+        poster_url = self.get_image_url(poster_path) if poster_path else ""
+        
+        # 数据质量检查（在补全前进行，避免为低质量数据发请求）
+        if (rating == 0 and 
+            not release_date and 
+            not overview and 
+            not poster_url):
+            logger.debug(f"跳过低质量数据: {title}")
+            return None
+        
+        return {
+            "id": media_id,
+            "title": title,
+            "type": item_type,
+            "rating": rating,
+            "release_date": release_date,
+            "overview": overview,
+            "poster_url": poster_url,
+            "genre_ids": item.get("genre_ids")
+        }
+    
+    @staticmethod
+    def merge_enrichment(summary: Dict, enrichment: Dict) -> Dict:
+        """合并基本信息和补全信息，保持输出字段顺序"""
+        return {
+            "id": summary["id"],
+            "title": summary["title"],
+            "type": summary["type"],
+            "genreTitle": enrichment["genreTitle"],
+            "rating": summary["rating"],
+            "release_date": summary["release_date"],
+            "overview": summary["overview"],
+            "poster_url": summary["poster_url"],
+            "title_backdrop": enrichment["title_backdrop"]
+        }
+    
+    def enrich_summary(self, summary: Dict, language: str = DEFAULT_LANGUAGE,
+                       region: str = DEFAULT_REGION) -> Dict:
+        """获取类型和标题背景图（未变化条目和同一运行内重复出现的条目直接复用）"""
+        enrichment = self._previous_enrichment(summary, language, region)
+        if enrichment is None:
+            enrichment = self.enrich_media(
+                summary["type"], summary["id"], summary["genre_ids"], language
+            )
+        return enrichment
+    
+    def process_media_item(self, item: Dict, media_type: str = None,
+                           language: str = DEFAULT_LANGUAGE, region: str = DEFAULT_REGION) -> Optional[Dict]:
+        """处理单个媒体项目"""
+        try:
+            summary = self.summarize_item(item, media_type)
+            if not summary:
+                return None
+            return self.merge_enrichment(summary, self.enrich_summary(summary, language, region))
             
         except Exception as e:
             logger.error(f"处理媒体项目失败: {e}")
             return None
     
-    def process_tmdb_data(self, data: Dict, media_type: str = "all") -> List[Dict]:
+    def process_tmdb_data(self, data: Dict, media_type: str = "all",
+                          language: str = DEFAULT_LANGUAGE, region: str = DEFAULT_REGION) -> List[Dict]:
         """处理TMDB数据"""
         results = []
         items = data.get("results", [])
         
-        logger.info(f"开始处理 {len(items)} 个媒体项目")
+        logger.info(f"开始处理 {len(items)} 个媒体项目 (并发数: {self.max_workers})")
         
-        for item in items:
-            processed_item = self.process_media_item(item, media_type)
+        if self.max_workers > 1 and len(items) > 1:
+            # 并发补全详情和图片，map 保证输出顺序与输入一致
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                processed_items = list(executor.map(
+                    lambda item: self.process_media_item(item, media_type, language, region),
+                    items
+                ))
+        else:
+            processed_items = [self.process_media_item(item, media_type, language, region) for item in items]
+        
+        for processed_item in processed_items:
             if processed_item:
                 results.append(processed_item)
         
@@ -256,14 +723,271 @@ class TMDBCrawler:
         return results
 
 
-def save_to_json(data: Dict, filepath: Path):
-    """保存数据到JSON文件"""
+def create_crawler(engine: str = None, **kwargs) -> TMDBCrawler:
+    """按引擎名称创建爬虫"""
+    engine = engine or CRAWLER_ENGINE
+    if engine == "async":
+        from tmdb_async import AsyncTMDBCrawler
+        return AsyncTMDBCrawler(**kwargs)
+    if engine != "sync":
+        raise ValueError(f"未知的爬虫引擎: {engine}")
+    return TMDBCrawler(**kwargs)
+
+
+def parse_markets(value: str) -> List[Tuple[str, str]]:
+    """解析 "语言:地区" 列表，例如 zh-CN:CN,en-US:US"""
+    markets = []
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        language, _, region = entry.partition(":")
+        if not region:
+            region = language.split("-")[-1] if "-" in language else DEFAULT_REGION
+        markets.append((language, region.upper()))
+    return markets or [(DEFAULT_LANGUAGE, DEFAULT_REGION)]
+
+
+def market_key(language: str, region: str) -> str:
+    """市场在输出文件中的键"""
+    return f"{language}_{region}"
+
+
+def parse_sections(value: str) -> List[SectionConfig]:
+    """解析启用的榜单列表，未知的榜单键被忽略"""
+    sections = []
+    for key in value.split(","):
+        key = key.strip()
+        if not key:
+            continue
+        if key not in SECTIONS:
+            logger.warning(f"未知的榜单: {key}，可用: {', '.join(SECTIONS)}")
+            continue
+        sections.append(SECTIONS[key])
+    return sections or [SECTIONS[key] for key in DEFAULT_SECTION_KEYS]
+
+
+def market_sections(crawler: TMDBCrawler, language: str, region: str,
+                    sections: Iterable[SectionConfig] = None) -> List[Tuple[SectionConfig, Callable[[int], Dict]]]:
+    """某个市场的榜单及其按页获取函数"""
+    def fetcher(section: SectionConfig) -> Callable[[int], Dict]:
+        return lambda page: crawler.fetch_section_page(section, page, language, region)
+    
+    return [(section, fetcher(section)) for section in (sections or parse_sections(SECTION_KEYS))]
+
+
+def section_page_count(pages: int, max_items: Optional[int]) -> int:
+    """有条数上限时不抓取用不到的页"""
+    if max_items:
+        return max(1, min(pages, -(-max_items // TMDB_PAGE_SIZE)))
+    return pages
+
+
+def rank_page_items(page: int, data: Dict,
+                    max_items: Optional[int] = None) -> List[Tuple[Tuple[int, int], Dict]]:
+    """为单页条目附加排名 (页码, 序号)，超出条数上限的条目被丢弃"""
+    ranked = []
+    for index, item in enumerate(data.get("results", [])):
+        if max_items and (page - 1) * TMDB_PAGE_SIZE + index >= max_items:
+            break
+        ranked.append(((page, index), item))
+    return ranked
+
+
+def page_requests(sections: List[Tuple[SectionConfig, Callable[[int], Dict]]],
+                  pages: int) -> List[Tuple[SectionConfig, Callable[[int], Dict], int]]:
+    """展开所有榜单需要抓取的页 (榜单, 获取函数, 页码)"""
+    return [
+        (section, fetch_page, page)
+        for section, fetch_page in sections
+        for page in range(1, section_page_count(pages, section.max_items) + 1)
+    ]
+
+
+class SectionSchedule:
+    """一个市场内所有榜单的调度状态
+    
+    页面到达后记录各榜单的带排名摘要，同一条目 (type, id) 在所有榜单中只进入一次补全队列；
+    补全结束后按排名组装各榜单。翻页期间排名变动会导致跨页重复，保留排名最靠前的一次，
+    与页面到达顺序无关。
+    """
+    
+    def __init__(self, crawler: TMDBCrawler, sections: Iterable[SectionConfig]):
+        self.crawler = crawler
+        self.sections = list(sections)
+        # {榜单键: {(type, id): (排名, 摘要)}}
+        self.entries: Dict[str, Dict[Tuple[str, int], Tuple[Tuple[int, int], Dict]]] = {
+            s.key: {} for s in self.sections
+        }
+        self._queued: Set[Tuple[str, int]] = set()
+    
+    def add_page(self, section: SectionConfig, page: int, data: Dict) -> List[Dict]:
+        """加入一页条目，返回需要新提交补全的摘要"""
+        new_summaries = []
+        entries = self.entries[section.key]
+        for rank, item in rank_page_items(page, data, section.max_items):
+            try:
+                summary = self.crawler.summarize_item(item, section.media_type)
+            except Exception as e:
+                logger.error(f"处理媒体项目失败: {e}")
+                continue
+            if not summary:
+                continue
+            
+            key = (summary["type"], summary["id"])
+            if key in entries:
+                if rank < entries[key][0]:
+                    entries[key] = (rank, summary)
+                continue
+            entries[key] = (rank, summary)
+            if key in self._queued:
+                # 已在其他榜单（或本榜单其他页）中排队，补全结果共用
+                self.crawler._record_memo_hit()
+            else:
+                self._queued.add(key)
+                new_summaries.append(summary)
+        return new_summaries
+    
+    def assemble(self, enrichments: Dict[Tuple[str, int], Union[Dict, BaseException]]) -> Dict[str, List[Dict]]:
+        """按排名组装各榜单，补全失败的条目被丢弃"""
+        for key, enrichment in enrichments.items():
+            if isinstance(enrichment, BaseException):
+                logger.error(f"处理媒体项目失败: {key[0]}/{key[1]} ({enrichment})")
+        
+        results = {}
+        for section in self.sections:
+            entries = sorted(self.entries[section.key].values(), key=lambda pair: pair[0])
+            items = []
+            for _, summary in entries:
+                enrichment = enrichments.get((summary["type"], summary["id"]))
+                if enrichment is not None and not isinstance(enrichment, BaseException):
+                    items.append(self.crawler.merge_enrichment(summary, enrichment))
+            results[section.key] = items
+            logger.info(f"榜单 {section.key}: {len(entries)} 个条目，{len(items)} 个有效")
+        return results
+
+
+def schedule_sections(crawler: TMDBCrawler, sections: List[Tuple[SectionConfig, Callable[[int], Dict]]],
+                      pages: int = 1, language: str = DEFAULT_LANGUAGE,
+                      region: str = DEFAULT_REGION) -> Dict[str, List[Dict]]:
+    """并发抓取多个榜单：所有页同时请求，条目合并为一个去重的补全队列，最后按排名组装"""
+    schedule = SectionSchedule(crawler, [section for section, _ in sections])
+    with ThreadPoolExecutor(max_workers=crawler.max_workers) as executor:
+        # 列表页先提交，补全任务排在其后，保证各榜单的列表尽早到达
+        page_futures = {
+            executor.submit(fetch_page, page): (section, page)
+            for section, fetch_page, page in page_requests(sections, pages)
+        }
+        enrich_futures: Dict[Tuple[str, int], Future] = {}
+        for future in as_completed(page_futures):
+            section, page = page_futures[future]
+            for summary in schedule.add_page(section, page, future.result()):
+                key = (summary["type"], summary["id"])
+                enrich_futures[key] = executor.submit(crawler.enrich_summary, summary, language, region)
+        
+        enrichments = {}
+        for key, future in enrich_futures.items():
+            try:
+                enrichments[key] = future.result()
+            except Exception as e:
+                enrichments[key] = e
+    
+    logger.info(f"补全队列: {len(enrich_futures)} 个去重后的条目")
+    return schedule.assemble(enrichments)
+
+
+def crawl_section(crawler: TMDBCrawler, fetch_page: Callable[[int], Dict], media_type: str = "all",
+                  pages: int = 1, max_items: Optional[int] = None,
+                  language: str = DEFAULT_LANGUAGE, region: str = DEFAULT_REGION) -> List[Dict]:
+    """流式抓取单个榜单：页面到达后立即去重并提交补全，最后按排名组装"""
+    section = SectionConfig("section", "", "", media_type, max_items=max_items)
+    return schedule_sections(crawler, [(section, fetch_page)], pages, language, region)[section.key]
+
+
+def collect_market(crawler: TMDBCrawler, language: str = DEFAULT_LANGUAGE,
+                   region: str = DEFAULT_REGION, pages: int = 1,
+                   sections: Iterable[SectionConfig] = None) -> Dict[str, List[Dict]]:
+    """一次调度某个市场的所有榜单"""
+    if GENRE_MAP_ENABLED and language not in crawler.genre_maps:
+        crawler.load_genre_map(language)
+    
+    sections = market_sections(crawler, language, region, sections)
+    logger.info(f"并发获取 {len(sections)} 个榜单 ({language}/{region}, {pages} 页)")
+    return schedule_sections(crawler, sections, pages, language, region)
+
+
+def collect_markets(crawler: TMDBCrawler, markets: List[Tuple[str, str]] = None,
+                    pages: int = None) -> Dict[str, Dict[str, List[Dict]]]:
+    """抓取所有市场的榜单，返回 {市场键: {榜单键: 条目列表}}，第一个为主市场"""
+    markets = markets or parse_markets(MARKETS)
+    pages = pages or PAGE_DEPTH
+    if crawler.engine == "async":
+        from tmdb_async import run_markets
+        return run_markets(crawler, markets, pages)
+    
+    return {
+        market_key(language, region): collect_market(crawler, language, region, pages)
+        for language, region in markets
+    }
+
+
+def load_json(filepath: Path) -> Optional[Dict]:
+    """读取JSON文件，不存在或格式错误时返回 None"""
     try:
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        with open(filepath, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"读取数据失败: {filepath} ({e})")
+        return None
+
+
+def save_to_json(data: Dict, filepath: Path) -> bool:
+    """保存数据到JSON文件，同时生成压缩变体和列式导出（原子替换）
+    
+    榜单共用一个去重的补全队列，要等全部补全结束才能组装，增量更新和列式导出也需要
+    完整文档，因此这里传入的是组装好的文档；流式写出省去的是整份 JSON 文本的内存。
+    """
+    try:
+        written_paths = write_json_document(data, filepath)
         logger.info(f"数据已保存到: {filepath}")
+        for path in written_paths[1:]:
+            logger.info(f"压缩变体: {path.name} ({path.stat().st_size / 1024:.1f} KB)")
     except Exception as e:
         logger.error(f"保存数据失败: {e}")
+        return False
+
+    # 列式导出失败不影响主数据文件
+    if COLUMNAR_ENABLED:
+        try:
+            for path in write_columnar(data, filepath):
+                logger.info(f"列式导出: {path.name} ({path.stat().st_size / 1024:.1f} KB)")
+        except (OSError, ValueError) as e:
+            logger.warning(f"列式导出失败: {e}")
+    return True
+
+
+def save_with_delta(data: Dict, previous: Optional[Dict], filepath: Path, delta_dir: Path) -> Optional[Dict]:
+    """保存带版本号的快照，并发布相对上次快照的增量，返回增量"""
+    feed = DeltaFeed(delta_dir, DELTA_HISTORY, f"../{filepath.name}")
+    # 版本号紧跟在 last_updated 之后
+    versioned = {"last_updated": data.get("last_updated"), VERSION_FIELD: feed.next_version(previous)}
+    versioned.update(data)
+    if not save_to_json(versioned, filepath):
+        return None
+    
+    try:
+        delta = feed.publish(previous, versioned)
+    except (OSError, ValueError) as e:
+        logger.error(f"发布增量更新失败: {e}")
+        return None
+    if delta:
+        logger.info(
+            f"增量更新: 版本 {delta['base_version']} -> {delta['version']}，"
+            f"{len(delta['sections'])} 个榜单有变化 ({feed.manifest['deltas'][-1]['bytes'] / 1024:.1f} KB)"
+        )
+    return delta
 
 
 def print_trending_results(results: List[Dict], section_title: str):
@@ -284,6 +1008,37 @@ def print_trending_results(results: List[Dict], section_title: str):
         print(f"{i:2d}. {title} ({item_type}) 评分: {rating} | {genre_title}")
 
 
+def save_metrics(crawler: TMDBCrawler):
+    """写出本次运行的指标（JSON 汇总和 Prometheus textfile）"""
+    extra = {
+        "engine": crawler.engine,
+        "enrich_memo_hits": crawler.enrich_memo_hits,
+        "enrich_requests_saved": crawler.enrich_requests_saved,
+        "incremental_reused": crawler.incremental_reused,
+    }
+    try:
+        crawler.metrics.write(METRICS_PATH, PROMETHEUS_PATH, extra)
+    except OSError as e:
+        logger.warning(f"保存运行指标失败: {e}")
+        return
+    
+    summary = crawler.metrics.summary()
+    logger.info(
+        f"运行指标: {summary['requests']} 次请求，重试 {summary['retries']} 次，"
+        f"失败 {summary['failures']} 次，耗时 {summary['duration_seconds']:.1f} 秒"
+    )
+    slowest = sorted(
+        (item for item in summary["endpoints"].items() if item[1]["latency"]),
+        key=lambda item: item[1]["latency"]["sum"], reverse=True
+    )
+    for template, stats in slowest[:3]:
+        latency = stats["latency"]
+        logger.info(
+            f"  {template}: {stats['requests']} 次，累计 {latency['sum']:.1f} 秒，"
+            f"p95 {latency['p95'] * 1000:.0f} ms"
+        )
+
+
 def get_beijing_time() -> str:
     """获取北京时间"""
     beijing_timezone = timezone(timedelta(hours=8))
@@ -301,49 +1056,59 @@ def main():
     print(f"✅ 热门数据获取时间: {last_updated}")
     
     # 初始化爬虫
-    crawler = TMDBCrawler()
+    crawler = create_crawler()
     
     # 检查API密钥
     if not crawler.api_key:
         logger.warning("TMDB API密钥未设置，生成空数据文件")
-        data_to_save = {
-            "last_updated": last_updated,
-            "today_global": [],
-            "week_global_all": [],
-            "popular_movies": []
-        }
+        data_to_save = {"last_updated": last_updated}
+        data_to_save.update((section.key, []) for section in parse_sections(SECTION_KEYS))
         save_to_json(data_to_save, SAVE_PATH)
+        crawler.close()
         print("================= 执行完成 =================")
         return
     
+    # 启用持久化响应缓存
+    cache = ResponseCache(CACHE_PATH) if HTTP_CACHE_ENABLED else None
+    crawler.cache = cache
+    
+    # 增量模式：载入上次的输出
+    # 上次的输出同时用于增量模式和增量更新
+    previous_data = load_json(SAVE_PATH) if INCREMENTAL_ENABLED or DELTA_ENABLED else None
+    if INCREMENTAL_ENABLED and previous_data:
+        crawler.load_previous_items(previous_data)
+    
     try:
-        # 获取各类数据
-        logger.info("获取今日全球热门数据")
-        today_global = crawler.fetch_trending_data(time_window="day", media_type="all")
-        today_processed = crawler.process_tmdb_data(today_global, "all")
-        
-        logger.info("获取本周全球热门数据")
-        week_global_all = crawler.fetch_trending_data(time_window="week", media_type="all")
-        week_processed = crawler.process_tmdb_data(week_global_all, "all")
-        
-        logger.info("获取热门电影数据")
-        popular_movies = crawler.fetch_popular_movies()
-        popular_processed = crawler.process_tmdb_data(popular_movies, "movie")
+        # 获取各市场的榜单数据，第一个市场写入顶层字段
+        market_results = collect_markets(crawler)
+        primary_key, *other_keys = list(market_results)
+        primary_sections = market_results[primary_key]
         
         # 打印结果
-        print_trending_results(today_processed, "今日热门")
-        print_trending_results(week_processed, "本周热门")
-        print_trending_results(popular_processed, "热门电影")
+        for key, items in primary_sections.items():
+            print_trending_results(items, SECTIONS[key].title)
+        
+        logger.info(
+            f"跨榜单去重命中 {crawler.enrich_memo_hits} 次，"
+            f"节省 {crawler.enrich_requests_saved} 次API请求"
+        )
+        if INCREMENTAL_ENABLED:
+            logger.info(f"增量模式: 复用 {crawler.incremental_reused} 个未变化条目的补全信息")
+        if cache:
+            logger.info(
+                f"响应缓存: 直接命中 {cache.fresh_hits} 次，"
+                f"304重新验证 {cache.revalidated} 次，实际下载 {cache.misses} 次"
+            )
         
         # 保存数据
-        data_to_save = {
-            "last_updated": last_updated,
-            "today_global": today_processed,
-            "week_global_all": week_processed,
-            "popular_movies": popular_processed
-        }
+        data_to_save = {"last_updated": last_updated, **primary_sections}
+        if other_keys:
+            data_to_save["markets"] = {key: market_results[key] for key in other_keys}
         
-        save_to_json(data_to_save, SAVE_PATH)
+        if DELTA_ENABLED:
+            save_with_delta(data_to_save, previous_data, SAVE_PATH, DELTA_DIR)
+        else:
+            save_to_json(data_to_save, SAVE_PATH)
         
         logger.info("数据获取完成")
         print("")
@@ -352,6 +1117,12 @@ def main():
     except Exception as e:
         logger.error(f"执行过程中发生错误: {e}")
         print(f"❌ 执行失败: {e}")
+    
+    finally:
+        save_metrics(crawler)
+        crawler.close()
+        if cache:
+            cache.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+JSON 数据文件流式写出
+Streaming JSON writer with minified / gzip / brotli variants and atomic replace
+"""
+
+import gzip
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    import brotli
+except ImportError:  # 可选依赖，缺失时跳过 .br 变体
+    brotli = None
+
+# 可生成的变体：min -> .min.json，gz -> .json.gz，br -> .json.br
+ALL_VARIANTS = ("min", "gz", "br")
+DEFAULT_VARIANTS = tuple(
+    v.strip() for v in os.getenv("TMDB_OUTPUT_VARIANTS", ",".join(ALL_VARIANTS)).split(",") if v.strip()
+)
+
+PRETTY_INDENT = 2
+COMPACT_SEPARATORS = (",", ":")
+
+
+def _current_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# mkstemp 创建的临时文件权限为 0600，替换前改为与 open() 相同的 0666 & ~umask
+FILE_MODE = 0o666 & ~_current_umask()
+
+
+def variant_path(path: Path, variant: str) -> Path:
+    """获取变体文件路径"""
+    path = Path(path)
+    if variant == "min":
+        return path.with_name(f"{path.stem}.min{path.suffix}")
+    return path.with_name(f"{path.name}.{variant}")
+
+
+class _AtomicFile:
+    """写入同目录临时文件，提交时通过 rename 原子替换目标文件"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        fd, tmp_name = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp")
+        self.tmp_path = Path(tmp_name)
+        self.file = os.fdopen(fd, "wb")
+
+    def commit(self):
+        self.file.flush()
+        os.fchmod(self.file.fileno(), FILE_MODE)
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        self.file.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
+class _Sink:
+    """单个输出文件，可选压缩"""
+
+    def __init__(self, path: Path, compression: Optional[str] = None):
+        self.atomic = _AtomicFile(path)
+        self.compression = compression
+        if compression == "gz":
+            # mtime=0 保证内容不变时压缩结果也不变，便于 git 判断是否有变化
+            self.stream = gzip.GzipFile(fileobj=self.atomic.file, mode="wb", compresslevel=9, mtime=0)
+        elif compression == "br":
+            self.compressor = brotli.Compressor(quality=11)
+            self.stream = None
+        else:
+            self.stream = self.atomic.file
+
+    def write(self, data: bytes):
+        if self.compression == "br":
+            self.atomic.file.write(self.compressor.process(data))
+        else:
+            self.stream.write(data)
+
+    def commit(self):
+        if self.compression == "gz":
+            self.stream.close()
+        elif self.compression == "br":
+            self.atomic.file.write(self.compressor.finish())
+        self.atomic.commit()
+
+    def discard(self):
+        self.atomic.discard()
+
+
+class StreamingJSONWriter:
+    """逐字段、逐条目写出顶层为对象的 JSON 文档
+
+    美化版与 json.dump(indent=2) 输出一致；压缩变体在同一遍中写出。
+    所有文件在 close() 时原子替换，异常退出时保留旧文件。
+    """
+
+    def __init__(self, path: Path, variants: Iterable[str] = DEFAULT_VARIANTS):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        variants = [v for v in variants if v in ALL_VARIANTS and (v != "br" or brotli is not None)]
+        self._pretty = [_Sink(self.path)]
+        self._compact = []
+        for variant in variants:
+            compression = None if variant == "min" else variant
+            self._compact.append(_Sink(variant_path(self.path, variant), compression))
+
+        self.written_paths: List[Path] = [self.path] + [variant_path(self.path, v) for v in variants]
+        self._field_count = 0
+        self._write("{", "{")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def _write(self, pretty: str, compact: str):
+        pretty_bytes = pretty.encode("utf-8")
+        compact_bytes = compact.encode("utf-8")
+        for sink in self._pretty:
+            sink.write(pretty_bytes)
+        for sink in self._compact:
+            sink.write(compact_bytes)
+
+    def _begin_field(self, key: str):
+        separator = "," if self._field_count else ""
+        self._field_count += 1
+        encoded_key = json.dumps(key, ensure_ascii=False)
+        self._write(f"{separator}\n  {encoded_key}: ", f"{separator}{encoded_key}:")
+
+    @staticmethod
+    def _dumps_pretty(value: Any, level: int) -> str:
+        text = json.dumps(value, ensure_ascii=False, indent=PRETTY_INDENT)
+        return text.replace("\n", "\n" + " " * (PRETTY_INDENT * level))
+
+    @staticmethod
+    def _dumps_compact(value: Any) -> str:
+        return json.dumps(value, ensure_ascii=False, separators=COMPACT_SEPARATORS)
+
+    def write_field(self, key: str, value: Any):
+        """写出一个完整字段"""
+        self._begin_field(key)
+        self._write(self._dumps_pretty(value, 1), self._dumps_compact(value))
+
+    def write_section(self, key: str, items: Iterable[Dict]) -> int:
+        """逐条写出数组字段，返回写出的条目数"""
+        self._begin_field(key)
+        count = 0
+        for item in items:
+            prefix = "," if count else "["
+            self._write(f"{prefix}\n    {self._dumps_pretty(item, 2)}", f"{prefix}{self._dumps_compact(item)}")
+            count += 1
+        if count:
+            self._write("\n  ]", "]")
+        else:
+            self._write("[]", "[]")
+        return count
+
+    def close(self):
+        """结束文档并原子替换所有输出文件"""
+        self._write("\n}" if self._field_count else "}", "}")
+        for sink in self._pretty + self._compact:
+            sink.commit()
+
+    def discard(self):
+        """放弃写入，删除临时文件"""
+        for sink in self._pretty + self._compact:
+            sink.discard()
+
+
+def write_json_document(data: Dict, path: Path, variants: Iterable[str] = DEFAULT_VARIANTS) -> List[Path]:
+    """写出完整文档（列表字段逐条流式写出），返回生成的文件路径"""
+    with StreamingJSONWriter(path, variants) as writer:
+        for key, value in data.items():
+            if isinstance(value, list):
+                writer.write_section(key, value)
+            else:
+                writer.write_field(key, value)
+    return writer.written_paths
+
+
+def write_bytes_atomic(path: Path, data: bytes):
+    """原子写出二进制文件"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic = _AtomicFile(path)
+    try:
+        atomic.file.write(data)
+    except BaseException:
+        atomic.discard()
+        raise
+    atomic.commit()
+
+
+def write_text_atomic(path: Path, text: str):
+    """原子写出文本文件"""
+    write_bytes_atomic(path, text.encode("utf-8"))
+
+
+def dumps_compact(data: Any) -> str:
+    """生成压缩的 JSON 字符串"""
+    return json.dumps(data, ensure_ascii=False, separators=COMPACT_SEPARATORS)
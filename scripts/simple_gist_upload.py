@@ -47,6 +47,10 @@ def upload_to_gist(data):
             "files": {
                 "TMDB_Trending.json": {
                     "content": json.dumps(data, ensure_ascii=False, indent=2)
+                },
+                # 压缩版本，供 Widget 频繁拉取
+                "TMDB_Trending.min.json": {
+                    "content": json.dumps(data, ensure_ascii=False, separators=(',', ':'))
                 }
             }
         }
@@ -56,9 +60,12 @@ def upload_to_gist(data):
         
         gist_info = response.json()
         raw_url = gist_info['files']['TMDB_Trending.json']['raw_url']
+        min_raw_url = gist_info['files'].get('TMDB_Trending.min.json', {}).get('raw_url')
         
         print(f"✅ 数据已上传到 Gist")
         print(f"📊 原始数据 URL: {raw_url}")
+        if min_raw_url:
+            print(f"📦 压缩数据 URL: {min_raw_url}")
         print(f"🌐 Gist 页面: https://gist.github.com/{GIST_ID}")
         
         return raw_url
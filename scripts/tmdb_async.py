@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+TMDB 异步爬虫引擎
+Async crawler engine on a single pooled httpx client (keep-alive, optional HTTP/2)
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import httpx
+except ImportError:  # 可选依赖，仅异步引擎需要
+    httpx = None
+
+from get_tmdb_data import (
+    DEFAULT_LANGUAGE,
+    DEFAULT_REGION,
+    GENRE_MAP_ENABLED,
+    MAX_RETRIES,
+    REQUEST_HEADERS,
+    REQUEST_TIMEOUT,
+    SectionConfig,
+    SectionSchedule,
+    TMDBCrawler,
+    logger,
+    market_key,
+    market_sections,
+    page_requests,
+)
+from tmdb_cache import ResponseCache
+from tmdb_metrics import CrawlerMetrics
+from tmdb_ratelimit import TokenBucket
+
+# 连接池配置
+MAX_CONNECTIONS = int(os.getenv("TMDB_MAX_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = 30
+HTTP2_ENABLED = os.getenv("TMDB_HTTP2", "0") == "1"
+
+# httpx 会以 INFO 级别记录完整URL（含 api_key），避免泄露到日志
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+class AsyncTMDBCrawler(TMDBCrawler):
+    """TMDB 异步爬虫类
+
+    与 TMDBCrawler 接口一致，fetch_trending_data / get_media_details /
+    get_media_images / process_tmdb_data 等方法返回协程。
+    """
+
+    engine = "async"
+
+    def __init__(self, api_key: str = None, max_workers: int = None,
+                 cache: Optional[ResponseCache] = None,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 combined_fetch: bool = None, base_url: str = None,
+                 metrics: Optional[CrawlerMetrics] = None,
+                 max_connections: int = None, http2: bool = None,
+                 transport: Optional["httpx.AsyncBaseTransport"] = None):
+        if httpx is None:
+            raise ImportError("异步引擎需要 httpx，请安装: pip install httpx")
+        http2 = HTTP2_ENABLED if http2 is None else http2
+        if http2:
+            try:
+                import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+            except ImportError:
+                raise ImportError("TMDB_HTTP2=1 需要 HTTP/2 支持，请安装: pip install 'httpx[http2]'")
+
+        super().__init__(api_key, max_workers, cache, rate_limiter, combined_fetch, base_url, metrics)
+        self.max_connections = max_connections or MAX_CONNECTIONS
+        self.http2 = http2
+        self.client = httpx.AsyncClient(
+            http2=self.http2,
+            timeout=REQUEST_TIMEOUT,
+            headers=REQUEST_HEADERS,
+            transport=transport,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            )
+        )
+        self._async_memo: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _create_session(self):
+        """异步引擎使用 httpx 连接池，不创建 requests 连接池"""
+        return None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """关闭连接池"""
+        await self.client.aclose()
+
+    def close(self):
+        """在事件循环之外关闭连接池（未经 run_markets 抓取时使用，已关闭时不做任何事）"""
+        if not self.client.is_closed:
+            asyncio.run(self.aclose())
+
+    async def _make_request(self, endpoint: str, params: Dict = None) -> Optional[Dict]:
+        """发送异步请求并处理错误"""
+        if not self.api_key:
+            logger.warning("TMDB API密钥未设置")
+            return None
+
+        url = f"{self.base_url}{endpoint}"
+        request_params = self._build_params(params)
+
+        cache_key, cached, is_fresh = self._lookup_cache(endpoint, params)
+        if is_fresh:
+            return cached["data"]
+        headers = self.cache.validation_headers(cached) if self.cache else {}
+
+        for attempt in range(MAX_RETRIES):
+            await self.rate_limiter.acquire_async()
+            started = time.perf_counter()
+            try:
+                response = await self.client.get(url, params=request_params, headers=headers)
+            except httpx.HTTPError as e:
+                self.metrics.observe_request(endpoint, None, time.perf_counter() - started)
+                delay = self._retry_delay(endpoint, attempt, error=e)
+            else:
+                self.metrics.observe_request(endpoint, response.status_code, time.perf_counter() - started)
+                if response.status_code == 304 and cached:
+                    return self._revalidated(endpoint, cache_key, cached)
+
+                if response.status_code < 400:
+                    try:
+                        data = response.json()
+                    except ValueError as e:
+                        logger.error(f"响应解析失败: {endpoint} ({e})")
+                        self.metrics.record_failure(endpoint)
+                        return None
+                    self._store_cache(endpoint, cache_key, data, response.headers)
+                    return data
+
+                delay = self._retry_delay(
+                    endpoint, attempt,
+                    status=response.status_code,
+                    headers=response.headers
+                )
+
+            if delay is None:
+                return None
+            await asyncio.sleep(delay)
+
+        return None
+
+    async def _request(self, endpoint: str, params: Dict, default: Dict,
+                       transform: Callable[[Dict], Dict] = None) -> Dict:
+        """发送请求，失败时返回默认值"""
+        data = await self._make_request(endpoint, params)
+        return self._finish_response(data, default, transform)
+
+    async def load_genre_map(self, language: str = DEFAULT_LANGUAGE):
+        """并发载入电影和剧集的类型映射"""
+        movie_genres, tv_genres = await asyncio.gather(
+            self.fetch_genre_list("movie", language),
+            self.fetch_genre_list("tv", language)
+        )
+        self.genre_maps[language] = {
+            "movie": self.build_genre_map(movie_genres),
+            "tv": self.build_genre_map(tv_genres)
+        }
+        self._log_genre_map(language)
+
+    async def _fetch_enrichment(self, media_type: str, media_id: int,
+                                genre_ids: Optional[List[int]] = None,
+                                language: str = DEFAULT_LANGUAGE) -> Dict:
+        """请求详情和图片（分开请求时并发），提取类型标题和标题背景图"""
+        genre_title = self.resolve_genre_title(media_type, genre_ids, language)
+        if genre_title is not None:
+            # 类型可本地解析，只需请求图片
+            image_data = await self.get_media_images(media_type, media_id)
+            return {
+                "genreTitle": genre_title,
+                "title_backdrop": self.get_best_title_backdrop(image_data, media_type)
+            }
+
+        if self.combined_fetch:
+            combined = await self.get_media_details_with_images(media_type, media_id, language)
+            detail_data, image_data = self.split_detail_images(combined)
+        else:
+            detail_data, image_data = await asyncio.gather(
+                self.get_media_details(media_type, media_id, language),
+                self.get_media_images(media_type, media_id)
+            )
+        return self._build_enrichment(media_type, detail_data, image_data)
+
+    async def enrich_media(self, media_type: str, media_id: int,
+                           genre_ids: Optional[List[int]] = None,
+                           language: str = DEFAULT_LANGUAGE) -> Dict:
+        """获取补全信息，按 (media_type, id, language) 在本次运行内去重"""
+        key = (media_type, media_id, language)
+        future = self._async_memo.get(key)
+        if future is not None:
+            self._record_memo_hit()
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._async_memo[key] = future
+        try:
+            result = await self._fetch_enrichment(media_type, media_id, genre_ids, language)
+        except Exception as e:
+            self._async_memo.pop(key, None)
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+
+        future.set_result(result)
+        return result
+
+    async def enrich_summary(self, summary: Dict, language: str = DEFAULT_LANGUAGE,
+                             region: str = DEFAULT_REGION) -> Dict:
+        """获取类型和标题背景图，同时进行的补全数不超过 max_workers"""
+        enrichment = self._previous_enrichment(summary, language, region)
+        if enrichment is None:
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.max_workers)
+            async with self._semaphore:
+                enrichment = await self.enrich_media(
+                    summary["type"], summary["id"], summary["genre_ids"], language
+                )
+        return enrichment
+
+    async def process_media_item(self, item: Dict, media_type: str = None,
+                                 language: str = DEFAULT_LANGUAGE,
+                                 region: str = DEFAULT_REGION) -> Optional[Dict]:
+        """处理单个媒体项目"""
+        try:
+            summary = self.summarize_item(item, media_type)
+            if not summary:
+                return None
+            return self.merge_enrichment(summary, await self.enrich_summary(summary, language, region))
+
+        except Exception as e:
+            logger.error(f"处理媒体项目失败: {e}")
+            return None
+
+    async def process_tmdb_data(self, data: Dict, media_type: str = "all",
+                                language: str = DEFAULT_LANGUAGE,
+                                region: str = DEFAULT_REGION) -> List[Dict]:
+        """处理TMDB数据，gather 保证输出顺序与输入一致"""
+        items = data.get("results", [])
+
+        logger.info(f"开始处理 {len(items)} 个媒体项目 (异步并发数: {self.max_workers})")
+
+        processed_items = await asyncio.gather(
+            *(self.process_media_item(item, media_type, language, region) for item in items)
+        )
+        results = [item for item in processed_items if item]
+
+        logger.info(f"成功处理 {len(results)} 个有效项目")
+        return results
+
+
+async def schedule_sections_async(crawler: AsyncTMDBCrawler,
+                                  sections: List[Tuple[SectionConfig, Callable[[int], Awaitable[Dict]]]],
+                                  pages: int = 1, language: str = DEFAULT_LANGUAGE,
+                                  region: str = DEFAULT_REGION) -> Dict[str, List[Dict]]:
+    """并发抓取多个榜单：所有页同时请求，条目合并为一个去重的补全队列，最后按排名组装"""
+    schedule = SectionSchedule(crawler, [section for section, _ in sections])
+
+    async def fetch(section: SectionConfig, fetch_page, page: int):
+        return section, page, await fetch_page(page)
+
+    tasks: Dict[Tuple[str, int], asyncio.Task] = {}
+    for next_page in asyncio.as_completed([fetch(*request) for request in page_requests(sections, pages)]):
+        section, page, data = await next_page
+        for summary in schedule.add_page(section, page, data):
+            key = (summary["type"], summary["id"])
+            tasks[key] = asyncio.ensure_future(crawler.enrich_summary(summary, language, region))
+
+    results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    logger.info(f"补全队列: {len(tasks)} 个去重后的条目")
+    return schedule.assemble(dict(zip(tasks, results)))
+
+
+async def collect_market_async(crawler: AsyncTMDBCrawler, language: str = DEFAULT_LANGUAGE,
+                               region: str = DEFAULT_REGION, pages: int = 1,
+                               sections: Iterable[SectionConfig] = None) -> Dict[str, List[Dict]]:
+    """一次调度某个市场的所有榜单"""
+    if GENRE_MAP_ENABLED and language not in crawler.genre_maps:
+        await crawler.load_genre_map(language)
+
+    sections = market_sections(crawler, language, region, sections)
+    logger.info(f"并发获取 {len(sections)} 个榜单 ({language}/{region}, {pages} 页)")
+    return await schedule_sections_async(crawler, sections, pages, language, region)
+
+
+def run_markets(crawler: AsyncTMDBCrawler, markets: List[Tuple[str, str]],
+                pages: int = 1) -> Dict[str, Dict[str, List[Dict]]]:
+    """在新的事件循环中并发抓取所有市场，结束后关闭连接池"""
+    async def run():
+        async with crawler:
+            results = await asyncio.gather(*(
+                collect_market_async(crawler, language, region, pages)
+                for language, region in markets
+            ))
+        return {
+            market_key(language, region): sections
+            for (language, region), sections in zip(markets, results)
+        }
+
+    return asyncio.run(run())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+TMDB 响应持久化缓存
+Persistent on-disk HTTP response cache (SQLite + zlib) with per-endpoint TTL
+and ETag / Last-Modified revalidation
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+# 各类接口的缓存有效期(秒)，按顺序匹配；0 表示每次都用条件请求重新验证
+ENDPOINT_TTLS = [
+    (re.compile(r"^/genre/"), 7 * 24 * 3600),
+    (re.compile(r"^/configuration"), 7 * 24 * 3600),
+    (re.compile(r"^/(movie|tv)/\d+/images$"), 24 * 3600),
+    (re.compile(r"^/(movie|tv)/\d+$"), 6 * 3600),
+    (re.compile(r"^/trending/"), 0),
+    (re.compile(r"^/(movie|tv)/[a-z_]+$"), 0),
+]
+DEFAULT_TTL = 0
+
+# 超过该时间未被使用的条目会在打开缓存时清理
+PRUNE_AFTER = 30 * 24 * 3600
+
+# 参与缓存键计算时忽略的参数
+IGNORED_PARAMS = {"api_key"}
+
+
+def get_endpoint_ttl(endpoint: str) -> int:
+    """获取接口对应的缓存有效期"""
+    for pattern, ttl in ENDPOINT_TTLS:
+        if pattern.search(endpoint):
+            return ttl
+    return DEFAULT_TTL
+
+
+def make_cache_key(endpoint: str, params: Dict = None) -> str:
+    """根据接口和参数生成缓存键（忽略 api_key）"""
+    items = sorted(
+        (k, str(v)) for k, v in (params or {}).items() if k not in IGNORED_PARAMS
+    )
+    query = "&".join(f"{k}={v}" for k, v in items)
+    return f"{endpoint}?{query}" if query else endpoint
+
+
+class ResponseCache:
+    """基于 SQLite 的响应缓存，响应体以 zlib 压缩存储"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "DELETE FROM responses WHERE stored_at < ?", (time.time() - PRUNE_AFTER,)
+        )
+        self._conn.commit()
+
+        # 统计信息
+        self.fresh_hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def record(self, result: str):
+        """记录一次缓存结果 (fresh / revalidated / miss)，工作线程并发调用时加锁计数"""
+        with self._lock:
+            if result == "fresh":
+                self.fresh_hits += 1
+            elif result == "revalidated":
+                self.revalidated += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> Optional[Dict]:
+        """读取缓存条目，不存在时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+        if not row:
+            return None
+
+        body, etag, last_modified, stored_at = row
+        try:
+            data = json.loads(zlib.decompress(body).decode("utf-8"))
+        except (zlib.error, ValueError):
+            return None
+
+        return {
+            "data": data,
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": stored_at,
+        }
+
+    def is_fresh(self, entry: Dict, ttl: int) -> bool:
+        """判断缓存条目是否仍在有效期内"""
+        return ttl > 0 and time.time() - entry["stored_at"] < ttl
+
+    def validation_headers(self, entry: Optional[Dict]) -> Dict:
+        """构建条件请求头"""
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def set(self, key: str, data: Dict, etag: str = None, last_modified: str = None):
+        """写入缓存条目"""
+        body = zlib.compress(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, body, etag, last_modified, stored_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, body, etag, last_modified, time.time()),
+            )
+            self._conn.commit()
+
+    def touch(self, key: str):
+        """304 重新验证成功后刷新条目时间"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET stored_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+
+    def iter_entries(self) -> Iterator[Tuple[str, Dict]]:
+        """遍历所有缓存条目 (缓存键, 响应内容)，用于导出回放数据"""
+        with self._lock:
+            rows = self._conn.execute("SELECT key, body FROM responses ORDER BY key").fetchall()
+        for key, body in rows:
+            try:
+                yield key, json.loads(zlib.decompress(body).decode("utf-8"))
+            except (zlib.error, ValueError):
+                continue
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
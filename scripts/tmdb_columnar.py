@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+TMDB 数据列式导出
+Compact columnar export with a shared string table, relative image paths and
+interned genres, written as compact JSON and (optionally) MessagePack
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖，缺失时只生成列式 JSON
+    msgpack = None
+
+from json_output import dumps_compact, write_bytes_atomic, write_text_atomic
+from tmdb_delta import VERSION_FIELD, flatten_document, set_path
+
+COLUMNAR_FORMAT = 1
+IMAGE_BASE_URL = "https://image.tmdb.org/t/p/"
+GENRE_SEPARATOR = "•"
+
+# 按字段名选择的列编码，其余字符串字段进入字符串表，数值原样保存
+IMAGE_FIELDS = ("poster_url", "title_backdrop")
+GENRE_FIELDS = ("genreTitle",)
+
+# 可生成的格式: json -> .columnar.json，msgpack -> .msgpack
+ALL_FORMATS = ("json", "msgpack")
+
+
+def columnar_path(path: Path, fmt: str) -> Path:
+    """获取列式导出的文件路径"""
+    path = Path(path)
+    if fmt == "msgpack":
+        return path.with_suffix(".msgpack")
+    return path.with_name(f"{path.stem}.columnar{path.suffix}")
+
+
+class _Interner:
+    """字符串表：相同字符串只保存一次"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def add(self, value: str) -> int:
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+
+def _column_encoding(field: str, values: List[Any]) -> str:
+    """为一列选择编码，类型不符合预期时退回原样保存"""
+    if all(isinstance(value, str) for value in values):
+        if field in IMAGE_FIELDS:
+            return "image"
+        if field in GENRE_FIELDS:
+            return "genres"
+    if all(value is None or isinstance(value, str) for value in values):
+        return "string"
+    return "raw"
+
+
+class ColumnarEncoder:
+    """把快照编码为列式结构，字符串表、类型表和图片尺寸表在所有榜单之间共享"""
+
+    def __init__(self, image_base: str = IMAGE_BASE_URL):
+        self.image_base = image_base
+        self.strings = _Interner()
+        self.genres = _Interner()
+        self.sizes = _Interner()
+
+    def _encode_image(self, url: str):
+        """图片 URL -> [尺寸序号, 路径序号]，空字符串为 null，非 TMDB 图片为完整 URL 的字符串序号"""
+        if not url:
+            return None
+        if url.startswith(self.image_base):
+            size, slash, path = url[len(self.image_base):].partition("/")
+            if slash:
+                return [self.sizes.add(size), self.strings.add(slash + path)]
+        return self.strings.add(url)
+
+    def _encode_value(self, encoding: str, value: Any):
+        if encoding == "string":
+            return None if value is None else self.strings.add(value)
+        if encoding == "image":
+            return self._encode_image(value)
+        if encoding == "genres":
+            return [self.genres.add(name) for name in value.split(GENRE_SEPARATOR)] if value else []
+        return value
+
+    def encode_section(self, items: List[Dict]) -> Dict:
+        """把一个榜单的条目列表转为列"""
+        fields = list(items[0]) if items else []
+        for item in items:
+            if list(item) != fields:
+                raise ValueError(f"榜单条目字段不一致，无法列式导出: {list(item)} != {fields}")
+
+        encodings, columns = {}, {}
+        for field in fields:
+            values = [item[field] for item in items]
+            encodings[field] = encoding = _column_encoding(field, values)
+            columns[field] = [self._encode_value(encoding, value) for value in values]
+        return {"count": len(items), "encodings": encodings, "columns": columns}
+
+    def encode(self, document: Dict) -> Dict:
+        """编码完整快照"""
+        sections, fields = flatten_document(document)
+        encoded_sections = {path: self.encode_section(items) for path, items in sections.items()}
+        result = {"format": COLUMNAR_FORMAT, "fields": fields}
+        if VERSION_FIELD in document:
+            result[VERSION_FIELD] = document[VERSION_FIELD]
+        result.update({
+            "image_base": self.image_base,
+            "strings": self.strings.values,
+            "genres": self.genres.values,
+            "sizes": self.sizes.values,
+            "sections": encoded_sections,
+        })
+        return result
+
+
+def encode_columnar(document: Dict) -> Dict:
+    """快照 -> 列式结构"""
+    return ColumnarEncoder().encode(document)
+
+
+def _decode_column(encoding: str, values: List[Any], data: Dict) -> List[Any]:
+    """解码单列（逐列推导式，避免逐值函数调用）"""
+    if encoding == "raw":
+        return values
+    strings = data["strings"]
+    if encoding == "string":
+        return [None if value is None else strings[value] for value in values]
+    if encoding == "genres":
+        genres = data["genres"]
+        return [GENRE_SEPARATOR.join([genres[index] for index in value]) for value in values]
+    if encoding == "image":
+        prefixes = [f"{data['image_base']}{size}" for size in data["sizes"]]
+        return [
+            "" if value is None else strings[value] if isinstance(value, int)
+            else prefixes[value[0]] + strings[value[1]]
+            for value in values
+        ]
+    raise ValueError(f"未知的列编码: {encoding}")
+
+
+def decode_columns(section: Dict, data: Dict) -> Dict[str, List[Any]]:
+    """解码一个榜单的所有列 {字段: 值列表}，按列访问时无需构建条目字典"""
+    return {
+        field: _decode_column(section["encodings"][field], values, data)
+        for field, values in section["columns"].items()
+    }
+
+
+def decode_section(section: Dict, data: Dict) -> List[Dict]:
+    """列 -> 条目列表"""
+    columns = decode_columns(section, data)
+    if not columns:
+        return [{} for _ in range(section["count"])]
+    fields = list(columns)
+    return [dict(zip(fields, row)) for row in zip(*columns.values())]
+
+
+def decode_columnar(data: Dict) -> Dict:
+    """列式结构 -> 快照（与原 JSON 完全一致）"""
+    if data.get("format") != COLUMNAR_FORMAT:
+        raise ValueError(f"不支持的列式格式: {data.get('format')}")
+    document: Dict = {}
+    for path, value in data["fields"].items():
+        set_path(document, path, value)
+    if VERSION_FIELD in data:
+        document[VERSION_FIELD] = data[VERSION_FIELD]
+    for path, section in data["sections"].items():
+        set_path(document, path, decode_section(section, data))
+    return document
+
+
+def dumps_msgpack(data: Dict) -> bytes:
+    if msgpack is None:
+        raise ImportError("MessagePack 导出需要 msgpack，请安装: pip install msgpack")
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def load_columnar(path: Path) -> Dict:
+    """读取列式导出文件（按扩展名识别 JSON / MessagePack），返回快照"""
+    path = Path(path)
+    with open(path, "rb") as f:
+        raw = f.read()
+    if path.suffix == ".msgpack":
+        if msgpack is None:
+            raise ImportError("读取 MessagePack 需要 msgpack，请安装: pip install msgpack")
+        data = msgpack.unpackb(raw, raw=False, strict_map_key=False)
+    else:
+        data = json.loads(raw)
+    return decode_columnar(data)
+
+
+def write_columnar(document: Dict, path: Path, formats=ALL_FORMATS) -> List[Path]:
+    """写出列式导出文件（原子替换），返回生成的文件路径"""
+    data = encode_columnar(document)
+    written = []
+    for fmt in formats:
+        target = columnar_path(path, fmt)
+        if fmt == "json":
+            write_text_atomic(target, dumps_compact(data))
+        elif fmt == "msgpack" and msgpack is not None:
+            write_bytes_atomic(target, dumps_msgpack(data))
+        else:
+            continue
+        written.append(target)
+    return written
+
+
+def _measure(load, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        load()
+    return (time.perf_counter() - started) / repeat
+
+
+def compare(json_path: Path, repeat: int = 200) -> List[Tuple[str, int, float]]:
+    """对比原 JSON 与列式导出的大小和读取耗时 [(文件名, 字节数, 每次读取秒数)]"""
+    json_path = Path(json_path)
+    results = []
+    for path in [json_path] + [columnar_path(json_path, fmt) for fmt in ALL_FORMATS]:
+        if not path.exists() or (path.suffix == ".msgpack" and msgpack is None):
+            continue
+        raw = path.read_bytes()
+        if path == json_path:
+            seconds = _measure(lambda: json.loads(raw), repeat)
+        elif path.suffix == ".msgpack":
+            seconds = _measure(lambda: decode_columnar(msgpack.unpackb(raw, raw=False)), repeat)
+        else:
+            seconds = _measure(lambda: decode_columnar(json.loads(raw)), repeat)
+        results.append((path.name, len(raw), seconds))
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口：从已有快照生成列式导出并对比大小和读取耗时"""
+    parser = argparse.ArgumentParser(description="TMDB 数据列式导出")
+    parser.add_argument("snapshot", type=Path, nargs="?",
+                        default=Path(__file__).parent.parent / "data" / "TMDB_Trending.json")
+    parser.add_argument("--repeat", type=int, default=200, help="测量读取耗时的重复次数")
+    args = parser.parse_args(argv)
+
+    with open(args.snapshot, "r", encoding="utf-8") as f:
+        document = json.load(f)
+    write_columnar(document, args.snapshot)
+    for name, size, seconds in compare(args.snapshot, args.repeat):
+        print(f"{name:32s} {size / 1024:8.1f} KB  读取 {seconds * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
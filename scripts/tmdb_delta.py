@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+TMDB 榜单增量更新
+Versioned per-section deltas against the previous snapshot, plus a manifest
+so a client holding version N can fetch only N -> latest
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from json_output import dumps_compact, write_text_atomic
+
+logger = logging.getLogger(__name__)
+
+# 增量格式版本，格式不兼容时递增
+DELTA_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+# 快照中记录版本号的字段
+VERSION_FIELD = "version"
+# 嵌套榜单的路径分隔符，例如 markets/en-US_US/today_global
+PATH_SEPARATOR = "/"
+
+_MISSING = object()
+
+
+def item_key(item: Dict) -> Tuple[str, int]:
+    """条目的唯一键 (type, id)"""
+    return item.get("type"), item.get("id")
+
+
+def flatten_document(document: Dict, prefix: str = "") -> Tuple[Dict[str, List], Dict[str, Any]]:
+    """把快照拆分为 {路径: 榜单列表} 和 {路径: 其他字段}，版本号字段除外"""
+    sections, fields = {}, {}
+    for key, value in document.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, list):
+            sections[path] = value
+        elif isinstance(value, dict):
+            nested_sections, nested_fields = flatten_document(value, path + PATH_SEPARATOR)
+            sections.update(nested_sections)
+            fields.update(nested_fields)
+        elif path != VERSION_FIELD:
+            fields[path] = value
+    return sections, fields
+
+
+def set_path(document: Dict, path: str, value: Any):
+    """按路径写入嵌套字段，flatten_document 的逆操作"""
+    *parents, key = path.split(PATH_SEPARATOR)
+    for parent in parents:
+        document = document.setdefault(parent, {})
+    document[key] = value
+
+
+def diff_section(old: List[Dict], new: List[Dict]) -> Optional[Dict]:
+    """计算一个榜单的增量，没有变化时返回 None
+
+    排名为新列表中的下标。changed 只包含变化的字段，moved 为内容不变但排名变化的条目，
+    排名和内容都不变的条目不出现在增量中。
+    """
+    old_keys = [item_key(item) for item in old]
+    new_keys = [item_key(item) for item in new]
+    if len(set(old_keys)) != len(old_keys) or len(set(new_keys)) != len(new_keys):
+        # 榜单内有重复条目时无法按键对应，整体替换
+        return {"size": len(new), "replace": new} if old != new else None
+
+    old_index = {key: (rank, item) for rank, (key, item) in enumerate(zip(old_keys, old))}
+    new_key_set = set(new_keys)
+    removed = [list(key) for key in old_keys if key not in new_key_set]
+    added, changed, moved = [], [], []
+    for rank, (key, item) in enumerate(zip(new_keys, new)):
+        previous = old_index.get(key)
+        if previous is None:
+            added.append([rank, item])
+            continue
+        old_rank, old_item = previous
+        if set(old_item) - set(item):
+            # 字段被删除，按删除后重新添加处理
+            removed.append(list(key))
+            added.append([rank, item])
+            continue
+        changes = {field: value for field, value in item.items() if old_item.get(field, _MISSING) != value}
+        if changes:
+            changed.append([rank, *key, changes])
+        elif rank != old_rank:
+            moved.append([rank, *key])
+
+    if not (removed or added or changed or moved):
+        return None
+    delta = {"size": len(new)}
+    for name, entries in (("removed", removed), ("added", added), ("changed", changed), ("moved", moved)):
+        if entries:
+            delta[name] = entries
+    return delta
+
+
+def apply_section(old: List[Dict], delta: Dict) -> List[Dict]:
+    """把增量应用到榜单，返回新列表"""
+    if "replace" in delta:
+        return list(delta["replace"])
+
+    removed = {tuple(key) for key in delta.get("removed", [])}
+    kept = {item_key(item): (rank, item) for rank, item in enumerate(old) if item_key(item) not in removed}
+    result: List[Optional[Dict]] = [None] * delta["size"]
+    placed = set()
+
+    for rank, item in delta.get("added", []):
+        result[rank] = item
+    for rank, media_type, media_id, changes in delta.get("changed", []):
+        key = (media_type, media_id)
+        result[rank] = {**kept[key][1], **changes}
+        placed.add(key)
+    for rank, media_type, media_id in delta.get("moved", []):
+        key = (media_type, media_id)
+        result[rank] = kept[key][1]
+        placed.add(key)
+    for key, (rank, item) in kept.items():
+        if key not in placed:
+            result[rank] = item
+
+    if any(item is None for item in result):
+        raise ValueError("增量与快照不匹配")
+    return result
+
+
+def diff_documents(old: Dict, new: Dict) -> Dict:
+    """计算两个快照之间所有榜单和字段的增量"""
+    old_sections, old_fields = flatten_document(old)
+    new_sections, new_fields = flatten_document(new)
+
+    sections = {}
+    for path, items in new_sections.items():
+        delta = diff_section(old_sections.get(path, []), items)
+        if delta is None and path not in old_sections:
+            delta = {"size": 0}
+        if delta is not None:
+            sections[path] = delta
+
+    result = {
+        "sections": sections,
+        "fields": {path: value for path, value in new_fields.items() if old_fields.get(path, _MISSING) != value},
+    }
+    removed_sections = [path for path in old_sections if path not in new_sections]
+    removed_fields = [path for path in old_fields if path not in new_fields]
+    if removed_sections:
+        result["removed_sections"] = removed_sections
+    if removed_fields:
+        result["removed_fields"] = removed_fields
+    return result
+
+
+def apply_delta(document: Dict, delta: Dict) -> Dict:
+    """把一个版本的增量应用到快照，返回新快照"""
+    if document.get(VERSION_FIELD) != delta["base_version"]:
+        raise ValueError(f"快照版本 {document.get(VERSION_FIELD)} 与增量基础版本 {delta['base_version']} 不一致")
+
+    sections, fields = flatten_document(document)
+    for path in delta.get("removed_sections", []):
+        sections.pop(path, None)
+    for path in delta.get("removed_fields", []):
+        fields.pop(path, None)
+    for path, section_delta in delta.get("sections", {}).items():
+        sections[path] = apply_section(sections.get(path, []), section_delta)
+    fields.update(delta.get("fields", {}))
+
+    result: Dict = {}
+    for path, value in fields.items():
+        set_path(result, path, value)
+    result[VERSION_FIELD] = delta["version"]
+    for path, items in sections.items():
+        set_path(result, path, items)
+    return result
+
+
+def plan_updates(manifest: Dict, version: Optional[int]) -> Optional[List[str]]:
+    """客户端持有 version 时需要依次获取的增量文件，返回 None 表示需要重新下载完整快照"""
+    if version == manifest["version"]:
+        return []
+    if version is None or not manifest["min_version"] <= version < manifest["version"]:
+        return None
+    return [entry["path"] for entry in manifest["deltas"] if entry["version"] > version]
+
+
+class DeltaFeed:
+    """增量更新目录
+
+    v{N}.json 为从版本 N-1 到 N 的增量（发布后不再修改），manifest.json 记录最新版本、
+    可增量升级的最低版本和可用的增量文件，超出保留数量的旧增量被删除。
+    """
+
+    def __init__(self, directory: Path, history: int = 96, snapshot: str = "../TMDB_Trending.json"):
+        self.directory = Path(directory)
+        self.history = max(1, history)
+        self.snapshot = snapshot
+        self.manifest_path = self.directory / MANIFEST_NAME
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> Dict:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("format") == DELTA_FORMAT:
+                return manifest
+            logger.warning(f"增量清单格式不兼容，重新开始: {self.manifest_path}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取增量清单失败，重新开始: {e}")
+        return {"format": DELTA_FORMAT, "version": 0, "min_version": 0, "deltas": []}
+
+    def next_version(self, previous: Optional[Dict] = None) -> int:
+        """下一个版本号，同时参考清单和上次快照，保证单调递增"""
+        previous_version = previous.get(VERSION_FIELD) if previous else None
+        return max(self.manifest.get("version", 0), previous_version or 0) + 1
+
+    def publish(self, previous: Optional[Dict], current: Dict) -> Optional[Dict]:
+        """写出 previous -> current 的增量并更新清单（current 须已带有新版本号），返回增量"""
+        version = current[VERSION_FIELD]
+        base_version = previous.get(VERSION_FIELD) if previous else None
+        deltas = list(self.manifest.get("deltas", []))
+
+        delta = None
+        if base_version is None or base_version != self.manifest.get("version"):
+            # 首次运行，或上次快照与清单不一致：从当前快照重新开始，旧客户端需下载完整快照
+            logger.info(f"增量更新: 从版本 {version} 重新开始")
+            deltas = []
+        else:
+            delta = {"format": DELTA_FORMAT, "version": version, "base_version": base_version,
+                     **diff_documents(previous, current)}
+            name = f"v{version}.json"
+            text = dumps_compact(delta)
+            write_text_atomic(self.directory / name, text)
+            deltas.append({"version": version, "path": name, "bytes": len(text.encode("utf-8"))})
+        deltas = deltas[-self.history:]
+
+        self.manifest = {
+            "format": DELTA_FORMAT,
+            "version": version,
+            "min_version": deltas[0]["version"] - 1 if deltas else version,
+            "last_updated": current.get("last_updated"),
+            "snapshot": self.snapshot,
+            "deltas": deltas,
+        }
+        write_text_atomic(self.manifest_path, json.dumps(self.manifest, ensure_ascii=False, indent=2) + "\n")
+
+        # 清单写出后再删除过期的增量，正在升级的客户端不会读到缺失的文件
+        listed = {entry["path"] for entry in deltas}
+        for path in self.directory.glob("v*.json"):
+            if path.name not in listed:
+                path.unlink(missing_ok=True)
+        return delta
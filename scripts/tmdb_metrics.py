@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+TMDB 爬虫运行指标
+Per-endpoint request counters, latency histograms and cache/retry stats,
+exported as a JSON summary and a Prometheus textfile
+"""
+
+import json
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Optional
+
+from json_output import write_text_atomic
+
+# 延迟直方图的桶上限(秒)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Prometheus 指标名前缀
+METRIC_PREFIX = "tmdb_crawler"
+
+# /movie/123/images -> /{type}/{id}/images
+_ID_SEGMENT = re.compile(r"^/(movie|tv)/\d+(?=/|$)")
+
+
+def endpoint_template(endpoint: str) -> str:
+    """把接口路径中的媒体类型和 ID 折叠为模板，控制指标的标签数量"""
+    endpoint = endpoint.partition("?")[0]
+    return _ID_SEGMENT.sub("/{type}/{id}", endpoint)
+
+
+class Histogram:
+    """固定桶的延迟直方图"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """按桶上限估算分位数，落在最后一个桶时返回最大值"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative_counts(self):
+        """Prometheus 风格的累计桶 [(上限, 累计数)]，最后一个为 +Inf"""
+        cumulative, result = 0, []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            result.append((bound, cumulative))
+        return result
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 4),
+            "avg": round(self.sum / self.count, 4) if self.count else 0.0,
+            "max": round(self.max, 4),
+            "p50": round(self.quantile(0.5), 4),
+            "p95": round(self.quantile(0.95), 4),
+        }
+
+
+class CrawlerMetrics:
+    """线程安全的爬虫指标，按接口模板统计请求、延迟、重试、失败和缓存命中"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.responses: Dict[str, Counter] = defaultdict(Counter)
+        self.latency: Dict[str, Histogram] = defaultdict(Histogram)
+        self.retries: Counter = Counter()
+        self.failures: Counter = Counter()
+        self.cache: Dict[str, Counter] = defaultdict(Counter)
+
+    def observe_request(self, endpoint: str, status: Optional[int], seconds: float):
+        """记录一次 HTTP 请求，status 为 None 表示网络错误"""
+        template = endpoint_template(endpoint)
+        with self._lock:
+            self.responses[template][str(status) if status is not None else "error"] += 1
+            self.latency[template].observe(seconds)
+
+    def record_retry(self, endpoint: str):
+        with self._lock:
+            self.retries[endpoint_template(endpoint)] += 1
+
+    def record_failure(self, endpoint: str):
+        with self._lock:
+            self.failures[endpoint_template(endpoint)] += 1
+
+    def record_cache(self, endpoint: str, result: str):
+        """记录缓存结果: fresh (直接命中) / revalidated (304) / miss (重新下载)"""
+        with self._lock:
+            self.cache[endpoint_template(endpoint)][result] += 1
+
+    @staticmethod
+    def _hit_ratio(counts: Counter) -> Optional[float]:
+        lookups = counts["fresh"] + counts["revalidated"] + counts["miss"]
+        if not lookups:
+            return None
+        return round((counts["fresh"] + counts["revalidated"]) / lookups, 4)
+
+    def summary(self, extra: Dict = None) -> Dict:
+        """汇总为可序列化的字典"""
+        with self._lock:
+            templates = sorted(set(self.responses) | set(self.cache) | set(self.failures))
+            endpoints = {}
+            total_cache: Counter = Counter()
+            for template in templates:
+                responses = self.responses.get(template, Counter())
+                cache = self.cache.get(template, Counter())
+                total_cache.update(cache)
+                endpoints[template] = {
+                    "requests": sum(responses.values()),
+                    "responses": dict(sorted(responses.items())),
+                    "retries": self.retries[template],
+                    "failures": self.failures[template],
+                    "cache": dict(sorted(cache.items())),
+                    "cache_hit_ratio": self._hit_ratio(cache),
+                    "latency": self.latency[template].to_dict() if template in self.latency else None,
+                }
+            return {
+                "duration_seconds": round(time.monotonic() - self.started, 3),
+                "requests": sum(sum(counts.values()) for counts in self.responses.values()),
+                "retries": sum(self.retries.values()),
+                "failures": sum(self.failures.values()),
+                "cache_hit_ratio": self._hit_ratio(total_cache),
+                **(extra or {}),
+                "endpoints": endpoints,
+            }
+
+    def to_prometheus(self, extra: Dict = None) -> str:
+        """生成 Prometheus textfile 格式的指标"""
+        p = METRIC_PREFIX
+        lines = [
+            f"# HELP {p}_requests_total HTTP requests sent to TMDB by endpoint and status.",
+            f"# TYPE {p}_requests_total counter",
+        ]
+        with self._lock:
+            for template, responses in sorted(self.responses.items()):
+                for status, count in sorted(responses.items()):
+                    lines.append(f'{p}_requests_total{{endpoint="{template}",status="{status}"}} {count}')
+
+            lines += [
+                f"# HELP {p}_request_duration_seconds TMDB request latency by endpoint.",
+                f"# TYPE {p}_request_duration_seconds histogram",
+            ]
+            for template, histogram in sorted(self.latency.items()):
+                for bound, count in histogram.cumulative_counts():
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f'{p}_request_duration_seconds_bucket{{endpoint="{template}",le="{le}"}} {count}')
+                lines.append(f'{p}_request_duration_seconds_sum{{endpoint="{template}"}} {histogram.sum:.6f}')
+                lines.append(f'{p}_request_duration_seconds_count{{endpoint="{template}"}} {histogram.count}')
+
+            for name, counts, help_text in (
+                ("retries_total", self.retries, "Retried TMDB requests by endpoint."),
+                ("failures_total", self.failures, "TMDB requests that failed after all retries."),
+            ):
+                lines += [f"# HELP {p}_{name} {help_text}", f"# TYPE {p}_{name} counter"]
+                for template, count in sorted(counts.items()):
+                    lines.append(f'{p}_{name}{{endpoint="{template}"}} {count}')
+
+            lines += [
+                f"# HELP {p}_cache_total Response cache lookups by endpoint and result.",
+                f"# TYPE {p}_cache_total counter",
+            ]
+            for template, counts in sorted(self.cache.items()):
+                for result, count in sorted(counts.items()):
+                    lines.append(f'{p}_cache_total{{endpoint="{template}",result="{result}"}} {count}')
+
+            duration = time.monotonic() - self.started
+
+        gauges = {"run_duration_seconds": duration, "last_run_timestamp_seconds": time.time()}
+        gauges.update({key: value for key, value in (extra or {}).items() if isinstance(value, (int, float))})
+        for name, value in gauges.items():
+            lines += [f"# TYPE {p}_{name} gauge", f"{p}_{name} {float(value)}"]
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_path: Path, prometheus_path: Path, extra: Dict = None):
+        """写出 JSON 汇总和 Prometheus textfile（原子替换，避免采集到半个文件）"""
+        write_text_atomic(json_path, json.dumps(self.summary(extra), ensure_ascii=False, indent=2) + "\n")
+        write_text_atomic(prometheus_path, self.to_prometheus(extra))
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+TMDB 请求限流与重试策略
+Shared token-bucket rate limiter, jittered backoff and Retry-After parsing
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+# TMDB 官方限制约为每秒 50 个请求，默认留出余量
+RATE_LIMIT = float(os.getenv("TMDB_RATE_LIMIT", "40"))
+RATE_BURST = int(os.getenv("TMDB_RATE_BURST", "20"))
+
+# 可重试的状态码，其余 4xx/5xx 直接失败
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# 退避上限(秒)，Retry-After 超过该值时同样截断，避免定时任务长时间挂起
+MAX_BACKOFF = 60
+
+
+class TokenBucket:
+    """线程安全的令牌桶，同步线程和异步协程共用"""
+
+    def __init__(self, rate: float = RATE_LIMIT, burst: int = RATE_BURST):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        """按经过的时间补充令牌（调用方持有锁）"""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self) -> float:
+        """预留一个令牌，返回需要等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def acquire(self):
+        """阻塞直到获得令牌"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """异步等待直到获得令牌"""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """收到 429 后让所有使用者暂停指定时间"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            # 先补充到当前时刻，否则暂停前经过的时间会在下次预留时被算作补充，暂停时间变短
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头（秒数或 HTTP 日期）"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def backoff_delay(attempt: int, base: float) -> float:
+    """指数退避加随机抖动 (equal jitter)"""
+    ceiling = min(MAX_BACKOFF, base * (2 ** attempt))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+# 同一进程内所有爬虫实例共享的限流器
+shared_rate_limiter = TokenBucket()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+TMDB 离线回放服务器
+Local TMDB stand-in serving recorded fixtures (or deterministic synthetic data)
+with configurable latency, error rate and 429 injection
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from tmdb_cache import ResponseCache, make_cache_key
+
+# 合成数据使用的类型列表
+MOVIE_GENRES = {28: "动作", 12: "冒险", 16: "动画", 35: "喜剧", 80: "犯罪", 18: "剧情", 14: "奇幻", 878: "科幻"}
+TV_GENRES = {10759: "动作冒险", 16: "动画", 35: "喜剧", 80: "犯罪", 18: "剧情", 10765: "科幻奇幻"}
+
+# 合成条目的 ID 范围，较小的范围让不同榜单之间有重复条目（与真实数据类似）
+SYNTHETIC_ID_POOL = 300
+SYNTHETIC_PAGE_SIZE = 20
+
+
+@dataclass
+class ReplayConfig:
+    """回放服务器的故障注入配置"""
+    latency: float = 0.0          # 每次请求的固定延迟(秒)
+    jitter: float = 0.0           # 额外的随机延迟上限(秒)
+    error_rate: float = 0.0       # 返回 500 的概率
+    rate_limit_rate: float = 0.0  # 返回 429 的概率
+    retry_after: float = 1.0      # 429 响应的 Retry-After (秒)
+    seed: Optional[int] = None
+
+
+def percentile(values: List[float], q: float) -> float:
+    """最近秩百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def load_fixtures(path: Path) -> Dict[str, Dict]:
+    """读取回放数据 {缓存键: 响应内容}"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def export_fixtures(cache_path: Path, output_path: Path) -> int:
+    """从爬虫的响应缓存导出回放数据，返回条目数"""
+    cache = ResponseCache(cache_path)
+    try:
+        fixtures = dict(cache.iter_entries())
+    finally:
+        cache.close()
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(fixtures, f, ensure_ascii=False)
+    return len(fixtures)
+
+
+def _synthetic_item(media_type: str, media_id: int) -> Dict:
+    """生成一个合成的列表条目，同一条目在所有榜单和页中内容一致（与真实 API 相同）"""
+    rng = random.Random(f"{media_type}/{media_id}")
+    genres = MOVIE_GENRES if media_type == "movie" else TV_GENRES
+    item = {
+        "id": media_id,
+        "media_type": media_type,
+        "vote_average": round(rng.uniform(5, 9), 3),
+        "overview": f"合成条目 {media_type} {media_id} 的简介",
+        "poster_path": f"/poster_{media_type}_{media_id}.jpg",
+        "genre_ids": rng.sample(sorted(genres), 2),
+    }
+    if media_type == "movie":
+        item.update({"title": f"电影 {media_id}", "release_date": "2024-01-01"})
+    else:
+        item.update({"name": f"剧集 {media_id}", "first_air_date": "2024-01-01"})
+    return item
+
+
+def _synthetic_images(rng: random.Random, media_type: str, media_id: int) -> Dict:
+    """生成合成的图片列表"""
+    def image(kind, index, language):
+        return {
+            "file_path": f"/{kind}_{media_type}_{media_id}_{index}.jpg",
+            "iso_639_1": language,
+            "vote_average": round(rng.uniform(0, 10), 2),
+            "width": 1920,
+            "height": 1080 if kind == "backdrop" else 768,
+        }
+    languages = ["zh", "en", None]
+    return {
+        "backdrops": [image("backdrop", i, languages[i]) for i in range(3)],
+        "posters": [],
+        "logos": [image("logo", i, languages[i]) for i in range(2)] if media_type == "tv" else [],
+    }
+
+
+def synthetic_response(endpoint: str, params: Dict) -> Optional[Dict]:
+    """按接口生成确定性的合成响应，未知接口返回 None"""
+    rng = random.Random(make_cache_key(endpoint, params))
+    parts = endpoint.strip("/").split("/")
+
+    if parts[0] == "trending" and len(parts) == 3:
+        media_types = ["movie", "tv"] if parts[1] == "all" else [parts[1]]
+        results = [
+            _synthetic_item(rng.choice(media_types), media_id)
+            for media_id in rng.sample(range(1, SYNTHETIC_ID_POOL), SYNTHETIC_PAGE_SIZE)
+        ]
+        return {"page": int(params.get("page", 1)), "results": results, "total_pages": 500}
+
+    if parts[0] in ("movie", "tv") and len(parts) == 2 and not parts[1].isdigit():
+        # /movie/popular、/tv/on_the_air 等列表接口
+        results = [
+            _synthetic_item(parts[0], media_id)
+            for media_id in rng.sample(range(1, SYNTHETIC_ID_POOL), SYNTHETIC_PAGE_SIZE)
+        ]
+        for item in results:
+            item.pop("media_type")
+        return {"page": int(params.get("page", 1)), "results": results, "total_pages": 500}
+
+    if parts[0] == "genre" and len(parts) == 3:
+        genres = MOVIE_GENRES if parts[1] == "movie" else TV_GENRES
+        return {"genres": [{"id": genre_id, "name": name} for genre_id, name in genres.items()]}
+
+    if parts[0] in ("movie", "tv") and len(parts) >= 2 and parts[1].isdigit():
+        media_type, media_id = parts[0], int(parts[1])
+        if len(parts) == 3 and parts[2] == "images":
+            return _synthetic_images(rng, media_type, media_id)
+        genres = MOVIE_GENRES if media_type == "movie" else TV_GENRES
+        detail = {
+            "id": media_id,
+            "genres": [{"id": genre_id, "name": genres[genre_id]} for genre_id in rng.sample(sorted(genres), 3)],
+        }
+        if params.get("append_to_response") == "images":
+            detail["images"] = _synthetic_images(rng, media_type, media_id)
+        return detail
+
+    return None
+
+
+class ReplayStats:
+    """回放服务器的请求统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.statuses: Counter = Counter()
+            self.bytes_sent = 0
+            self.latencies: List[float] = []
+
+    def record(self, status: int, size: int, seconds: float):
+        with self._lock:
+            self.requests += 1
+            self.statuses[status] += 1
+            self.bytes_sent += size
+            self.latencies.append(seconds)
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+                "bytes": self.bytes_sent,
+                "latency_p50": percentile(self.latencies, 50),
+                "latency_p95": percentile(self.latencies, 95),
+            }
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    # 保持连接，与真实 API 一样可以复用连接池
+    protocol_version = "HTTP/1.1"
+    # 响应头和响应体分两次写出，关闭 Nagle 避免与延迟确认叠加出约 40ms 的额外延迟
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        started = time.perf_counter()
+        parsed = urlsplit(self.path)
+        endpoint = parsed.path[2:] if parsed.path.startswith("/3/") else parsed.path
+        params = dict(parse_qsl(parsed.query))
+
+        status, body, headers = self.server.respond(endpoint, params, self.headers.get("If-None-Match"))
+        delay = self.server.delay()
+        if delay > 0:
+            time.sleep(delay)
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+        self.server.stats.record(status, len(body), time.perf_counter() - started)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """本地 TMDB 替身服务器
+
+    按缓存键 (忽略 api_key) 查找回放数据，找不到时生成合成响应；
+    支持 ETag / If-None-Match，可注入延迟、500 和 429。
+    """
+
+    daemon_threads = True
+
+    def __init__(self, fixtures: Optional[Dict[str, Dict]] = None,
+                 config: Optional[ReplayConfig] = None, synthetic: bool = True,
+                 host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _ReplayHandler)
+        self.fixtures = fixtures or {}
+        self.config = config or ReplayConfig()
+        self.synthetic = synthetic
+        self.stats = ReplayStats()
+        self._rng = random.Random(self.config.seed)
+        self._rng_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """在后台线程中运行"""
+        self._thread = threading.Thread(target=self.serve_forever, name="tmdb-replay", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def _roll(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    def delay(self) -> float:
+        """本次请求的注入延迟"""
+        jitter = self.config.jitter * self._roll() if self.config.jitter else 0.0
+        return self.config.latency + jitter
+
+    def respond(self, endpoint: str, params: Dict,
+                if_none_match: Optional[str] = None) -> Tuple[int, bytes, Dict[str, str]]:
+        """生成响应 (状态码, 响应体, 响应头)"""
+        headers = {"Content-Type": "application/json;charset=utf-8"}
+        roll = self._roll()
+        if roll < self.config.rate_limit_rate:
+            headers["Retry-After"] = f"{self.config.retry_after:g}"
+            body = {"status_code": 25, "status_message": "Your request count is over the allowed limit."}
+            return 429, json.dumps(body).encode("utf-8"), headers
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            body = {"status_code": 11, "status_message": "Internal error: Something went wrong."}
+            return 500, json.dumps(body).encode("utf-8"), headers
+
+        data = self.fixtures.get(make_cache_key(endpoint, params))
+        if data is None and self.synthetic:
+            data = synthetic_response(endpoint, params)
+        if data is None:
+            body = {"status_code": 34, "status_message": "The resource you requested could not be found."}
+            return 404, json.dumps(body).encode("utf-8"), headers
+
+        encoded = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        etag = f'"{hashlib.sha1(encoded).hexdigest()[:16]}"'
+        headers["ETag"] = etag
+        if if_none_match == etag:
+            return 304, b"", {"ETag": etag}
+        return 200, encoded, headers
+
+
+def main():
+    """命令行入口：启动回放服务器或从响应缓存导出回放数据"""
+    parser = argparse.ArgumentParser(description="TMDB 离线回放服务器")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve = subparsers.add_parser("serve", help="启动回放服务器")
+    serve.add_argument("--fixtures", type=Path, help="回放数据文件")
+    serve.add_argument("--no-synthetic", action="store_true", help="找不到回放数据时返回 404")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--latency", type=float, default=0.0)
+    serve.add_argument("--jitter", type=float, default=0.0)
+    serve.add_argument("--error-rate", type=float, default=0.0)
+    serve.add_argument("--rate-limit-rate", type=float, default=0.0)
+
+    export = subparsers.add_parser("export", help="从响应缓存导出回放数据")
+    export.add_argument("cache", type=Path, help="响应缓存文件 (data/.cache/tmdb_responses.sqlite)")
+    export.add_argument("output", type=Path, help="输出的回放数据文件")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        count = export_fixtures(args.cache, args.output)
+        print(f"✅ 已导出 {count} 条回放数据到 {args.output}")
+        return
+
+    config = ReplayConfig(args.latency, args.jitter, args.error_rate, args.rate_limit_rate)
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else None
+    server = ReplayServer(fixtures, config, synthetic=not args.no_synthetic, port=args.port)
+    print(f"🎬 回放服务器已启动: {server.base_url}")
+    print(f"   使用方式: TMDB_BASE_URL={server.base_url} TMDB_API_KEY=replay python scripts/get_tmdb_data.py")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
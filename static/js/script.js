@@ -1,5 +1,12 @@
 // 全局变量
 let iconsData = [];
+let iconsTotal = 0;
+let iconsRevision = null;
+let searchTerm = '';
+let searchTimer = null;
+
+// 每页加载的图标数量
+const PAGE_SIZE = 60;
 
 // DOM 元素
 const uploadForm = document.getElementById('uploadForm');
@@ -9,6 +16,7 @@ const uploadBtn = document.getElementById('uploadBtn');
 const iconsContainer = document.getElementById('iconsContainer');
 const searchInput = document.getElementById('searchInput');
 const refreshBtn = document.getElementById('refreshBtn');
+const loadMoreBtn = document.getElementById('loadMoreBtn');
 const successModal = document.getElementById('successModal');
 const errorModal = document.getElementById('errorModal');
 
@@ -30,7 +38,10 @@ function initializeEventListeners() {
     searchInput.addEventListener('input', handleSearch);
     
     // 刷新按钮
-    refreshBtn.addEventListener('click', loadIcons);
+    refreshBtn.addEventListener('click', () => loadIcons());
+    
+    // 加载更多
+    loadMoreBtn.addEventListener('click', loadMoreIcons);
     
     // 模态框关闭
     document.addEventListener('click', function(e) {
@@ -89,6 +100,9 @@ async function handleUpload(e) {
             uploadForm.reset();
             document.querySelector('.file-input-text').textContent = '点击选择文件';
             loadIcons(); // 重新加载图标列表
+        } else if (result.pending) {
+            // 写入确认超时，图标可能稍后出现
+            showToast(result.message);
         } else {
             showError(result.message);
         }
@@ -116,16 +130,31 @@ function setUploadLoading(loading) {
     }
 }
 
-// 加载图标列表
+// 请求一页图标（服务端筛选）；revision 为第一页返回的内容版本，列表变化时服务端返回 stale
+async function fetchIconsPage(offset, revision = null) {
+    const params = new URLSearchParams({ offset, limit: PAGE_SIZE });
+    if (searchTerm) {
+        params.set('q', searchTerm);
+    }
+    if (revision) {
+        params.set('revision', revision);
+    }
+    const response = await fetch(`/api/icons?${params}`);
+    return response.json();
+}
+
+// 加载图标列表（从第一页开始）
 async function loadIcons() {
     try {
         iconsContainer.innerHTML = '<div class="loading">加载中...</div>';
+        loadMoreBtn.style.display = 'none';
         
-        const response = await fetch('/api/icons');
-        const result = await response.json();
+        const result = await fetchIconsPage(0);
         
         if (result.success) {
             iconsData = result.data.icons || [];
+            iconsTotal = result.data.total ?? iconsData.length;
+            iconsRevision = result.data.revision || null;
             renderIcons(iconsData);
         } else {
             iconsContainer.innerHTML = '<div class="loading">加载失败: ' + result.message + '</div>';
@@ -136,8 +165,45 @@ async function loadIcons() {
     }
 }
 
+// 加载下一页
+async function loadMoreIcons() {
+    loadMoreBtn.disabled = true;
+    try {
+        const result = await fetchIconsPage(iconsData.length, iconsRevision);
+        
+        if (result.success) {
+            iconsData = iconsData.concat(result.data.icons || []);
+            iconsTotal = result.data.total ?? iconsData.length;
+            renderIcons(iconsData);
+        } else if (result.stale) {
+            // 翻页期间有上传或删除，按 offset 继续会跳过或重复条目，从第一页重新加载
+            showToast(result.message);
+            await loadIcons();
+        } else {
+            showError(result.message);
+        }
+    } catch (error) {
+        showError('加载失败，请检查网络连接');
+        console.error('Load more icons error:', error);
+    } finally {
+        loadMoreBtn.disabled = false;
+    }
+}
+
+// 图标展示地址：优先使用缩略图（64px 用于 1x，128px 用于高分屏），缺失时回退到原图
+function iconImageAttrs(icon) {
+    const thumbnails = icon.thumbnails || {};
+    const src = thumbnails['64'] || thumbnails['128'] || icon.url;
+    const srcset = thumbnails['64'] && thumbnails['128']
+        ? ` srcset="${thumbnails['64']} 1x, ${thumbnails['128']} 2x"`
+        : '';
+    return `src="${src}"${srcset}`;
+}
+
 // 渲染图标列表
 function renderIcons(icons) {
+    loadMoreBtn.style.display = icons.length < iconsTotal ? 'block' : 'none';
+    
     if (icons.length === 0) {
         iconsContainer.innerHTML = '<div class="loading">暂无图标</div>';
         return;
@@ -145,7 +211,7 @@ function renderIcons(icons) {
     
     iconsContainer.innerHTML = icons.map(icon => `
         <div class="icon-card" data-name="${icon.name}">
-            <img src="${icon.url}" alt="${icon.name}" class="icon-image" onerror="this.src='data:image/svg+xml,<svg xmlns=%22http://www.w3.org/2000/svg%22 viewBox=%220 0 100 100%22><text y=%22.9em%22 font-size=%2290%22>🖼️</text></svg>'">
+            <img ${iconImageAttrs(icon)} alt="${icon.name}" class="icon-image" loading="lazy" decoding="async" onerror="this.removeAttribute('srcset'); this.src='data:image/svg+xml,<svg xmlns=%22http://www.w3.org/2000/svg%22 viewBox=%220 0 100 100%22><text y=%22.9em%22 font-size=%2290%22>🖼️</text></svg>'">
             <div class="icon-name">${icon.name}</div>
             <div class="icon-actions">
                 <button class="action-btn copy-btn" onclick="copyIconUrl('${icon.url}')">复制链接</button>
@@ -155,13 +221,13 @@ function renderIcons(icons) {
     `).join('');
 }
 
-// 处理搜索
+// 处理搜索（输入停顿后由服务端筛选）
 function handleSearch(e) {
-    const searchTerm = e.target.value.toLowerCase();
-    const filteredIcons = iconsData.filter(icon => 
-        icon.name.toLowerCase().includes(searchTerm)
-    );
-    renderIcons(filteredIcons);
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => {
+        searchTerm = e.target.value.trim();
+        loadIcons();
+    }, 250);
 }
 
 // 复制图标URL
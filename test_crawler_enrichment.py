@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+测试爬虫补全流程（并发与跨榜单去重）
+Test Crawler Enrichment (Concurrency & Cross-Section Dedup)
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# 添加scripts目录到路径
+sys.path.append(str(Path(__file__).parent / "scripts"))
+
+from get_tmdb_data import SECTIONS, TMDBCrawler, collect_market, collect_markets, crawl_section, create_crawler
+
+
+def make_crawler(max_workers=4):
+    """创建使用模拟请求的爬虫（详情和图片分开请求）"""
+    crawler = TMDBCrawler(api_key="mock", max_workers=max_workers, combined_fetch=False)
+    crawler.calls = []
+
+    def mock_details(media_type, media_id, language="zh-CN"):
+        crawler.calls.append(("details", media_type, media_id))
+        time.sleep(0.01)
+        return {"genres": [{"name": f"类型{media_id}"}]}
+
+    def mock_images(media_type, media_id):
+        crawler.calls.append(("images", media_type, media_id))
+        time.sleep(0.01)
+        return {"backdrops": [{"file_path": f"/backdrop_{media_id}.jpg"}], "logos": []}
+
+    crawler.get_media_details = mock_details
+    crawler.get_media_images = mock_images
+    return crawler
+
+
+def make_items(ids, media_type="movie"):
+    """生成模拟热门条目"""
+    return [
+        {"id": media_id, "title": f"标题{media_id}", "media_type": media_type, "vote_average": 7.5}
+        for media_id in ids
+    ]
+
+
+def test_concurrent_enrichment_keeps_order():
+    """测试并发补全保持输出顺序"""
+    crawler = make_crawler(max_workers=8)
+    ids = list(range(20))
+
+    results = crawler.process_tmdb_data({"results": make_items(ids)}, "all")
+
+    assert [item["id"] for item in results] == ids
+    assert results[3]["genreTitle"] == "类型3"
+    assert results[3]["title_backdrop"].endswith("/backdrop_3.jpg")
+
+
+def test_enrichment_order_independent_of_completion():
+    """测试补全并发进行，且先完成的条目不会改变输出顺序"""
+    crawler = make_crawler(max_workers=4)
+    ids = list(range(8))
+    lock = threading.Lock()
+    in_flight = {"now": 0, "max": 0}
+
+    def mock_details(media_type, media_id, language="zh-CN"):
+        with lock:
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        # 排在前面的条目耗时更长，完成顺序与输入顺序相反
+        time.sleep(0.005 * (len(ids) - media_id))
+        with lock:
+            in_flight["now"] -= 1
+        return {"genres": [{"name": f"类型{media_id}"}]}
+
+    crawler.get_media_details = mock_details
+    results = crawler.process_tmdb_data({"results": make_items(ids)}, "all")
+
+    assert [item["id"] for item in results] == ids
+    assert [item["genreTitle"] for item in results] == [f"类型{i}" for i in ids]
+    assert 1 < in_flight["max"] <= 4
+
+
+def test_cross_section_dedup():
+    """测试跨榜单的补全去重"""
+    crawler = make_crawler()
+
+    crawler.process_tmdb_data({"results": make_items([1, 2, 3])}, "all")
+    crawler.process_tmdb_data({"results": make_items([2, 3, 4])}, "all")
+    crawler.process_tmdb_data({"results": make_items([1, 4])}, "movie")
+
+    detail_calls = [call for call in crawler.calls if call[0] == "details"]
+    assert len(detail_calls) == 4
+    assert crawler.enrich_memo_hits == 4
+    assert crawler.enrich_requests_saved == 8
+
+
+def test_incremental_reuses_unchanged_items():
+    """测试增量模式只补全新增或摘要变化的条目"""
+    previous = make_crawler().process_tmdb_data({"results": make_items([1, 2])}, "all")
+    previous[0]["genreTitle"] = "旧类型"
+
+    crawler = make_crawler()
+    crawler.load_previous_items({"last_updated": "", "today_global": previous})
+
+    items = make_items([1, 2, 3])
+    items[1]["vote_average"] = 8.8
+    results = crawler.process_tmdb_data({"results": items}, "all")
+
+    detail_ids = [call[2] for call in crawler.calls if call[0] == "details"]
+    assert sorted(detail_ids) == [2, 3]
+    assert results[0]["genreTitle"] == "旧类型"
+    assert results[1]["rating"] == 8.8
+    assert crawler.incremental_reused == 1
+
+
+def test_incremental_reuse_is_per_market():
+    """测试增量模式只在同一市场内复用补全信息"""
+    previous = make_crawler().process_tmdb_data({"results": make_items([1, 2])}, "all")
+    for item in previous:
+        item["genreTitle"] = "中文类型"
+    english = [dict(item, genreTitle="English") for item in previous[:1]]
+
+    crawler = make_crawler()
+    crawler.load_previous_items(
+        {"last_updated": "", "today_global": previous, "markets": {"en-US_US": {"today_global": english}}},
+        primary_market=("zh-CN", "CN"),
+    )
+
+    results = crawler.process_tmdb_data({"results": make_items([1, 2])}, "all", "en-US", "US")
+    assert results[0]["genreTitle"] == "English"
+    assert results[1]["genreTitle"] == "类型2"
+    detail_ids = [call[2] for call in crawler.calls if call[0] == "details"]
+    assert detail_ids == [2]
+
+    results = crawler.process_tmdb_data({"results": make_items([1, 2])}, "all", "zh-CN", "CN")
+    assert [item["genreTitle"] for item in results] == ["中文类型", "中文类型"]
+    assert crawler.incremental_reused == 3
+
+
+def test_async_engine_matches_sync():
+    """测试异步引擎与同步引擎输出一致"""
+    httpx = pytest.importorskip("httpx")
+
+    def handler(request):
+        path = request.url.path
+        if "/trending/" in path or path.endswith("/popular"):
+            return httpx.Response(200, json={"results": make_items([1, 2, 3])})
+        if "/genre/" in path:
+            return httpx.Response(200, json={"genres": []})
+        media_id = int(path.split("/")[3])
+        images = {"backdrops": [{"file_path": f"/backdrop_{media_id}.jpg"}]}
+        if path.endswith("/images"):
+            return httpx.Response(200, json=images)
+        detail = {"genres": [{"name": f"类型{media_id}"}]}
+        if request.url.params.get("append_to_response") == "images":
+            detail["images"] = images
+        return httpx.Response(200, json=detail)
+
+    crawler = create_crawler("async", api_key="mock", max_workers=4, transport=httpx.MockTransport(handler))
+    # 异步引擎不创建 requests 连接池
+    assert crawler.session is None
+    sections = collect_markets(crawler, [("zh-CN", "CN")])["zh-CN_CN"]
+    # 抓取结束后连接池已关闭
+    assert crawler.client.is_closed
+    today, week, popular = sections["today_global"], sections["week_global_all"], sections["popular_movies"]
+
+    sync_crawler = make_crawler()
+    expected = sync_crawler.process_tmdb_data({"results": make_items([1, 2, 3])}, "all")
+
+    assert today == week == popular == expected
+    # 三个榜单共 9 个条目，只有 3 个需要真正补全
+    assert crawler.enrich_memo_hits == 6
+
+
+def test_async_close_without_crawl():
+    """测试未抓取（如缺少 API 密钥）时 close() 关闭异步引擎的连接池"""
+    pytest.importorskip("httpx")
+    crawler = create_crawler("async", api_key="")
+    crawler.close()
+    assert crawler.client.is_closed
+    crawler.close()
+
+
+def test_combined_fetch_single_request():
+    """测试 append_to_response 合并请求与分开请求结果一致"""
+    combined_crawler = TMDBCrawler(api_key="mock", combined_fetch=True)
+    requested = []
+
+    def mock_make_request(endpoint, params=None):
+        requested.append((endpoint, params))
+        return {
+            "id": 7,
+            "genres": [{"name": "动作"}, {"name": "冒险"}],
+            "images": {"backdrops": [{"file_path": "/backdrop_7.jpg"}], "logos": []}
+        }
+
+    combined_crawler._make_request = mock_make_request
+    result = combined_crawler.process_media_item(make_items([7])[0])
+
+    assert len(requested) == 1
+    assert requested[0][1]["append_to_response"] == "images"
+    assert result["genreTitle"] == "动作•冒险"
+    assert result["title_backdrop"].endswith("/backdrop_7.jpg")
+    assert combined_crawler.requests_per_enrichment == 1
+
+
+def test_genre_map_skips_detail_request():
+    """测试类型映射载入后只请求图片"""
+    crawler = make_crawler()
+    crawler.genre_maps["zh-CN"] = {
+        "movie": {28: "动作", 12: "冒险", 35: "喜剧", 18: "剧情"},
+        "tv": {}
+    }
+
+    items = make_items([1, 2])
+    items[0]["genre_ids"] = [28, 12, 35, 18]
+    items[1]["genre_ids"] = [28, 99999]
+    results = crawler.process_tmdb_data({"results": items}, "all")
+
+    detail_ids = [call[2] for call in crawler.calls if call[0] == "details"]
+    image_ids = [call[2] for call in crawler.calls if call[0] == "images"]
+    assert results[0]["genreTitle"] == "动作•冒险•喜剧"
+    # 未知类型 ID 回退到详情请求
+    assert detail_ids == [2]
+    assert sorted(image_ids) == [1, 2]
+
+
+def test_multi_page_section_streaming():
+    """测试多页榜单按排名组装、跨页去重并遵守条数上限"""
+    crawler = make_crawler()
+    pages = {
+        1: {"results": make_items(range(1, 21))},
+        # 翻页期间排名变动，第 20 条重复出现在第 2 页
+        2: {"results": make_items([20] + list(range(21, 40)))},
+        3: {"results": make_items(range(40, 60))},
+    }
+
+    def fetch_page(page):
+        time.sleep(0.01 * (4 - page))  # 让后面的页先返回
+        return pages[page]
+
+    results = crawl_section(crawler, fetch_page, "all", pages=3)
+    assert [item["id"] for item in results] == list(range(1, 60))
+
+    limited = crawl_section(make_crawler(), fetch_page, "all", pages=3, max_items=25)
+    assert [item["id"] for item in limited] == list(range(1, 21)) + list(range(21, 25))
+
+
+def test_section_scheduler_merges_queue():
+    """测试所有榜单的列表并发获取，条目合并为一个去重的补全队列"""
+    crawler = make_crawler()
+    lists = {
+        "/trending/all/day": make_items([1, 2, 3]),
+        "/movie/top_rated": make_items([3, 4]),
+        "/tv/on_the_air": make_items([1, 5], media_type="tv"),
+    }
+    requested = []
+
+    lock = threading.Lock()
+    in_flight = {"now": 0, "max": 0}
+
+    def mock_fetch_section_page(section, page, language, region):
+        with lock:
+            requested.append((section.endpoint, page))
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        time.sleep(0.05)
+        with lock:
+            in_flight["now"] -= 1
+        return {"results": lists[section.endpoint]}
+
+    crawler.fetch_section_page = mock_fetch_section_page
+    crawler.genre_maps["zh-CN"] = {"movie": {}, "tv": {}}
+    sections = [SECTIONS["today_global"], SECTIONS["top_rated_movies"], SECTIONS["on_the_air_tv"]]
+
+    results = collect_market(crawler, "zh-CN", "CN", pages=2, sections=sections)
+    # 不同榜单的列表页并发获取，而不是逐个榜单串行
+    assert len(requested) == 6
+    assert in_flight["max"] > 1
+
+    assert list(results) == ["today_global", "top_rated_movies", "on_the_air_tv"]
+    assert [item["id"] for item in results["top_rated_movies"]] == [3, 4]
+    assert [item["type"] for item in results["on_the_air_tv"]] == ["tv", "tv"]
+    detail_keys = sorted((call[1], call[2]) for call in crawler.calls if call[0] == "details")
+    assert detail_keys == [("movie", 1), ("movie", 2), ("movie", 3), ("movie", 4), ("tv", 1), ("tv", 5)]
+    assert crawler.enrich_memo_hits == 1
+
+
+if __name__ == "__main__":
+    test_concurrent_enrichment_keeps_order()
+    test_enrichment_order_independent_of_completion()
+    test_cross_section_dedup()
+    test_incremental_reuses_unchanged_items()
+    test_incremental_reuse_is_per_market()
+    test_async_engine_matches_sync()
+    test_async_close_without_crawl()
+    test_combined_fetch_single_request()
+    test_genre_map_skips_detail_request()
+    test_multi_page_section_streaming()
+    test_section_scheduler_merges_queue()
+    print("✅ 补全流程测试通过")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+测试 Logo 渐变渲染
+Test Vectorized Gradient Rendering
+"""
+
+import json
+import math
+import sys
+from pathlib import Path
+
+# 添加scripts目录到路径
+sys.path.append(str(Path(__file__).parent / "scripts"))
+
+import generate_logo
+from generate_logo import GRADIENT_COLORS, build_render_jobs, create_gradient_background, create_logo_icon, run_render_jobs
+
+
+def reference_pixel(x, y, width, height, colors, direction):
+    """逐像素实现的参考结果"""
+    if direction == "diagonal":
+        ratio = (x + y) / (width + height)
+    else:
+        center_x, center_y = width // 2, height // 2
+        max_distance = math.sqrt(center_x**2 + center_y**2)
+        ratio = math.sqrt((x - center_x)**2 + (y - center_y)**2) / max_distance
+    ratio = min(1.0, max(0.0, ratio))
+
+    color_index = ratio * (len(colors) - 1)
+    color1_idx = int(color_index)
+    color2_idx = min(color1_idx + 1, len(colors) - 1)
+    blend_ratio = color_index - color1_idx
+    color1, color2 = colors[color1_idx], colors[color2_idx]
+    return tuple(int(color1[c] * (1 - blend_ratio) + color2[c] * blend_ratio) for c in range(3))
+
+
+def test_gradient_matches_per_pixel_reference():
+    """测试向量化渲染与逐像素实现一致"""
+    for direction in ("diagonal", "radial"):
+        for width, height in [(48, 48), (90, 30), (17, 41)]:
+            image = create_gradient_background(width, height, GRADIENT_COLORS, direction)
+            assert image.size == (width, height)
+            for y in range(height):
+                for x in range(width):
+                    expected = reference_pixel(x, y, width, height, GRADIENT_COLORS, direction)
+                    assert image.getpixel((x, y)) == expected
+
+
+def test_gradient_custom_stops():
+    """测试自定义色标位置"""
+    colors = [(0, 0, 0), (200, 100, 50), (255, 255, 255)]
+    image = create_gradient_background(100, 100, colors, "diagonal", stops=[0.0, 0.25, 1.0])
+
+    # 对角线位置 0.25 处恰好为第二个色标
+    assert image.getpixel((25, 25)) == (200, 100, 50)
+    assert image.getpixel((0, 0)) == (0, 0, 0)
+
+
+def test_memoized_renders_return_copies():
+    """测试缓存的渲染结果不会被调用方的绘制修改"""
+    first = create_logo_icon(64)
+    first.paste((0, 0, 0), (0, 0, 64, 64))
+    second = create_logo_icon(64)
+
+    assert second.getpixel((0, 0)) != (0, 0, 0)
+    assert generate_logo._render_logo_icon.cache_info().hits >= 1
+
+
+def test_render_jobs_downscale_graph(tmp_path, monkeypatch):
+    """测试缩小模式下小尺寸 Logo 依赖最大尺寸，并按依赖顺序渲染"""
+    monkeypatch.setattr(generate_logo, "OUTPUT_DIR", tmp_path)
+    monkeypatch.setattr(generate_logo, "LOGO_SIZES", [32, 64])
+    monkeypatch.setattr(generate_logo, "BACKGROUND_SIZES", [(40, 30)])
+
+    jobs = build_render_jobs(downscale=True)
+    logo_jobs = {job.name: job for job in jobs if job.name.startswith("logo_")}
+    assert logo_jobs["logo_32"].kind == "downscale"
+    assert logo_jobs["logo_32"].deps == ("logo_64",)
+
+    jobs = [job for job in jobs if job.name not in ("banner", "preview")]
+    run_render_jobs(jobs, workers=2)
+    assert sorted(path.name for path in tmp_path.glob("*.png")) == [
+        "tmdb_background_40x30.png", "tmdb_logo_32x32.png", "tmdb_logo_64x64.png"
+    ]
+
+
+def test_preview_reuses_rendered_logo(tmp_path, monkeypatch):
+    """测试社交预览图依赖已渲染的 Logo 文件，而不是在工作进程中重新绘制"""
+    monkeypatch.setattr(generate_logo, "OUTPUT_DIR", tmp_path)
+    monkeypatch.setattr(generate_logo, "LOGO_SIZES", [64, 256])
+
+    jobs = {job.name: job for job in build_render_jobs()}
+    preview = jobs["preview"]
+    assert preview.deps == ("logo_256",)
+    assert preview.args[2] == jobs["logo_256"].path
+
+    run_render_jobs([jobs["logo_256"], preview], workers=2)
+    assert (tmp_path / "github_social_preview.png").exists()
+
+
+def test_manifest_skips_unchanged_assets(tmp_path, monkeypatch):
+    """测试输入未变化的资源被跳过，--force 时重新生成"""
+    monkeypatch.setattr(generate_logo, "OUTPUT_DIR", tmp_path)
+    monkeypatch.setattr(generate_logo, "MANIFEST_PATH", tmp_path / "manifest.json")
+    monkeypatch.setattr(generate_logo, "LOGO_SIZES", [32])
+    monkeypatch.setattr(generate_logo, "BACKGROUND_SIZES", [(40, 30)])
+    rendered = []
+    original_run = generate_logo.run_render_jobs
+
+    def tracking_run(jobs, *args, **kwargs):
+        rendered.append(sorted(job.name for job in jobs))
+        return original_run(jobs, *args, **kwargs)
+
+    monkeypatch.setattr(generate_logo, "run_render_jobs", tracking_run)
+
+    generate_logo.main(["--workers", "1"])
+    generate_logo.main(["--workers", "1"])
+    assert len(rendered) == 1
+
+    manifest = json.loads((tmp_path / "manifest.json").read_text(encoding="utf-8"))["assets"]
+    assert manifest["tmdb_logo_32x32.png"]["bytes"] == (tmp_path / "tmdb_logo_32x32.png").stat().st_size
+
+    # 删除文件或修改保存参数都会触发重新生成
+    (tmp_path / "tmdb_logo_32x32.png").unlink()
+    generate_logo.main(["--workers", "1"])
+    assert rendered[-1] == ["logo_32"]
+
+    generate_logo.main(["--workers", "1", "--compress-level", "9"])
+    generate_logo.main(["--workers", "1", "--compress-level", "9", "--force"])
+    assert len(rendered[-1]) == len(rendered[-2]) == 4
+
+
+if __name__ == "__main__":
+    test_gradient_matches_per_pixel_reference()
+    test_gradient_custom_stops()
+    test_memoized_renders_return_copies()
+    print("✅ 渐变渲染测试通过")
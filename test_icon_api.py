@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+测试图标库接口（Gist 索引、合并写入、上传）
+Test Icon API in api/index.py (Gist Index, Batched Writes, Uploads)
+"""
+
+import io
+import json
+import sys
+import threading
+from pathlib import Path
+
+from PIL import Image
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+# 添加api目录到路径
+sys.path.append(str(Path(__file__).parent / "api"))
+
+import index
+
+
+class FakeResponse:
+    """模拟 requests 响应"""
+
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self._data = data
+        self.headers = headers or {}
+
+    def json(self):
+        return self._data
+
+
+class FakeGist:
+    """模拟 GitHub Gist 接口，支持 ETag 条件请求和修订历史"""
+
+    def __init__(self, icons):
+        self.history = [("v1", {"name": "Icon Library", "description": "图标库", "icons": icons})]
+        self.gets = []
+        self.patches = []
+        self.before_patch = None
+
+    @property
+    def content(self):
+        return self.history[0][1]
+
+    @property
+    def etag(self):
+        return f'"{self.history[0][0]}"'
+
+    def gist_data(self, content):
+        files = {"icons.json": {"content": json.dumps(content, ensure_ascii=False)}}
+        history = [{"version": version} for version, _ in self.history]
+        return {"files": files, "history": history}
+
+    def commit(self, content):
+        self.history.insert(0, (f"v{len(self.history) + 1}", content))
+
+    def get(self, url, headers=None, **kwargs):
+        revision = url.rsplit("/", 1)[1]
+        if revision.startswith("v"):
+            return FakeResponse(200, self.gist_data(dict(self.history)[revision]))
+        self.gets.append(headers.get("If-None-Match"))
+        if headers.get("If-None-Match") == self.etag:
+            return FakeResponse(304)
+        return FakeResponse(200, self.gist_data(self.content), {"ETag": self.etag})
+
+    def patch(self, url, headers=None, **kwargs):
+        if self.before_patch:
+            self.before_patch()
+            self.before_patch = None
+        payload = kwargs["json"]
+        self.patches.append(payload)
+        self.commit(json.loads(payload["files"]["icons.json"]["content"]))
+        return FakeResponse(200, self.gist_data(self.content))
+
+
+def setup_gist(monkeypatch, icons):
+    """替换网络请求并重置索引和写入队列"""
+    gist = FakeGist(icons)
+    monkeypatch.setattr(index.http_session, "get", gist.get)
+    monkeypatch.setattr(index.http_session, "patch", gist.patch)
+    icon_index = index.IconIndex(ttl=60)
+    monkeypatch.setattr(index, "icon_index", icon_index)
+    monkeypatch.setattr(index, "gist_writer", index.GistWriter(icon_index, window=0.05))
+    return gist
+
+
+def make_icon(name):
+    return {"name": name, "url": f"https://img.example/{name}.png", "upload_time": "2024-01-01T00:00:00"}
+
+
+def test_list_served_from_index(monkeypatch):
+    """测试有效期内列表直接使用内存索引，过期后发送条件请求"""
+    gist = setup_gist(monkeypatch, [make_icon("a"), make_icon("b")])
+    client = index.app.test_client()
+
+    for _ in range(3):
+        data = client.get("/api/icons").get_json()
+        assert [icon["name"] for icon in data["data"]["icons"]] == ["a", "b"]
+    assert gist.gets == [None]
+
+    index.icon_index.loaded_at -= 120
+    client.get("/api/icons")
+    assert gist.gets == [None, '"v1"']
+
+
+def test_unique_names_with_suffix_counter(monkeypatch):
+    """测试重复名称依次添加后缀，删除后可复用"""
+    gist = setup_gist(monkeypatch, [make_icon("logo"), make_icon("logo_1")])
+
+    names = [index.update_gist("logo", "https://img.example/x.png")["data"]["name"] for _ in range(3)]
+    assert names == ["logo_2", "logo_3", "logo_4"]
+    assert [icon["name"] for icon in gist.content["icons"]][-3:] == names
+
+    client = index.app.test_client()
+    assert client.delete("/api/delete/logo_3").status_code == 200
+    assert client.delete("/api/delete/logo_3").status_code == 404
+    assert "logo_3" not in index.icon_index.by_name
+    assert index.update_gist("logo", "https://img.example/y.png")["data"]["name"] == "logo_3"
+
+
+def test_concurrent_writes_coalesce_into_one_patch(monkeypatch):
+    """测试合并窗口内的并发上传只产生一次 PATCH"""
+    gist = setup_gist(monkeypatch, [make_icon("logo")])
+    results = []
+
+    def upload(i):
+        results.append(index.update_gist("logo", f"https://img.example/{i}.png"))
+
+    threads = [threading.Thread(target=upload, args=(i,)) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(gist.patches) == 1
+    assert all(result["success"] for result in results)
+    assert sorted(result["data"]["name"] for result in results) == [f"logo_{i}" for i in range(1, 6)]
+    assert len(gist.content["icons"]) == 6
+
+
+def test_conflicting_write_is_reapplied(monkeypatch):
+    """测试 PATCH 期间其他实例写入时，以对方版本为基础重新应用"""
+    gist = setup_gist(monkeypatch, [make_icon("a")])
+    index.icon_index.refresh()
+    gist.before_patch = lambda: gist.commit({**gist.content, "icons": gist.content["icons"] + [make_icon("other")]})
+
+    result = index.update_gist("b", "https://img.example/b.png")
+
+    assert result["success"]
+    assert len(gist.patches) == 2
+    assert [icon["name"] for icon in gist.content["icons"]] == ["a", "other", "b"]
+    assert "other" in index.icon_index.by_name
+
+
+def test_listing_not_blocked_by_slow_write(monkeypatch):
+    """测试 PATCH 进行中列表请求不被阻塞，写入超时返回 pending"""
+    gist = setup_gist(monkeypatch, [make_icon("a")])
+    index.icon_index.refresh()
+    patch_started, release_patch = threading.Event(), threading.Event()
+
+    def slow_patch():
+        patch_started.set()
+        release_patch.wait(5)
+
+    gist.before_patch = slow_patch
+    result = index.gist_writer.apply(index.add_icon_mutation("b", "https://img.example/b.png"), timeout=0.01)
+    assert result["pending"] and result["status"] == 202
+    assert patch_started.wait(2)
+
+    listed = []
+    reader = threading.Thread(target=lambda: listed.append(index.icon_index.query()))
+    reader.start()
+    reader.join(1)
+    assert listed and [icon["name"] for icon in listed[0]] == ["a"]
+
+    release_patch.set()
+    index.gist_writer.submit(index.GistMutation("noop", lambda scratch: {"success": False})).result(5)
+    assert "b" in index.icon_index.by_name
+
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 2048
+
+
+class FakePicGo:
+    """模拟 PicGo 上传接口，读取流式请求体"""
+
+    def __init__(self):
+        self.uploads = []
+
+    def post(self, url, data=None, headers=None, **kwargs):
+        body = b"".join(iter(lambda: data.read(1000), b""))
+        assert len(body) == len(data)
+        environ = EnvironBuilder(method="POST", input_stream=io.BytesIO(body),
+                                 content_type=headers["Content-Type"], content_length=len(body)).get_environ()
+        upload = Request(environ).files["file"]
+        self.uploads.append((upload.filename, upload.mimetype, upload.read()))
+        return FakeResponse(200, {"success": True, "data": [{"url": f"https://img.example/{upload.filename}"}]})
+
+
+def test_upload_streams_validated_image(monkeypatch):
+    """测试上传按文件头校验并以流式请求体转发"""
+    setup_gist(monkeypatch, [])
+    picgo = FakePicGo()
+    monkeypatch.setattr(index.http_session, "post", picgo.post)
+    client = index.app.test_client()
+
+    response = client.post("/api/upload", data={"name": "icon", "image": (io.BytesIO(PNG_BYTES), "icon.png")})
+    assert response.status_code == 200
+    assert picgo.uploads == [("icon.png", "image/png", PNG_BYTES)]
+
+    # 扩展名合法但内容不是图片
+    response = client.post("/api/upload", data={"name": "fake", "image": (io.BytesIO(b"not an image"), "fake.png")})
+    assert response.status_code == 400
+    assert len(picgo.uploads) == 1
+
+
+def test_upload_size_limit(monkeypatch):
+    """测试超过大小限制的上传在转发前被拒绝"""
+    setup_gist(monkeypatch, [])
+    picgo = FakePicGo()
+    monkeypatch.setattr(index.http_session, "post", picgo.post)
+    monkeypatch.setattr(index, "MAX_UPLOAD_SIZE", 1024)
+    client = index.app.test_client()
+
+    response = client.post("/api/upload", data={"name": "big", "image": (io.BytesIO(PNG_BYTES), "big.png")})
+    assert response.status_code == 413
+    assert picgo.uploads == []
+
+
+def test_upload_generates_thumbnails(monkeypatch):
+    """测试上传时生成缩略图并记录到图标条目"""
+    gist = setup_gist(monkeypatch, [])
+    picgo = FakePicGo()
+    monkeypatch.setattr(index.http_session, "post", picgo.post)
+    monkeypatch.setattr(index, "THUMBNAIL_FORMAT", "png")
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 150), (200, 30, 30)).save(buffer, "PNG")
+    buffer.seek(0)
+    response = index.app.test_client().post("/api/upload", data={"name": "red", "image": (buffer, "red.png")})
+
+    assert response.status_code == 200
+    thumbnails = gist.content["icons"][0]["thumbnails"]
+    assert sorted(thumbnails, key=int) == ["64", "128", "256"]
+    assert thumbnails["64"] == "https://img.example/red_64.png"
+
+    uploaded = {name: data for name, _, data in picgo.uploads}
+    assert Image.open(io.BytesIO(uploaded["red_128.png"])).size == (128, 64)
+
+
+def test_upload_without_thumbnail_sizes(monkeypatch):
+    """测试 THUMBNAIL_SIZES 为空时关闭缩略图，上传照常成功"""
+    gist = setup_gist(monkeypatch, [])
+    picgo = FakePicGo()
+    monkeypatch.setattr(index.http_session, "post", picgo.post)
+    monkeypatch.setattr(index, "THUMBNAIL_SIZES", [])
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 150), (200, 30, 30)).save(buffer, "PNG")
+    image = buffer.getvalue()
+    client = index.app.test_client()
+
+    response = client.post("/api/upload", data={"name": "red", "image": (io.BytesIO(image), "red.png")})
+    assert response.status_code == 200
+    assert response.get_json()["data"]["thumbnails"] == {}
+    assert [name for name, _, _ in picgo.uploads] == ["red.png"]
+
+    response = client.post("/api/upload/batch", data={"images": [(io.BytesIO(image), "blue.png")]})
+    assert response.status_code == 200
+    assert response.get_json()["data"]["results"][0]["success"]
+    assert "thumbnails" not in gist.content["icons"][0]
+    assert index.create_thumbnails(io.BytesIO(image), "red.png") == []
+
+
+def test_thumbnails_skip_oversized_images(monkeypatch):
+    """测试像素数超过上限的图片不解码、不生成缩略图"""
+    monkeypatch.setattr(index, "THUMBNAIL_MAX_PIXELS", 100 * 100)
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 150)).save(buffer, "PNG")
+    buffer.seek(0)
+
+    assert index.create_thumbnails(buffer, "big.png", image_format="png") == []
+    assert buffer.tell() == 0
+
+
+def test_thumbnail_failures_do_not_affect_original(monkeypatch):
+    """测试缩略图异常响应不影响原图，原图失败时不上传缩略图"""
+    setup_gist(monkeypatch, [])
+    picgo = FakePicGo()
+    monkeypatch.setattr(index, "THUMBNAIL_FORMAT", "png")
+
+    def post(url, data=None, headers=None, **kwargs):
+        response = picgo.post(url, data, headers, **kwargs)
+        filename = picgo.uploads[-1][0]
+        if filename == "red.png" and fail_original:
+            return FakeResponse(500)
+        if filename == "red_64.png":
+            # 非 JSON 响应
+            response.json = lambda: json.loads("<html>")
+        return response
+
+    monkeypatch.setattr(index.http_session, "post", post)
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 150), (200, 30, 30)).save(buffer, "PNG")
+    image = buffer.getvalue()
+    client = index.app.test_client()
+
+    fail_original = False
+    response = client.post("/api/upload", data={"name": "red", "image": (io.BytesIO(image), "red.png")})
+    assert response.status_code == 200
+    assert sorted(response.get_json()["data"]["thumbnails"], key=int) == ["128", "256"]
+
+    fail_original = True
+    picgo.uploads.clear()
+    response = client.post("/api/upload", data={"name": "red", "image": (io.BytesIO(image), "red.png")})
+    assert response.status_code == 500
+    assert [name for name, _, _ in picgo.uploads] == ["red.png"]
+
+
+def test_icons_pagination_filter_and_etag(monkeypatch):
+    """测试分页、搜索、排序以及 ETag 条件请求"""
+    icons = [make_icon(name) for name in ["alpha", "beta", "alphabet", "gamma", "delta"]]
+    for i, icon in enumerate(icons):
+        icon["upload_time"] = f"2024-01-0{5 - i}T00:00:00"
+    setup_gist(monkeypatch, icons)
+    client = index.app.test_client()
+
+    data = client.get("/api/icons?offset=1&limit=2").get_json()["data"]
+    assert [icon["name"] for icon in data["icons"]] == ["beta", "alphabet"]
+    assert data["total"] == 5
+
+    data = client.get("/api/icons?q=ALPHA&match=prefix").get_json()["data"]
+    assert [icon["name"] for icon in data["icons"]] == ["alpha", "alphabet"]
+    data = client.get("/api/icons?q=lta").get_json()["data"]
+    assert [icon["name"] for icon in data["icons"]] == ["delta"]
+
+    data = client.get("/api/icons?sort=upload_time&limit=2").get_json()["data"]
+    assert [icon["name"] for icon in data["icons"]] == ["delta", "gamma"]
+
+    assert client.get("/api/icons?limit=0").status_code == 400
+
+    response = client.get("/api/icons?limit=2")
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "public, no-cache"
+    assert client.get("/api/icons?limit=2", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/api/icons?limit=3", headers={"If-None-Match": etag}).status_code == 200
+
+    # 内容变化后 ETag 失效
+    revision = client.get("/api/icons?limit=2").get_json()["data"]["revision"]
+    assert client.get(f"/api/icons?offset=2&limit=2&revision={revision}").status_code == 200
+    index.update_gist("epsilon", "https://img.example/epsilon.png")
+    assert client.get("/api/icons?limit=2", headers={"If-None-Match": etag}).status_code == 200
+
+    # 翻页期间内容变化时拒绝按 offset 继续
+    response = client.get(f"/api/icons?offset=2&limit=2&revision={revision}")
+    assert response.status_code == 409
+    assert response.get_json()["stale"]
+
+
+def test_batch_upload_single_gist_write(monkeypatch):
+    """测试批量上传并发上传图片，成功条目一次写入 Gist"""
+    gist = setup_gist(monkeypatch, [make_icon("one")])
+    picgo = FakePicGo()
+    monkeypatch.setattr(index.http_session, "post", picgo.post)
+
+    data = {
+        "images": [
+            (io.BytesIO(PNG_BYTES), "one.png"),
+            (io.BytesIO(b"broken"), "broken.png"),
+            (io.BytesIO(PNG_BYTES), "two.png"),
+        ],
+        "names": ["one"],
+    }
+    response = index.app.test_client().post("/api/upload/batch", data=data)
+    results = response.get_json()["data"]["results"]
+
+    assert response.status_code == 200
+    assert [result["success"] for result in results] == [True, False, True]
+    assert [result["name"] for result in results] == ["one_1", "broken", "two"]
+    assert results[0]["is_duplicate"]
+    assert len(gist.patches) == 1
+    assert [icon["name"] for icon in gist.content["icons"]] == ["one", "one_1", "two"]
+
+
+def test_http_pool_covers_batch_uploads(monkeypatch):
+    """测试连接池不小于批量上传的并发 PicGo 请求数"""
+    monkeypatch.setattr(index, "HTTP_POOL_SIZE", 10)
+    monkeypatch.setattr(index, "BATCH_UPLOAD_WORKERS", 4)
+    monkeypatch.setattr(index, "THUMBNAIL_SIZES", [64, 128, 256])
+    assert index.http_pool_size() == 12
+
+    adapter = index.create_http_session().get_adapter("https://api.picgo.net")
+    assert adapter._pool_maxsize == 12
+
+
+def test_http_session_retries_only_idempotent(monkeypatch):
+    """测试共享会话对 GET 的 5xx 重试，对 PATCH 不重试"""
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    counts = {"GET": 0, "PATCH": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def respond(self):
+            counts[self.command] += 1
+            self.send_response(503 if counts[self.command] == 1 else 200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        do_GET = do_PATCH = respond
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(index, "HTTP_BACKOFF", 0)
+    session = index.create_http_session()
+    url = f"http://127.0.0.1:{server.server_port}/"
+    try:
+        assert session.get(url).status_code == 200
+        assert session.patch(url).status_code == 503
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert counts == {"GET": 2, "PATCH": 1}
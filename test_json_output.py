@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+测试 JSON 流式写出与压缩变体
+Test Streaming JSON Writer and Compact Output Variants
+"""
+
+import gzip
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加scripts目录到路径
+sys.path.append(str(Path(__file__).parent / "scripts"))
+
+from json_output import StreamingJSONWriter, variant_path, write_json_document
+
+SAMPLE_DATA = {
+    "last_updated": "2025-01-20 15:30:00",
+    "today_global": [
+        {"id": 1, "title": "五等分的新娘", "type": "movie", "genreTitle": "动画•喜剧", "rating": 8.2},
+        {"id": 2, "title": "怪奇物语", "type": "tv", "genreTitle": "", "rating": 8.6},
+    ],
+    "week_global_all": [],
+    "markets": {"en-US_US": {"today_global": [{"id": 1, "title": "The Quintessential Quintuplets"}]}},
+}
+
+
+def test_pretty_output_matches_json_dump():
+    """测试美化版与 json.dump(indent=2) 完全一致，变体内容等价"""
+    path = Path(tempfile.mkdtemp()) / "TMDB_Trending.json"
+    written = write_json_document(SAMPLE_DATA, path, variants=("min", "gz"))
+
+    assert path.read_text(encoding="utf-8") == json.dumps(SAMPLE_DATA, ensure_ascii=False, indent=2)
+    assert written == [path, variant_path(path, "min"), variant_path(path, "gz")]
+    assert variant_path(path, "min").name == "TMDB_Trending.min.json"
+    assert json.loads(variant_path(path, "min").read_text(encoding="utf-8")) == SAMPLE_DATA
+    assert json.loads(gzip.decompress(variant_path(path, "gz").read_bytes())) == SAMPLE_DATA
+
+
+def test_failed_write_keeps_previous_file():
+    """测试写入中途失败时保留旧文件且不留下临时文件"""
+    directory = Path(tempfile.mkdtemp())
+    path = directory / "TMDB_Trending.json"
+    path.write_text("{}", encoding="utf-8")
+
+    def broken_items():
+        yield {"id": 1}
+        raise RuntimeError("crawl failed")
+
+    try:
+        with StreamingJSONWriter(path, variants=("min",)) as writer:
+            writer.write_section("today_global", broken_items())
+    except RuntimeError:
+        pass
+
+    assert path.read_text(encoding="utf-8") == "{}"
+    assert sorted(p.name for p in directory.iterdir()) == ["TMDB_Trending.json"]
+
+
+def test_output_mode_follows_umask():
+    """测试原子替换后的文件权限与普通 open() 创建的文件一致"""
+    directory = Path(tempfile.mkdtemp())
+    reference = directory / "reference.json"
+    reference.write_text("{}", encoding="utf-8")
+
+    for path in write_json_document(SAMPLE_DATA, directory / "TMDB_Trending.json", variants=("min", "gz")):
+        assert path.stat().st_mode & 0o777 == reference.stat().st_mode & 0o777
+
+
+if __name__ == "__main__":
+    test_pretty_output_matches_json_dump()
+    test_failed_write_keeps_previous_file()
+    test_output_mode_follows_umask()
+    print("✅ JSON 写出测试通过")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+测试 TMDB 响应缓存
+Test Persistent Response Cache and Conditional Revalidation
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加scripts目录到路径
+sys.path.append(str(Path(__file__).parent / "scripts"))
+
+from get_tmdb_data import TMDBCrawler
+from tmdb_cache import ResponseCache, get_endpoint_ttl, make_cache_key
+
+
+class MockResponse:
+    """模拟 requests 响应"""
+
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self._data = data
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+
+def make_crawler(cache_path):
+    """创建带缓存和模拟会话的爬虫"""
+    crawler = TMDBCrawler(api_key="mock", cache=ResponseCache(cache_path))
+    crawler.sent_headers = []
+
+    def mock_get(url, params=None, headers=None, timeout=None):
+        crawler.sent_headers.append(dict(headers or {}))
+        if (headers or {}).get("If-None-Match") == '"v1"':
+            return MockResponse(304)
+        return MockResponse(200, {"results": [{"id": 1}]}, {"ETag": '"v1"'})
+
+    crawler.session.get = mock_get
+    return crawler
+
+
+def test_cache_key_ignores_api_key():
+    """测试缓存键不包含 api_key 且与参数顺序无关"""
+    key1 = make_cache_key("/movie/1", {"language": "zh-CN", "api_key": "a", "page": 1})
+    key2 = make_cache_key("/movie/1", {"page": 1, "language": "zh-CN"})
+    assert key1 == key2 == "/movie/1?language=zh-CN&page=1"
+
+
+def test_endpoint_ttl_classes():
+    """测试不同接口的有效期"""
+    assert get_endpoint_ttl("/genre/movie/list") > get_endpoint_ttl("/tv/1399/images")
+    assert get_endpoint_ttl("/tv/1399/images") > get_endpoint_ttl("/tv/1399") > 0
+    assert get_endpoint_ttl("/trending/all/day") == 0
+    assert get_endpoint_ttl("/movie/popular") == 0
+
+
+def test_fresh_hit_and_revalidation():
+    """测试有效期内直接命中，过期后用 ETag 重新验证"""
+    cache_path = Path(tempfile.mkdtemp()) / "responses.sqlite"
+    crawler = make_crawler(cache_path)
+
+    # 趋势接口 TTL 为 0：第二次请求带 If-None-Match 并复用 304
+    assert crawler.fetch_trending_data()["results"] == [{"id": 1}]
+    assert crawler.fetch_trending_data()["results"] == [{"id": 1}]
+    assert crawler.sent_headers == [{}, {"If-None-Match": '"v1"'}]
+    assert crawler.cache.revalidated == 1
+
+    # 详情接口在有效期内不发请求，并在新进程中依然可用
+    crawler.get_media_details("movie", 1)
+    crawler.cache.close()
+    crawler = make_crawler(cache_path)
+    crawler.get_media_details("movie", 1)
+    assert crawler.sent_headers == []
+    assert crawler.cache.fresh_hits == 1
+
+
+if __name__ == "__main__":
+    test_cache_key_ignores_api_key()
+    test_endpoint_ttl_classes()
+    test_fresh_hit_and_revalidation()
+    print("✅ 响应缓存测试通过")
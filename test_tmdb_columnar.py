@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+测试列式导出
+Test Columnar Export
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加scripts目录到路径
+sys.path.append(str(Path(__file__).parent / "scripts"))
+
+from tmdb_columnar import columnar_path, decode_columnar, encode_columnar, load_columnar, write_columnar
+
+SNAPSHOT_PATH = Path(__file__).parent / "data" / "TMDB_Trending.json"
+
+
+def load_snapshot():
+    with open(SNAPSHOT_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_round_trip(tmp_path, fmt):
+    """写出指定格式的列式导出，读回后应与原 JSON 完全一致，且体积明显更小"""
+    document = load_snapshot()
+    path = tmp_path / "TMDB_Trending.json"
+    path.write_text(json.dumps(document, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    written = write_columnar(document, path, formats=(fmt,))
+    assert written == [columnar_path(path, fmt)]
+    restored = load_columnar(written[0])
+    assert restored == document
+    # 字段顺序也保持一致
+    assert json.dumps(restored, ensure_ascii=False) == json.dumps(document, ensure_ascii=False)
+    assert written[0].stat().st_size * 2 < path.stat().st_size
+
+
+def test_round_trip_matches_json(tmp_path):
+    """测试列式 JSON 导出的往返一致性"""
+    check_round_trip(tmp_path, "json")
+
+
+def test_msgpack_round_trip_matches_json(tmp_path):
+    """测试 MessagePack 导出的往返一致性"""
+    pytest.importorskip("msgpack")
+    check_round_trip(tmp_path, "msgpack")
+
+
+def test_interning_and_edge_values():
+    """测试字符串、类型和图片尺寸的共享表以及特殊值"""
+    item = {
+        "id": 1, "title": "标题", "type": "movie", "genreTitle": "动作•冒险", "rating": 7.5,
+        "release_date": None, "overview": "",
+        "poster_url": "https://image.tmdb.org/t/p/w500/poster.jpg",
+        "title_backdrop": "",
+    }
+    other = dict(item, id=2, genreTitle="", poster_url="https://example.com/poster.jpg",
+                 title_backdrop="https://image.tmdb.org/t/p/original/backdrop.jpg")
+    document = {
+        "last_updated": "2025-01-01 00:00:00",
+        "version": 3,
+        "today_global": [item, other],
+        "popular_movies": [],
+        "markets": {"en-US_US": {"today_global": [dict(item, genreTitle="动作")]}},
+    }
+
+    data = encode_columnar(document)
+    assert data["genres"] == ["动作", "冒险"]
+    assert data["sizes"] == ["w500", "original"]
+    assert data["strings"].count("标题") == 1
+    assert data["sections"]["today_global"]["columns"]["poster_url"][0] == [0, data["strings"].index("/poster.jpg")]
+    assert decode_columnar(json.loads(json.dumps(data))) == document
+
+
+def test_inconsistent_fields_rejected():
+    """测试榜单条目字段不一致时拒绝导出"""
+    try:
+        encode_columnar({"today_global": [{"id": 1, "type": "movie"}, {"id": 2}]})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("字段不一致的榜单应当被拒绝")
+
+
+if __name__ == "__main__":
+    test_interning_and_edge_values()
+    test_inconsistent_fields_rejected()
+    print("✅ 列式导出测试通过")
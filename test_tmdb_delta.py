@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+测试榜单增量更新
+Test Versioned Delta Feed
+"""
+
+import copy
+import json
+import random
+import sys
+from pathlib import Path
+
+# 添加scripts目录到路径
+sys.path.append(str(Path(__file__).parent / "scripts"))
+
+from json_output import dumps_compact
+from tmdb_delta import DeltaFeed, apply_delta, diff_documents, diff_section, plan_updates
+
+
+def make_item(media_type, media_id, rating=7.0):
+    return {
+        "id": media_id,
+        "title": f"标题{media_id}",
+        "type": media_type,
+        "genreTitle": "动作•冒险",
+        "rating": rating,
+        "release_date": "2024-01-01",
+        "overview": f"简介{media_id}",
+        "poster_url": f"https://image.tmdb.org/t/p/original/poster_{media_id}.jpg",
+        "title_backdrop": f"https://image.tmdb.org/t/p/original/backdrop_{media_id}.jpg",
+    }
+
+
+def mutate(items, rng):
+    """随机删除、新增、修改和重排条目"""
+    items = [dict(item) for item in items if rng.random() > 0.15]
+    for item in items:
+        if rng.random() < 0.2:
+            item["rating"] = round(rng.uniform(5, 9), 1)
+    items += [make_item(rng.choice(["movie", "tv"]), rng.randrange(1000, 2000)) for _ in range(rng.randrange(4))]
+    unique = {(item["type"], item["id"]): item for item in items}
+    items = list(unique.values())
+    if len(items) > 2:
+        i, j = rng.sample(range(len(items)), 2)
+        items[i], items[j] = items[j], items[i]
+    return items
+
+
+def make_document(version, rng, previous=None):
+    if previous is None:
+        sections = {
+            "today_global": [make_item("movie", i) for i in range(20)],
+            "popular_movies": [make_item("movie", i) for i in range(10, 25)],
+        }
+        markets = {"en-US_US": {"today_global": [make_item("tv", i) for i in range(20)]}}
+    else:
+        sections = {key: mutate(previous[key], rng) for key in ("today_global", "popular_movies")}
+        markets = {"en-US_US": {"today_global": mutate(previous["markets"]["en-US_US"]["today_global"], rng)}}
+    return {"last_updated": f"2025-01-01 00:{version:02d}:00", "version": version, **sections, "markets": markets}
+
+
+def test_random_round_trip():
+    """测试随机变化的快照经增量还原后完全一致"""
+    rng = random.Random(7)
+    document = make_document(1, rng)
+    for version in range(2, 30):
+        new_document = make_document(version, rng, document)
+        delta = {"version": version, "base_version": version - 1, **diff_documents(document, new_document)}
+        # 经过 JSON 序列化，与客户端拿到的一致
+        delta = json.loads(dumps_compact(delta))
+        assert apply_delta(document, delta) == new_document
+        document = new_document
+
+
+def test_section_delta_contents():
+    """测试排名变化、字段变化、新增和删除的表示"""
+    old = [make_item("movie", 1), make_item("movie", 2), make_item("tv", 3)]
+    new = [make_item("movie", 2), make_item("movie", 1, rating=8.1), make_item("movie", 4)]
+
+    delta = diff_section(old, new)
+    assert delta["size"] == 3
+    assert delta["removed"] == [["tv", 3]]
+    assert delta["added"] == [[2, new[2]]]
+    assert delta["changed"] == [[1, "movie", 1, {"rating": 8.1}]]
+    assert delta["moved"] == [[0, "movie", 2]]
+    assert diff_section(old, copy.deepcopy(old)) is None
+
+
+def test_feed_publishes_versions_and_prunes(tmp_path):
+    """测试版本号单调递增、客户端按清单升级、旧增量被清理"""
+    rng = random.Random(3)
+    snapshots = {}
+    previous = None
+    for _ in range(5):
+        feed = DeltaFeed(tmp_path, history=2)
+        version = feed.next_version(previous)
+        current = make_document(version, rng, previous)
+        feed.publish(previous, current)
+        snapshots[version] = current
+        previous = current
+
+    manifest = json.loads((tmp_path / "manifest.json").read_text(encoding="utf-8"))
+    assert manifest["version"] == 5
+    assert manifest["min_version"] == 3
+    assert sorted(path.name for path in tmp_path.glob("v*.json")) == ["v4.json", "v5.json"]
+
+    # 客户端持有版本 3，依次应用 v4、v5
+    paths = plan_updates(manifest, 3)
+    assert paths == ["v4.json", "v5.json"]
+    document = snapshots[3]
+    for path in paths:
+        document = apply_delta(document, json.loads((tmp_path / path).read_text(encoding="utf-8")))
+    assert document == snapshots[5]
+
+    assert plan_updates(manifest, 5) == []
+    assert plan_updates(manifest, 2) is None
+    assert plan_updates(manifest, None) is None
+
+    # 一次排名交换的增量远小于完整快照
+    swapped = copy.deepcopy(snapshots[5])
+    swapped["version"] = 6
+    swapped["today_global"][:2] = swapped["today_global"][1::-1]
+    delta = DeltaFeed(tmp_path, history=2).publish(snapshots[5], swapped)
+    assert len(dumps_compact(delta)) * 20 < len(dumps_compact(swapped))
+
+
+def test_feed_restarts_when_snapshot_mismatches(tmp_path):
+    """测试上次快照与清单版本不一致时重新开始，不发布错误的增量"""
+    rng = random.Random(5)
+    first = make_document(1, rng)
+    DeltaFeed(tmp_path).publish(None, first)
+    second = make_document(2, rng, first)
+    DeltaFeed(tmp_path).publish(first, second)
+
+    # 快照被手动回退到版本 1
+    feed = DeltaFeed(tmp_path)
+    third = make_document(feed.next_version(first), rng, first)
+    assert third["version"] == 3
+    assert feed.publish(first, third) is None
+    assert feed.manifest["min_version"] == 3
+    assert list(tmp_path.glob("v*.json")) == []
+
+
+if __name__ == "__main__":
+    test_random_round_trip()
+    test_section_delta_contents()
+    print("✅ 增量更新测试通过")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+测试爬虫运行指标
+Test Crawler Metrics
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# 添加scripts目录到路径
+sys.path.append(str(Path(__file__).parent / "scripts"))
+
+import get_tmdb_data
+from get_tmdb_data import TMDBCrawler, collect_markets
+from tmdb_cache import ResponseCache
+from tmdb_metrics import CrawlerMetrics, endpoint_template
+from tmdb_ratelimit import TokenBucket
+from tmdb_replay import ReplayConfig, ReplayServer
+
+
+def test_endpoint_template():
+    """测试接口路径折叠为模板"""
+    assert endpoint_template("/movie/123/images") == "/{type}/{id}/images"
+    assert endpoint_template("/tv/42") == "/{type}/{id}"
+    assert endpoint_template("/movie/popular?language=zh-CN") == "/movie/popular"
+    assert endpoint_template("/trending/all/day") == "/trending/all/day"
+
+
+def test_metrics_match_server_traffic(tmp_path, monkeypatch):
+    """测试请求、重试和缓存指标与回放服务器实际收到的请求一致"""
+    monkeypatch.setattr(get_tmdb_data, "RETRY_DELAY", 0.01)
+    monkeypatch.setattr(get_tmdb_data, "MAX_RETRIES", 6)
+    config = ReplayConfig(error_rate=0.05, rate_limit_rate=0.05, retry_after=0.01, seed=3)
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+
+    with ReplayServer(config=config) as server:
+        crawler = TMDBCrawler(api_key="replay", base_url=server.base_url,
+                              rate_limiter=TokenBucket(0), cache=cache, combined_fetch=False)
+        collect_markets(crawler, [("zh-CN", "CN")])
+    cache.close()
+
+    summary = crawler.metrics.summary()
+    statuses = server.stats.statuses
+    assert summary["requests"] == server.stats.requests
+    assert summary["retries"] == statuses[429] + statuses[500]
+    assert summary["failures"] == 0
+    assert summary["cache_hit_ratio"] == 0.0
+
+    images = summary["endpoints"]["/{type}/{id}/images"]
+    assert images["requests"] == images["latency"]["count"]
+    assert images["cache"]["miss"] == images["responses"]["200"]
+
+    crawler.metrics.write(tmp_path / "metrics.json", tmp_path / "metrics.prom", {"items": 3})
+    written = json.loads((tmp_path / "metrics.json").read_text(encoding="utf-8"))
+    assert written["items"] == 3
+    text = (tmp_path / "metrics.prom").read_text(encoding="utf-8")
+    assert f'tmdb_crawler_request_duration_seconds_count{{endpoint="/{{type}}/{{id}}/images"}} {images["requests"]}' in text
+    assert 'le="+Inf"' in text
+    assert "tmdb_crawler_items 3.0" in text
+
+
+def test_histogram_quantiles():
+    """测试直方图分位数估算"""
+    metrics = CrawlerMetrics()
+    for seconds in [0.01] * 90 + [0.3] * 9 + [40]:
+        metrics.observe_request("/movie/1", 200, seconds)
+
+    latency = metrics.summary()["endpoints"]["/{type}/{id}"]["latency"]
+    assert latency["count"] == 100
+    assert latency["p50"] == 0.05
+    assert latency["p95"] == 0.5
+    assert latency["max"] == 40
+
+
+if __name__ == "__main__":
+    test_endpoint_template()
+    test_histogram_quantiles()
+    print("✅ 运行指标测试通过")
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+测试请求限流与重试策略
+Test Token Bucket, Retry-After Handling and Fail-Fast Statuses
+"""
+
+import sys
+import time
+from pathlib import Path
+from unittest import mock
+
+# 添加scripts目录到路径
+sys.path.append(str(Path(__file__).parent / "scripts"))
+
+from get_tmdb_data import TMDBCrawler
+from tmdb_ratelimit import TokenBucket, backoff_delay, parse_retry_after
+
+
+class MockResponse:
+    """模拟 requests 响应"""
+
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self._data = data
+        self.headers = headers or {}
+
+    def json(self):
+        return self._data
+
+
+def make_crawler(responses):
+    """创建按顺序返回模拟响应的爬虫"""
+    crawler = TMDBCrawler(api_key="mock", rate_limiter=TokenBucket(rate=0))
+    crawler.request_count = 0
+
+    def mock_get(url, params=None, headers=None, timeout=None):
+        crawler.request_count += 1
+        return responses.pop(0)
+
+    crawler.session.get = mock_get
+    return crawler
+
+
+def test_token_bucket_rate():
+    """测试令牌桶在突发额度用完后按速率放行"""
+    bucket = TokenBucket(rate=200, burst=5)
+    start = time.monotonic()
+    for _ in range(25):
+        bucket.acquire()
+    elapsed = time.monotonic() - start
+    # 5 个突发 + 20 个按 200/s 放行，约 0.1 秒
+    assert 0.08 <= elapsed < 0.5
+
+
+def test_pause_waits_full_duration():
+    """测试 pause 之后的等待不短于暂停时间（暂停前经过的时间不计入补充）"""
+    bucket = TokenBucket(rate=10, burst=1)
+    bucket.acquire()
+    time.sleep(0.3)
+    bucket.pause(0.4)
+
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.4
+
+
+def test_parse_retry_after():
+    """测试 Retry-After 解析"""
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("invalid") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def test_backoff_has_jitter_and_cap():
+    """测试退避时间带抖动且有上限"""
+    delays = {round(backoff_delay(2, 1), 3) for _ in range(20)}
+    assert len(delays) > 1
+    assert all(2 <= delay <= 4 for delay in delays)
+    assert backoff_delay(20, 1) <= 60
+
+
+def test_not_found_fails_fast():
+    """测试 404 不重试"""
+    crawler = make_crawler([MockResponse(404)])
+    with mock.patch("get_tmdb_data.time.sleep") as sleep:
+        assert crawler.get_media_details("movie", 1) == {"genres": []}
+    assert crawler.request_count == 1
+    sleep.assert_not_called()
+
+
+def test_rate_limited_respects_retry_after():
+    """测试 429 按 Retry-After 等待后重试"""
+    crawler = make_crawler([
+        MockResponse(429, headers={"Retry-After": "7"}),
+        MockResponse(200, {"genres": [{"name": "剧情"}]}),
+    ])
+    with mock.patch("get_tmdb_data.time.sleep") as sleep:
+        details = crawler.get_media_details("movie", 1)
+    assert details["genres"][0]["name"] == "剧情"
+    assert crawler.request_count == 2
+    assert sleep.call_args[0][0] == 7
+
+
+if __name__ == "__main__":
+    test_token_bucket_rate()
+    test_pause_waits_full_duration()
+    test_parse_retry_after()
+    test_backoff_has_jitter_and_cap()
+    test_not_found_fails_fast()
+    test_rate_limited_respects_retry_after()
+    print("✅ 限流与重试测试通过")
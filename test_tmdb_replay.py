@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+测试离线回放服务器与基准测试
+Test Offline Replay Server & Benchmark
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# 添加scripts目录到路径
+sys.path.append(str(Path(__file__).parent / "scripts"))
+
+import benchmark_crawler
+import get_tmdb_data
+from get_tmdb_data import TMDBCrawler, collect_markets
+from tmdb_cache import ResponseCache, make_cache_key
+from tmdb_ratelimit import TokenBucket
+from tmdb_replay import ReplayConfig, ReplayServer, export_fixtures, load_fixtures
+
+
+def make_crawler(server, **kwargs):
+    """创建指向回放服务器、不限流的爬虫"""
+    return TMDBCrawler(api_key="replay", base_url=server.base_url,
+                       rate_limiter=TokenBucket(0), **kwargs)
+
+
+def test_crawler_against_synthetic_server():
+    """测试爬虫对合成数据完整运行，并且输出可复现"""
+    with ReplayServer() as server:
+        first = collect_markets(make_crawler(server), [("zh-CN", "CN")], pages=2)
+        second = collect_markets(make_crawler(server), [("zh-CN", "CN")], pages=2)
+
+    sections = first["zh-CN_CN"]
+    assert first == second
+    assert len(sections["popular_movies"]) == get_tmdb_data.POPULAR_LIMIT
+    assert all(item["genreTitle"] for item in sections["today_global"])
+    assert all(item["title_backdrop"] for item in sections["today_global"])
+    assert server.stats.statuses[200] == server.stats.requests
+
+
+def test_fixtures_override_synthetic_data(tmp_path):
+    """测试从响应缓存导出的回放数据优先于合成数据"""
+    endpoint, params = "/movie/popular", {"language": "zh-CN", "region": "CN", "page": 1}
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    cache.set(make_cache_key(endpoint, params), {"results": [{"id": 42, "title": "录制条目"}]})
+    cache.close()
+
+    assert export_fixtures(tmp_path / "responses.sqlite", tmp_path / "fixtures.json") == 1
+    with ReplayServer(load_fixtures(tmp_path / "fixtures.json"), synthetic=False) as server:
+        crawler = make_crawler(server)
+        data = crawler._make_request(endpoint, params)
+        missing = crawler._make_request("/movie/1", {"language": "zh-CN"})
+
+    assert data["results"][0]["title"] == "录制条目"
+    assert missing is None
+    assert server.stats.statuses[404] == 1
+
+
+def test_recovers_from_injected_errors(monkeypatch):
+    """测试注入 429 和 500 后重试仍能得到完整结果"""
+    monkeypatch.setattr(get_tmdb_data, "RETRY_DELAY", 0.01)
+    monkeypatch.setattr(get_tmdb_data, "MAX_RETRIES", 6)
+    config = ReplayConfig(error_rate=0.1, rate_limit_rate=0.1, retry_after=0.01, seed=1)
+
+    with ReplayServer() as clean_server:
+        expected = collect_markets(make_crawler(clean_server), [("zh-CN", "CN")])
+    with ReplayServer(config=config) as server:
+        results = collect_markets(make_crawler(server), [("zh-CN", "CN")])
+
+    assert results == expected
+    assert server.stats.statuses[429] > 0
+    assert server.stats.statuses[500] > 0
+
+
+def test_benchmark_reports_warm_cache(tmp_path, monkeypatch):
+    """测试基准测试：第二次运行全部通过 304 重新验证"""
+    # main() 会修改重试退避基数，测试结束后恢复
+    monkeypatch.setattr(get_tmdb_data, "RETRY_DELAY", get_tmdb_data.RETRY_DELAY)
+    runs = benchmark_crawler.main([
+        "--latency", "0", "--workers", "4", "--cache", "--runs", "2",
+        "--json", str(tmp_path / "bench.json")
+    ])
+
+    assert runs[0]["statuses"] == {"200": runs[0]["requests"]}
+    assert runs[1]["items"] == runs[0]["items"]
+    assert set(runs[1]["statuses"]) <= {"304"}
+    assert json.loads((tmp_path / "bench.json").read_text(encoding="utf-8")) == runs
+
+
+if __name__ == "__main__":
+    test_crawler_against_synthetic_server()
+    print("✅ 回放测试通过")